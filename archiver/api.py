@@ -0,0 +1,811 @@
+"""Programmatic access to an archive.
+
+The CLI in commands.py is a thin layer over this module: it adds prompts,
+progress output and exit codes. Embedding applications use `Archive`
+directly and get structured results and exceptions instead.
+"""
+import hashlib
+import os
+import random
+import shutil
+import sqlite3
+import stat
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator
+
+from .database import get_db_path, get_connection, write_transaction, insert_file, replace_hash_index, delete_file, set_verified, DB_DIR_NAME
+from .dupfilter import DuplicateFilter, get_filter_path
+from .locks import directory_lock
+from .manifest import iter_db_entries, diff_entries
+from .migrations import migrate
+from .rollup import query_rollups, rebuild_rollups
+from .search import find_paths, list_dir
+from .treehash import TREE_HASH_MIN_SIZE, hash_file_with_chunks, hash_chunks, chunk_count, store_tree, load_tree
+from .utils import calculate_file_hash, read_small_file, copy_file, copy_and_hash, partial_path, link_into_place, read_back_hash, EMPTY_HASH, stat_signature, hash_files, DEFAULT_WORKERS
+from .walk import walk_files, file_entry, FileEntry
+from .xattrs import read_digest, write_digest, refresh_digest
+
+# How many added files `add_many(verify_copy=True)` lets copying get ahead
+# of reading them back
+READ_BACK_BACKLOG = 256
+
+class ArchiveError(Exception):
+    """Base class for errors that abort an archive operation."""
+
+class NotInitializedError(ArchiveError):
+    pass
+
+class InvalidDestinationError(ArchiveError):
+    pass
+
+class SourceNotFoundError(ArchiveError):
+    pass
+
+# Called for duplicates when add_many(duplicates=...) is a callable:
+# (source, size, hash, existing archived paths) -> add anyway?
+DuplicatePolicy = Callable[[Path, int, str, list[str]], bool]
+
+@dataclass
+class AddResult:
+    source: Path
+    # "added", "duplicate" (skipped), "exists" (destination taken),
+    # "root_dotfile", "forbidden", "copy_mismatch" (added, but reading the
+    # copy back did not give the source's hash) or "error"
+    status: str
+    size: int = 0
+    hash: str = None
+    path: str = None              # archive-relative path, if added
+    file_id: int = None           # index id, if added
+    verified: bool = False        # the copy was read back and matched
+    dest: Path = None             # absolute destination that was considered
+    existing: list[str] = field(default_factory=list)
+    error: Exception = None
+
+@dataclass
+class VerifyResult:
+    file_id: int
+    path: str
+    # "ok", "missing", "size_mismatch" or "hash_mismatch"
+    status: str
+    # (offset, length) of damaged regions, for files with a tree hash
+    bad_chunks: list[tuple[int, int]] = field(default_factory=list)
+    # Bytes read to check the file (less than its size when sampled)
+    checked_bytes: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+@dataclass
+class ScanEvent:
+    path: str
+    # "new", "changed", "resigned", "unchanged", "gone", "removed" or "error"
+    status: str
+    error: Exception = None
+    # Bytes read to hash the file (new, changed and resigned files)
+    hashed_bytes: int = 0
+
+@dataclass
+class ScanResult:
+    new: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+    gone: list[str] = field(default_factory=list)
+    resigned: int = 0
+    unchanged: int = 0
+    errors: list[tuple[str, Exception]] = field(default_factory=list)
+
+@dataclass
+class FixResult:
+    path: str
+    # "fixed", "unchanged", "not_indexed", "missing" or "error"
+    status: str
+    old_size: int = None
+    old_hash: str = None
+    size: int = None
+    hash: str = None
+    error: Exception = None
+
+@dataclass
+class ReplicateResult:
+    path: str
+    # "copied", "reused" (copied from identical content on the mirror),
+    # "adopted" (already on the mirror's disk, now indexed), "exists"
+    # (a different file is in the way), "conflict" (indexed on both sides
+    # with different content), "extra" (only on the mirror), "mismatch"
+    # (the source no longer matches its index) or "error"
+    status: str
+    size: int = 0
+    reused_from: str = None
+    error: Exception = None
+
+@dataclass
+class DirStats:
+    dir: str
+    file_count: int
+    total_bytes: int
+    # Bytes of files that are not the oldest copy of their content
+    dup_bytes: int
+    unverified: int
+    # Oldest last_verified below the directory (files never verified aside)
+    oldest_verified: str
+
+@dataclass
+class Stats:
+    file_count: int
+    total_size: int
+    duplicate_groups: int
+    never_verified: int
+    # Oldest last_verified in the archive (files never verified aside)
+    oldest_verified: str = None
+
+def check_file(file_path: Path, expected_size: int, expected_hash: str) -> str:
+    """Checks one archived file, returning its verify status."""
+    try:
+        st = os.lstat(file_path)
+    except (FileNotFoundError, NotADirectoryError):
+        # A parent directory may have been replaced by a file
+        return "missing"
+
+    current_size = 0 if stat.S_ISLNK(st.st_mode) else st.st_size
+
+    if current_size != expected_size:
+        return "size_mismatch"
+
+    current_hash = calculate_file_hash(file_path, st)
+    if current_hash != expected_hash:
+        return "hash_mismatch"
+    return "ok"
+
+def check_file_tree(file_path: Path, expected_size: int, chunk_size: int, digests: list[bytes], executor: ThreadPoolExecutor, indexes: list[int] = None) -> tuple[str, list[tuple[int, int]]]:
+    """Checks a file with a tree hash, hashing its chunks concurrently.
+
+    Returns the verify status and the (offset, length) of damaged chunks.
+    With `indexes`, only those chunks are checked.
+    """
+    try:
+        st = os.lstat(file_path)
+    except (FileNotFoundError, NotADirectoryError):
+        return "missing", []
+    if not stat.S_ISREG(st.st_mode) or st.st_size != expected_size:
+        return "size_mismatch", []
+
+    if indexes is None:
+        if chunk_count(expected_size, chunk_size) != len(digests):
+            return "hash_mismatch", []
+        indexes = range(len(digests))
+    current = hash_chunks(file_path, expected_size, executor, chunk_size, indexes)
+    bad_chunks = [
+        (idx * chunk_size, min(chunk_size, expected_size - idx * chunk_size))
+        for idx, digest in zip(indexes, current)
+        if digest != digests[idx]
+    ]
+    if bad_chunks:
+        return "hash_mismatch", bad_chunks
+    return "ok", []
+
+def hash_for_index(file_path: Path, st: os.stat_result, tree_hash: bool = False) -> tuple[str, list[bytes] | None]:
+    """Hashes a file for the index, returning (hash, leaf digests or None).
+
+    With `tree_hash`, large regular files get leaf digests as well, computed
+    in the same read as the full hash.
+    """
+    if tree_hash and stat.S_ISREG(st.st_mode) and st.st_size >= TREE_HASH_MIN_SIZE:
+        return hash_file_with_chunks(file_path)
+    return calculate_file_hash(file_path, st), None
+
+class Archive:
+    """An archive root and its index, held open on one connection.
+
+    Use as a context manager or call close() when done. Operations raise
+    ArchiveError subclasses instead of exiting; per-file problems are
+    reported in the results and do not stop the operation.
+    """
+
+    def __init__(self, root_path: Path, db_path: Path = None, read_only: bool = False, conn: sqlite3.Connection = None):
+        self.root_path = Path(root_path)
+        self.db_path = get_db_path(self.root_path, db_path)
+        if conn is None:
+            if not self.db_path.exists():
+                raise NotInitializedError(f"Archive not initialized: {self.db_path} does not exist")
+            if not read_only:
+                conn = get_connection(self.db_path)
+                migrate(conn)
+            else:
+                conn = get_connection(self.db_path, "read")
+        self.conn = conn
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def lookup(self, file_hash: str, size: int, limit: int = None) -> list[str]:
+        """Archived paths whose content has the given hash and size."""
+        query = """
+            SELECT f.path
+            FROM files f
+            JOIN hash_index h ON f.id = h.file_id
+            WHERE h.hash=? AND h.size=?
+        """
+        params = (file_hash, size)
+        if limit is not None:
+            query += "LIMIT ?"
+            params += (limit,)
+        return [row[0] for row in self.conn.execute(query, params)]
+
+    def find(self, pattern: str, limit: int = None) -> list[tuple[str, int]]:
+        """(path, size) of archived files whose path matches `pattern` (see search.find_paths)."""
+        return find_paths(self.conn, pattern, limit)
+
+    def ls(self, rel_dir: str = "") -> list[tuple[str, bool, int | None]]:
+        """(name, is_dir, size) of the entries directly inside an archive directory, by name."""
+        return sorted(list_dir(self.conn, rel_dir))
+
+    def contains(self, source: Path) -> list[str]:
+        """Archived paths holding the same content as a local file."""
+        entry = file_entry(Path(source))
+        return self.lookup(calculate_file_hash(entry.path, entry.st), entry.size)
+
+    def add_many(self, sources, dest_subdir: str, duplicates: "str | DuplicatePolicy" = "skip", use_dup_filter: bool = False, on_error=None, tree_hash: bool = False, verify_copy: bool = False) -> Iterator[AddResult]:
+        """Adds files or directory trees below `dest_subdir`, yielding one result per file.
+
+        `duplicates` is "skip", "accept" or a DuplicatePolicy callable.
+        `on_error` is passed to walk_files for unreadable directory entries.
+        With `tree_hash`, leaf digests of large files are recorded as well.
+        With `verify_copy`, added regular files are flushed and read back from
+        the device by a background thread while copying goes on; their
+        results are yielded once that is done, and matching copies count as
+        verified.
+        """
+        if isinstance(sources, (str, Path)):
+            sources = [sources]
+        if dest_subdir.startswith(".") or dest_subdir == DB_DIR_NAME:
+            raise InvalidDestinationError(f"Destination subdirectory cannot start with '.' or be '{DB_DIR_NAME}'.")
+        dest_dir_abs = self.root_path / dest_subdir
+        # Ensure we are not copying into the DB directory
+        if DB_DIR_NAME in dest_dir_abs.parts:
+            raise InvalidDestinationError(f"Cannot add files to reserved directory {DB_DIR_NAME}")
+
+        if duplicates == "skip":
+            policy = lambda *args: False
+        elif duplicates == "accept":
+            policy = lambda *args: True
+        else:
+            policy = duplicates
+
+        dup_filter = None
+        if use_dup_filter:
+            filter_path = get_filter_path(self.db_path)
+            dup_filter = DuplicateFilter.open(filter_path, self.conn)
+
+        read_back = ThreadPoolExecutor(max_workers=1) if verify_copy else None
+        pending = deque()
+        try:
+            for source in sources:
+                source = Path(source)
+                if source.is_file():
+                    if source.name == ".DS_Store":
+                        yield AddResult(source, "forbidden")
+                        continue
+                    entries = [file_entry(source)]
+                    dest_for = lambda src_file: dest_dir_abs / src_file.name
+                elif source.is_dir():
+                    # Collect first: the destination may lie below the source
+                    entries = list(walk_files(source, on_error=on_error))
+                    dest_for = lambda src_file, source=source: dest_dir_abs / src_file.relative_to(source)
+                else:
+                    raise SourceNotFoundError(f"Source {source} does not exist.")
+
+                for entry in entries:
+                    try:
+                        result = self._add_file(entry, dest_for(entry.path), policy, dup_filter, tree_hash)
+                    except Exception as e:
+                        # Continue on per-file errors as per spec
+                        result = AddResult(entry.path, "error", error=e)
+                    if read_back is not None and result.status == "added" and stat.S_ISREG(entry.st.st_mode):
+                        pending.append((result, read_back.submit(read_back_hash, result.dest)))
+                    else:
+                        yield result
+                    yield from self._finish_read_backs(pending, READ_BACK_BACKLOG)
+            yield from self._finish_read_backs(pending, 0)
+        finally:
+            if read_back is not None:
+                # Interrupted: copies not read back yet just stay unverified
+                read_back.shutdown(cancel_futures=True)
+            if dup_filter is not None:
+                dup_filter.catch_up(self.conn)
+                dup_filter.save(filter_path)
+
+    def _finish_read_backs(self, pending: deque, backlog: int) -> list[AddResult]:
+        """Completes the read-backs that are done, waiting until at most `backlog` are left."""
+        finished = []
+        while pending and (len(pending) > backlog or pending[0][1].done()):
+            result, future = pending.popleft()
+            try:
+                result.verified = future.result() == result.hash
+            except OSError as e:
+                result.error = e
+            if not result.verified:
+                result.status = "copy_mismatch"
+            finished.append(result)
+        verified = [result for result in finished if result.verified]
+        if verified:
+            with write_transaction(self.conn) as cursor:
+                for result in verified:
+                    set_verified(cursor, result.file_id, result.path)
+        return finished
+
+    def _add_file(self, entry: FileEntry, final_dest: Path, policy: DuplicatePolicy, dup_filter: DuplicateFilter = None, tree_hash: bool = False) -> AddResult:
+        src_file, st = entry
+        # 1. Calculate Hash & Size
+        data = read_small_file(src_file, st)
+        digests = None
+        if data is not None:
+            # Small files: hash from memory and copy the same bytes later
+            file_size = len(data)
+            file_hash = hashlib.sha256(data).hexdigest() if data else EMPTY_HASH
+        else:
+            file_size = entry.size
+            file_hash, digests = hash_for_index(src_file, st, tree_hash)
+        result = AddResult(src_file, "added", file_size, file_hash, dest=final_dest)
+
+        # 2. Check for duplicates
+        if dup_filter is not None and not dup_filter.might_contain(file_size, file_hash):
+            # Definitely not archived yet, no need to ask the index
+            result.existing = []
+        else:
+            result.existing = self.lookup(file_hash, file_size, limit=11)
+
+        if result.existing and not policy(src_file, file_size, file_hash, result.existing):
+            result.status = "duplicate"
+            return result
+
+        # 3. Check the destination
+        if os.path.lexists(final_dest):
+            result.status = "exists"
+            return result
+
+        # Path stored relative to archive root
+        rel_dest_path = final_dest.relative_to(self.root_path)
+        # Skip root dotfiles/dotdirs
+        if rel_dest_path.parts[0].startswith("."):
+            result.status = "root_dotfile"
+            return result
+
+        final_dest.parent.mkdir(parents=True, exist_ok=True)
+
+        # Copy under a temporary name (preserving symlinks), so other
+        # processes adding to the same directory can copy at the same time
+        partial = partial_path(final_dest)
+        try:
+            copy_file(src_file, partial, data)
+            write_digest(partial, file_hash, partial.lstat())
+            with directory_lock(self.db_path, str(rel_dest_path.parent)):
+                if not link_into_place(partial, final_dest):
+                    # Another writer got there first
+                    result.status = "exists"
+                    return result
+                try:
+                    with write_transaction(self.conn) as cursor:
+                        file_id = insert_file(cursor, str(rel_dest_path), file_size, file_hash, final_dest.lstat())
+                        if digests is not None:
+                            store_tree(cursor, file_id, digests)
+                except BaseException:
+                    # Never leave a file the index does not know about
+                    os.unlink(final_dest)
+                    raise
+        finally:
+            if os.path.lexists(partial):
+                os.unlink(partial)
+        if dup_filter is not None:
+            dup_filter.add(file_size, file_hash)
+        result.path = str(rel_dest_path)
+        result.file_id = file_id
+        return result
+
+    def count_files(self, shard: tuple[int, int] = (1, 1), after_id: int = 0) -> int:
+        shard_k, shard_n = shard
+        return self.conn.execute("SELECT count(*) FROM files WHERE id % ? = ? AND id > ?", (shard_n, shard_k - 1, after_id)).fetchone()[0]
+
+    def verify_iter(self, shard: tuple[int, int] = (1, 1), after_id: int = 0, workers: int = DEFAULT_WORKERS) -> Iterator[VerifyResult]:
+        """Checks archived files against the index, yielding a result per file.
+
+        Shards partition rows by id, which is stable across hosts sharing
+        the index. Files are checked in id order, so `after_id` continues an
+        earlier pass. Files with a tree hash are checked chunk by chunk on
+        `workers` threads.
+        """
+        shard_k, shard_n = shard
+        files = self.conn.execute("""
+            SELECT f.id, f.path, f.size, f.hash, t.file_id IS NOT NULL
+            FROM files f
+            LEFT JOIN file_trees t ON t.file_id = f.id
+            WHERE f.id % ? = ? AND f.id > ?
+            ORDER BY f.id
+        """, (shard_n, shard_k - 1, after_id)).fetchall()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for file_id, rel_path_str, expected_size, expected_hash, has_tree in files:
+                file_path = self.root_path / rel_path_str
+                tree = load_tree(self.conn, file_id) if has_tree else None
+                if tree is not None:
+                    status, bad_chunks = check_file_tree(file_path, expected_size, *tree, executor)
+                    yield VerifyResult(file_id, rel_path_str, status, bad_chunks, expected_size)
+                else:
+                    status = check_file(file_path, expected_size, expected_hash)
+                    yield VerifyResult(file_id, rel_path_str, status, checked_bytes=expected_size)
+
+    def sample_iter(self, fraction: float, shard: tuple[int, int] = (1, 1), seed: int = None, workers: int = DEFAULT_WORKERS) -> Iterator[VerifyResult]:
+        """Checks a random sample of about `fraction` of the archive's blocks.
+
+        Each chunk of a file with a tree hash is picked independently, so
+        large files are spot-checked without being read in full. Files
+        without a tree hash form a single block and are checked whole when
+        picked. Yields results for the sampled files only.
+        """
+        rng = random.Random(seed)
+        shard_k, shard_n = shard
+        files = self.conn.execute("""
+            SELECT f.id, f.path, f.size, f.hash, t.chunk_size
+            FROM files f
+            LEFT JOIN file_trees t ON t.file_id = f.id
+            WHERE f.id % ? = ?
+            ORDER BY f.id
+        """, (shard_n, shard_k - 1)).fetchall()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for file_id, rel_path_str, expected_size, expected_hash, chunk_size in files:
+                file_path = self.root_path / rel_path_str
+                if chunk_size is None:
+                    if rng.random() < fraction:
+                        status = check_file(file_path, expected_size, expected_hash)
+                        yield VerifyResult(file_id, rel_path_str, status, checked_bytes=expected_size)
+                    continue
+
+                picked = [idx for idx in range(chunk_count(expected_size, chunk_size)) if rng.random() < fraction]
+                if not picked:
+                    continue
+                tree = load_tree(self.conn, file_id)
+                if tree is None:
+                    status = check_file(file_path, expected_size, expected_hash)
+                    yield VerifyResult(file_id, rel_path_str, status, checked_bytes=expected_size)
+                    continue
+                status, bad_chunks = check_file_tree(file_path, expected_size, *tree, executor, picked)
+                checked_bytes = sum(min(chunk_size, expected_size - idx * chunk_size) for idx in picked)
+                yield VerifyResult(file_id, rel_path_str, status, bad_chunks, checked_bytes)
+
+    def build_trees(self, min_size: int = TREE_HASH_MIN_SIZE, workers: int = DEFAULT_WORKERS) -> Iterator[tuple[str, str]]:
+        """Records tree hashes for archived files that do not have one yet.
+
+        Each file is read once to compute its leaf digests and full hash; the
+        tree is only stored if the full hash still matches the index. Yields
+        (path, status) with status "added", "hash_mismatch" or "missing"
+        (also for files that cannot be read).
+        """
+        files = self.conn.execute("""
+            SELECT f.id, f.path, f.hash FROM files f
+            WHERE f.size >= ? AND f.id NOT IN (SELECT file_id FROM file_trees)
+            ORDER BY f.id
+        """, (min_size,)).fetchall()
+
+        def hash_one(row):
+            file_path = self.root_path / row[1]
+            if not file_path.is_file() or file_path.is_symlink():
+                return row, None, None
+            try:
+                return row, *hash_file_with_chunks(file_path)
+            except OSError:
+                return row, None, None
+
+        cursor = self.conn.cursor()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for (file_id, rel_path_str, expected_hash), file_hash, digests in executor.map(hash_one, files):
+                if file_hash is None:
+                    yield rel_path_str, "missing"
+                elif file_hash != expected_hash:
+                    yield rel_path_str, "hash_mismatch"
+                else:
+                    store_tree(cursor, file_id, digests)
+                    self.conn.commit()
+                    yield rel_path_str, "added"
+
+    def scan_iter(self, prune: bool = False, commit_interval: int = 10000, on_error=None, tree_hash: bool = False) -> Iterator[ScanEvent]:
+        """Syncs the index with disk, re-hashing only files whose stat signature changed.
+
+        New files are indexed, changed files re-hashed and entries whose file
+        is gone are reported (and removed with `prune`). With `tree_hash`,
+        files hashed on the way get a tree hash if they are large enough.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT path, id, size, hash, mtime_ns, inode, ctime_ns FROM files")
+        indexed = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        seen = set()
+        writes = 0
+        for file_path, st in walk_files(self.root_path, archive_root=True, on_error=on_error):
+            rel_path_str = str(file_path.relative_to(self.root_path))
+            seen.add(rel_path_str)
+            try:
+                size = 0 if stat.S_ISLNK(st.st_mode) else st.st_size
+                entry = indexed.get(rel_path_str)
+
+                if entry is None:
+                    file_hash, digests = hash_for_index(file_path, st, tree_hash)
+                    if refresh_digest(file_path, file_hash, st):
+                        st = os.lstat(file_path)
+                    file_id = insert_file(cursor, rel_path_str, size, file_hash, st)
+                    status = "new"
+                else:
+                    file_id, old_size, old_hash, *old_signature = entry
+                    if old_size == size and tuple(old_signature) == stat_signature(st):
+                        yield ScanEvent(rel_path_str, "unchanged")
+                        continue
+
+                    file_hash, digests = hash_for_index(file_path, st, tree_hash)
+                    if refresh_digest(file_path, file_hash, st):
+                        # The old attribute would vouch for the old content
+                        st = os.lstat(file_path)
+                    cursor.execute(
+                        "UPDATE files SET size = ?, hash = ?, mtime_ns = ?, inode = ?, ctime_ns = ? WHERE id = ?",
+                        (size, file_hash, *stat_signature(st), file_id)
+                    )
+                    if file_hash != old_hash or size != old_size:
+                        replace_hash_index(cursor, file_id, file_hash, size)
+                        status = "changed"
+                    else:
+                        # Same content, only metadata moved (e.g. copied to a new disk)
+                        status = "resigned"
+
+                if digests is not None:
+                    store_tree(cursor, file_id, digests)
+                writes += 1
+                if writes % commit_interval == 0:
+                    self.conn.commit()
+                yield ScanEvent(rel_path_str, status, hashed_bytes=size)
+            except Exception as e:
+                yield ScanEvent(rel_path_str, "error", e)
+
+        gone = [(path, entry[0]) for path, entry in indexed.items() if path not in seen]
+        for path, file_id in sorted(gone):
+            if prune:
+                delete_file(cursor, file_id)
+                yield ScanEvent(path, "removed")
+            else:
+                yield ScanEvent(path, "gone")
+        self.conn.commit()
+
+    def scan(self, prune: bool = False, tree_hash: bool = False) -> ScanResult:
+        """Runs scan_iter to completion and summarizes it."""
+        result = ScanResult()
+        for event in self.scan_iter(prune, tree_hash=tree_hash):
+            if event.status == "new":
+                result.new.append(event.path)
+            elif event.status == "changed":
+                result.changed.append(event.path)
+            elif event.status in ("gone", "removed"):
+                result.gone.append(event.path)
+            elif event.status == "resigned":
+                result.resigned += 1
+            elif event.status == "unchanged":
+                result.unchanged += 1
+            else:
+                result.errors.append((event.path, event.error))
+        return result
+
+    def fix(self, rel_paths, workers: int = DEFAULT_WORKERS) -> list[FixResult]:
+        """Adopts the current content of archived files into the index.
+
+        This declares the files on disk correct, e.g. after verify flagged
+        files that were deliberately edited. Files are re-hashed in parallel
+        and all updates are written in a single transaction. Returns one
+        result per distinct path, in input order.
+        """
+        results = {}
+        pending = []
+        for rel_path in dict.fromkeys(str(Path(p)) for p in rel_paths):
+            row = self.conn.execute("SELECT id, size, hash FROM files WHERE path = ?", (rel_path,)).fetchone()
+            if row is None:
+                results[rel_path] = FixResult(rel_path, "not_indexed")
+                continue
+            file_id, old_size, old_hash = row
+            result = FixResult(rel_path, "fixed", old_size, old_hash)
+            results[rel_path] = result
+            try:
+                entry = file_entry(self.root_path / rel_path)
+            except FileNotFoundError:
+                result.status = "missing"
+                continue
+            except OSError as e:
+                result.status, result.error = "error", e
+                continue
+            pending.append((file_id, result, entry))
+
+        cursor = self.conn.cursor()
+        try:
+            hashed = hash_files([entry for _, _, entry in pending], workers)
+            for (file_id, result, entry), (_, file_hash, error) in zip(pending, hashed):
+                if error is not None:
+                    result.status, result.error = "error", error
+                    continue
+                result.size, result.hash = entry.size, file_hash
+                st = entry.st
+                if write_digest(entry.path, file_hash, st):
+                    # Writing the attribute moved the ctime
+                    st = os.lstat(entry.path)
+                cursor.execute(
+                    "UPDATE files SET size = ?, hash = ?, mtime_ns = ?, inode = ?, ctime_ns = ? WHERE id = ?",
+                    (entry.size, file_hash, *stat_signature(st), file_id)
+                )
+                if file_hash == result.old_hash and entry.size == result.old_size:
+                    result.status = "unchanged"
+                else:
+                    replace_hash_index(cursor, file_id, file_hash, entry.size)
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return list(results.values())
+
+    def store_xattrs(self, commit_interval: int = 10000) -> Iterator[tuple[str, str]]:
+        """Writes the digest attribute of archived files from the index, without hashing.
+
+        Only files whose size, mtime, inode and ctime still match the index
+        are signed; content rewritten with a preserved mtime still moves the
+        ctime. Yields (path, status) with status "written", "current"
+        (already signed), "stale" (changed since indexed), "unsupported"
+        (symlinks, file systems without xattrs), "missing" or "error".
+        """
+        rows = self.conn.execute("SELECT id, path, size, hash, mtime_ns, inode, ctime_ns FROM files ORDER BY id").fetchall()
+        cursor = self.conn.cursor()
+        writes = 0
+        for file_id, rel_path_str, size, file_hash, mtime_ns, inode, ctime_ns in rows:
+            file_path = self.root_path / rel_path_str
+            try:
+                st = os.lstat(file_path)
+            except FileNotFoundError:
+                yield rel_path_str, "missing"
+                continue
+            except OSError:
+                yield rel_path_str, "error"
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                yield rel_path_str, "unsupported"
+            elif (st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime_ns) != (size, mtime_ns, inode, ctime_ns):
+                yield rel_path_str, "stale"
+            elif read_digest(file_path, st) == file_hash:
+                yield rel_path_str, "current"
+            elif not write_digest(file_path, file_hash, st):
+                yield rel_path_str, "unsupported"
+            else:
+                # Keep the index signature current, or scan --update would re-hash the file
+                cursor.execute("UPDATE files SET ctime_ns = ? WHERE id = ?", (os.lstat(file_path).st_ctime_ns, file_id))
+                writes += 1
+                if writes % commit_interval == 0:
+                    self.conn.commit()
+                yield rel_path_str, "written"
+        self.conn.commit()
+
+    def replicate_to(self, mirror: "Archive", workers: int = DEFAULT_WORKERS, reuse: bool = True) -> Iterator[ReplicateResult]:
+        """Copies the files the mirror's index lacks, yielding one result per difference.
+
+        Only the two indices are compared, so the cost is a pass over both
+        indices plus the files that differ. Copies run on `workers` threads
+        and are hashed as they are written; a copy is only indexed on the
+        mirror if it matches the source index. With `reuse`, content the
+        mirror already has under another path is copied locally on the
+        mirror instead of from the source. Nothing on the mirror is
+        overwritten or deleted.
+        """
+        # The delta is collected first, so the mirror's index is not
+        # modified while it is being read
+        delta = list(diff_entries(iter_db_entries(self.conn), iter_db_entries(mirror.conn)))
+        tasks = []
+        for kind, rel_path_str in delta:
+            if kind == "mismatch":
+                yield ReplicateResult(rel_path_str, "conflict")
+            elif kind == "extra":
+                yield ReplicateResult(rel_path_str, "extra")
+            else:
+                file_id, size, file_hash = self.conn.execute("SELECT id, size, hash FROM files WHERE path = ?", (rel_path_str,)).fetchone()
+                copies = mirror.lookup(file_hash, size, limit=1) if reuse else []
+                tasks.append((file_id, rel_path_str, size, file_hash, copies[0] if copies else None))
+
+        def copy_one(task):
+            _, rel_path_str, size, file_hash, reuse_from = task
+            dest = mirror.root_path / rel_path_str
+            partial = partial_path(dest)
+            result = ReplicateResult(rel_path_str, "copied", size)
+            try:
+                if os.path.lexists(dest):
+                    # Left behind by an interrupted run, or put there by hand
+                    if os.lstat(dest).st_size == size and calculate_file_hash(dest) == file_hash:
+                        write_digest(dest, file_hash, os.lstat(dest))
+                        result.status = "adopted"
+                    else:
+                        result.status = "exists"
+                    return result
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                if reuse_from is not None:
+                    try:
+                        if copy_and_hash(mirror.root_path / reuse_from, partial) == file_hash:
+                            shutil.copystat(self.root_path / rel_path_str, partial, follow_symlinks=False)
+                            write_digest(partial, file_hash, partial.lstat())
+                            result.status = "reused"
+                            result.reused_from = reuse_from
+                            return self._place_replica(mirror, partial, dest, result)
+                    except OSError:
+                        pass
+                    # The mirror's copy is damaged or gone; fall back to the source
+                    if os.path.lexists(partial):
+                        os.unlink(partial)
+                if copy_and_hash(self.root_path / rel_path_str, partial) != file_hash:
+                    os.unlink(partial)
+                    result.status = "mismatch"
+                    return result
+                write_digest(partial, file_hash, partial.lstat())
+                return self._place_replica(mirror, partial, dest, result)
+            except Exception as e:
+                if os.path.lexists(partial):
+                    os.unlink(partial)
+                result.status = "error"
+                result.error = e
+            return result
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            window = max(1, workers) * 4
+            pending = deque()
+            for task in tasks:
+                pending.append((task, executor.submit(copy_one, task)))
+                if len(pending) >= window:
+                    yield self._index_replica(mirror, *pending.popleft())
+            while pending:
+                yield self._index_replica(mirror, *pending.popleft())
+
+    def _place_replica(self, mirror: "Archive", partial: Path, dest: Path, result: ReplicateResult) -> ReplicateResult:
+        rel_dir = str(dest.parent.relative_to(mirror.root_path))
+        with directory_lock(mirror.db_path, rel_dir):
+            if not link_into_place(partial, dest):
+                # Written by something else while we copied
+                os.unlink(partial)
+                result.status = "exists"
+        return result
+
+    def _index_replica(self, mirror: "Archive", task: tuple, future) -> ReplicateResult:
+        result = future.result()
+        if result.status in ("copied", "reused", "adopted"):
+            file_id, rel_path_str, size, file_hash, _ = task
+            # Tree hashes describe the content, so they carry over
+            tree = load_tree(self.conn, file_id)
+            with write_transaction(mirror.conn) as cursor:
+                mirror_id = insert_file(cursor, rel_path_str, size, file_hash, (mirror.root_path / rel_path_str).lstat())
+                if tree is not None:
+                    store_tree(cursor, mirror_id, tree[1], tree[0])
+        return result
+
+    def dir_stats(self, depth: int = 1) -> list[DirStats]:
+        """Totals of the directories up to `depth` levels below the root, from the rollup table."""
+        return [DirStats(*row) for row in query_rollups(self.conn, depth)]
+
+    def rebuild_rollups(self):
+        rebuild_rollups(self.conn)
+
+    def stats(self) -> Stats:
+        cursor = self.conn.cursor()
+
+        cursor.execute("SELECT COUNT(*), SUM(size) FROM files")
+        file_count, total_size = cursor.fetchone()
+        if total_size is None: total_size = 0
+
+        cursor.execute("SELECT COUNT(*) FROM (SELECT hash, size FROM hash_index GROUP BY hash, size HAVING COUNT(*) > 1)")
+        duplicate_groups = cursor.fetchone()[0]
+
+        cursor.execute("SELECT COUNT(*) FROM files WHERE last_verified IS NULL")
+        never_verified = cursor.fetchone()[0]
+
+        row = cursor.execute("SELECT oldest_verified FROM dir_rollups WHERE dir = ''").fetchone()
+        return Stats(file_count, total_size, duplicate_groups, never_verified, row[0] if row else None)
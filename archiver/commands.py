@@ -1,13 +1,29 @@
-import os
-import shutil
+import signal
+import stat
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 import sqlite3
 
-from .database import get_db_path, init_db, get_connection, DB_DIR_NAME, check_missing_indices
-from .utils import calculate_file_hash, is_hidden
+from .database import get_db_path, init_db, get_connection, DB_DIR_NAME, check_missing_indices, INDICES, ensure_indices, insert_file, checkpoint, READ_ONLY_PROFILES
+from .api import Archive, ArchiveError, Stats, DirStats, hash_for_index
+from .manifest import write_manifest, iter_db_entries, open_entries, diff_entries
+from .report import STATUS_LABELS, VerifyReport, VerifyRun, read_report, read_issue_paths, get_run_results
+from .metrics import MetricsFile
+from .maintenance import check_consistency, database_size, optimize_fts, analyze, vacuum
+from .migrations import Migration, migrate, schema_version, LATEST_VERSION
+from .rollup import rebuild_rollups, refresh_verified
+from .server import ArchiveServer, get_socket_path
+from .treehash import TREE_HASH_MIN_SIZE, store_tree
+from .walk import walk_files, file_entry
+from .watch import ArchiveWatcher, DEFAULT_DEBOUNCE
+from .utils import is_hidden, hash_files, DEFAULT_WORKERS
+from .xattrs import read_digest
+
+# Rows inserted per transaction during scans
+SCAN_COMMIT_INTERVAL = 10000
 
 def _ensure_indices(conn: sqlite3.Connection, interactive: bool = True):
     """Checks for missing indices and asks user to create them."""
@@ -15,10 +31,10 @@ def _ensure_indices(conn: sqlite3.Connection, interactive: bool = True):
     if not missing:
         return
 
-    if "idx_files_path" in missing:
+    for name in missing:
         create = False
         if interactive:
-            print("Notice: Performance index 'idx_files_path' is missing.")
+            print(f"Notice: Performance index '{name}' is missing.")
             try:
                 response = input("Do you want to create it now? [Y/n] ").lower()
             except EOFError:
@@ -27,15 +43,30 @@ def _ensure_indices(conn: sqlite3.Connection, interactive: bool = True):
                 create = True
         
         if create:
-            print("Creating index idx_files_path...", end="", flush=True)
-            conn.execute("CREATE INDEX idx_files_path ON files(path)")
+            print(f"Creating index {name}...", end="", flush=True)
+            conn.execute(INDICES[name])
             conn.commit()
             print(" Done.")
 
-def _get_ready_connection(db_path: Path, interactive: bool = True) -> sqlite3.Connection:
-    """Gets a DB connection and ensures indices are present."""
-    conn = get_connection(db_path)
+def _print_migration_progress(migration: Migration, done_id: int, max_id: int):
+    end = "\n" if done_id >= max_id else ""
+    print(f"\rUpgrading index: {migration.description}... {done_id * 100 // max_id}%", end=end, flush=True)
+
+def _upgrade(conn: sqlite3.Connection, interactive: bool):
+    migrate(conn, progress=_print_migration_progress)
     _ensure_indices(conn, interactive=interactive)
+
+def _get_ready_connection(db_path: Path, interactive: bool = True, profile: str = "write") -> sqlite3.Connection:
+    """Gets a DB connection and ensures the schema is current and indices are present."""
+    conn = get_connection(db_path, profile)
+    if profile in READ_ONLY_PROFILES:
+        if schema_version(conn) < LATEST_VERSION or check_missing_indices(conn):
+            # Schema upgrades need a short-lived writable connection
+            upgrade_conn = get_connection(db_path)
+            _upgrade(upgrade_conn, interactive)
+            upgrade_conn.close()
+    else:
+        _upgrade(conn, interactive)
     return conn
 
 def cmd_init(root_path: Path, db_path_override: Path = None):
@@ -56,219 +87,480 @@ def cmd_init(root_path: Path, db_path_override: Path = None):
         if db_path_override:
              print(f"Database located at {db_path}")
 
-def cmd_add(root_path: Path, source: Path, dest_subdir: str, non_interactive: bool, accept_duplicates: bool, skip_duplicates: bool, db_path_override: Path = None):
+def _format_existing(existing_paths: list[str]) -> str:
+    msg_existing = "  Existing copies:\n"
+    for p in existing_paths[:10]:
+        msg_existing += f"    - {p}\n"
+    if len(existing_paths) > 10:
+        msg_existing += f"    ... and {len(existing_paths) - 10} more.\n"
+    return msg_existing
+
+def cmd_add(root_path: Path, source: Path, dest_subdir: str, non_interactive: bool, accept_duplicates: bool, skip_duplicates: bool, db_path_override: Path = None, use_dup_filter: bool = False, tree_hash: bool = False, metrics_path: Path = None, verify_copy: bool = False):
     """Adds files to the archive."""
     db_path = get_db_path(root_path, db_path_override)
     if not db_path.exists():
         print("Error: Archive not initialized. Run 'archive init' first.")
         sys.exit(1)
 
-    if dest_subdir.startswith(".") or dest_subdir == DB_DIR_NAME:
-        print(f"Error: Destination subdirectory cannot start with '.' or be '{DB_DIR_NAME}'.")
-        sys.exit(1)
-
-    dest_dir_abs = root_path / dest_subdir
-    # Ensure we are not copying into the DB directory
-    if DB_DIR_NAME in dest_dir_abs.parts:
-         print(f"Error: Cannot add files to reserved directory {DB_DIR_NAME}")
-         sys.exit(1)
+    def decide(src_file, file_size, file_hash, existing_paths):
+        msg_existing = _format_existing(existing_paths)
+        if skip_duplicates:
+            print(f"Skipping duplicate: {src_file.name}")
+            print(msg_existing, end="")
+            return False
+        if accept_duplicates:
+            print(f"Adding duplicate: {src_file.name}")
+            print(msg_existing, end="")
+            return True
+        if non_interactive:
+            print(f"Skipping duplicate (non-interactive): {src_file.name}")
+            print(msg_existing, end="")
+            return False
+        # Prompt
+        print(f"\nDuplicate detected: {src_file}")
+        print(f"Size: {file_size}, Hash: {file_hash}")
+        print(msg_existing, end="")
+        response = input("Add duplicate? (y/N): ").lower()
+        return response == 'y'
 
     conn = _get_ready_connection(db_path, interactive=not non_interactive)
-    cursor = conn.cursor()
-
-    files_to_process = []
-    if source.is_file():
-        if source.name == ".DS_Store":
-            print(f"Skipping forbidden file: {source.name}")
-        else:
-            files_to_process.append(source)
-    elif source.is_dir():
-        for root, _, files in os.walk(source):
-            for file in files:
-                if file == ".DS_Store":
-                    continue
-                files_to_process.append(Path(root) / file)
-    else:
-        print(f"Error: Source {source} does not exist.")
-        sys.exit(1)
-
-    for src_file in files_to_process:
+    # A directory source keeps its structure below dest_subdir:
+    #   add /tmp/photos /year/2023 -> /root/year/2023/<files below photos>
+    #   add /tmp/photos/img.jpg /year/2023 -> /root/year/2023/img.jpg
+    metrics = MetricsFile(metrics_path, "add", root_path) if metrics_path else None
+    counts = {}
+    added_bytes = 0
+    with Archive(root_path, db_path, conn=conn) as archive:
         try:
-            # 1. Calculate Hash & Size
-            file_size = 0 if src_file.is_symlink() else src_file.stat().st_size
-            file_hash = calculate_file_hash(src_file)
-
-            # 2. Check for duplicates
-            cursor.execute("""
-                SELECT f.path 
-                FROM files f 
-                JOIN hash_index h ON f.id = h.file_id 
-                WHERE h.hash=? AND h.size=? 
-                LIMIT 11
-            """, (file_hash, file_size))
-            existing_rows = cursor.fetchall()
-            existing_paths = [row[0] for row in existing_rows]
-            
-            is_duplicate = len(existing_paths) > 0
-            should_add = True
-
-            if is_duplicate:
-                # Prepare display string for existing copies
-                msg_existing = "  Existing copies:\n"
-                for p in existing_paths[:10]:
-                    msg_existing += f"    - {p}\n"
-                if len(existing_paths) > 10:
-                    msg_existing += f"    ... and {len(existing_paths) - 10} more.\n"
-
-                if skip_duplicates:
-                    print(f"Skipping duplicate: {src_file.name}")
-                    print(msg_existing, end="")
-                    should_add = False
-                elif accept_duplicates:
-                    print(f"Adding duplicate: {src_file.name}")
-                    print(msg_existing, end="")
-                    should_add = True
-                elif non_interactive:
-                    print(f"Skipping duplicate (non-interactive): {src_file.name}")
-                    print(msg_existing, end="")
-                    should_add = False
-                else:
-                    # Prompt
-                    print(f"\nDuplicate detected: {src_file}")
-                    print(f"Size: {file_size}, Hash: {file_hash}")
-                    print(msg_existing, end="")
-                    response = input("Add duplicate? (y/N): ").lower()
-                    if response == 'y':
-                        should_add = True
-                    else:
-                        should_add = False
-            
-            if should_add:
-                # 3. Determine Destination Path
-                # We maintain the structure relative to the source directory if it's a directory add, 
-                # or just the filename if it's a file add?
-                # Spec says: "Recursively add files"
-                # Usually: add /tmp/photos /year/2023 -> /root/year/2023/photos/img.jpg
-                # Or: add /tmp/photos/img.jpg /year/2023 -> /root/year/2023/img.jpg
-                
-                if source.is_dir():
-                    rel_path = src_file.relative_to(source)
-                    final_dest = dest_dir_abs / rel_path
-                else:
-                    final_dest = dest_dir_abs / src_file.name
-
-                if final_dest.is_symlink() or final_dest.exists():
-                    print(f"Error: Destination file already exists: {final_dest}")
+            for result in archive.add_many(source, dest_subdir, decide, use_dup_filter, on_error=_report_walk_error, tree_hash=tree_hash, verify_copy=verify_copy):
+                counts[result.status] = counts.get(result.status, 0) + 1
+                if result.status in ("added", "copy_mismatch"):
+                    added_bytes += result.size
+                if result.status == "added":
+                    print(f"Added: {result.path}" + (" (copy verified)" if result.verified else ""))
+                elif result.status == "copy_mismatch":
+                    reason = f"could not be read back: {result.error}" if result.error else "does not match the source when read back"
+                    print(f"Error: The archived copy {result.path} {reason}")
+                elif result.status == "exists":
+                    print(f"Error: Destination file already exists: {result.dest}")
                     print("Skipping to avoid overwrite.")
-                    continue
-                
-                # Path stored relative to archive root
-                rel_dest_path = final_dest.relative_to(root_path)
-
-                # Skip root dotfiles/dotdirs
-                if rel_dest_path.parts[0].startswith("."):
-                    print(f"Skipping root dotfile: {rel_dest_path}")
-                    continue
-
-                final_dest.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Copy file (preserving symlinks)
-                shutil.copy2(src_file, final_dest, follow_symlinks=False)
-                
-                cursor.execute(
-                    "INSERT INTO files (path, size, hash) VALUES (?, ?, ?)",
-                    (str(rel_dest_path), file_size, file_hash)
-                )
-                file_id = cursor.lastrowid
-                cursor.execute(
-                    "INSERT INTO hash_index (hash, size, file_id) VALUES (?, ?, ?)",
-                    (file_hash, file_size, file_id)
-                )
-                conn.commit()
-                print(f"Added: {rel_dest_path}")
+                elif result.status == "root_dotfile":
+                    print(f"Skipping root dotfile: {result.dest.relative_to(root_path)}")
+                elif result.status == "forbidden":
+                    print(f"Skipping forbidden file: {result.source.name}")
+                elif result.status == "error":
+                    print(f"Error processing {result.source}: {result.error}")
+        except ArchiveError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
 
-        except Exception as e:
-            print(f"Error processing {src_file}: {e}")
-            # Continue on per-file errors as per spec
-            continue
+    if metrics:
+        metrics.set_throughput(counts.get("added", 0), added_bytes)
+        for status, count in counts.items():
+            metrics.set("add_results", count, "Source files of the last add run by outcome.", status=status)
+        metrics.write()
 
-    conn.close()
+    if counts.get("copy_mismatch"):
+        print(f"{counts['copy_mismatch']} archived copies failed the read-back check. They are indexed with the source's hash, so 'archive verify' reports them until they are copied again.")
+        sys.exit(1)
 
-def cmd_verify(root_path: Path, db_path_override: Path = None):
+def cmd_verify(root_path: Path, db_path_override: Path = None, shard: tuple[int, int] = (1, 1), report_path: Path = None, resume: bool = False, workers: int = DEFAULT_WORKERS, metrics_path: Path = None):
     """Verifies the integrity of archived files."""
     db_path = get_db_path(root_path, db_path_override)
     if not db_path.exists():
         print("Error: Archive not initialized.")
         sys.exit(1)
 
+    # Runs are recorded in the index, so verify needs a writable connection
     conn = _get_ready_connection(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT id, path, size, hash FROM files")
-    files = cursor.fetchall()
-    
-    total_files = len(files)
-    print(f"Verifying {total_files} files...")
+    archive = Archive(root_path, db_path, conn=conn)
+
+    shard_k, shard_n = shard
+    run = VerifyRun.find_unfinished(conn, shard) if resume else None
+    if run is not None:
+        # Files added since the run started are picked up as well
+        run.total = run.checked + archive.count_files(shard, run.last_file_id)
+        print(f"Resuming verify run #{run.run_id} after {run.checked}/{run.total} files ({run.issues} issues so far)...")
+    else:
+        if resume:
+            print("No unfinished verify run to resume, starting a new one.")
+        run = VerifyRun.start(conn, shard, archive.count_files(shard))
+        if shard_n > 1:
+            print(f"Verifying {run.total} files (shard {shard_k}/{shard_n})...")
+        else:
+            print(f"Verifying {run.total} files...")
+    total_files = run.total
     
-    issues = 0
-    processed_count = 0
+    report = VerifyReport(report_path, shard, total_files) if report_path else None
+    if report:
+        for file_id, rel_path_str, status in run.results():
+            report.issue(file_id, rel_path_str, status)
     
-    for file_id, rel_path_str, expected_size, expected_hash in files:
-        processed_count += 1
-        
-        if processed_count == 1 or processed_count == total_files or processed_count % 100 == 0:
-            percentage = (processed_count / total_files) * 100 if total_files > 0 else 0
-            print(f"Verifying: {processed_count}/{total_files} ({percentage:.1f}%)", end="\r")
-        
-        file_path = root_path / rel_path_str
-        
-        if not (file_path.is_symlink() or file_path.exists()):
-            print(f"\nMISSING: {rel_path_str}")
-            issues += 1
-            continue
+    metrics = MetricsFile(metrics_path, "verify", root_path) if metrics_path else None
+    checked_files = checked_bytes = 0
+    complete = False
+    try:
+        for result in archive.verify_iter(shard, run.last_file_id, workers):
+            processed_count = run.checked + 1
+            checked_files += 1
+            checked_bytes += result.checked_bytes
             
-        current_size = 0 if file_path.is_symlink() else file_path.stat().st_size
-
-        if current_size != expected_size:
-            print(f"\nCORRUPTED (Size mismatch): {rel_path_str}")
-            issues += 1
-            continue
-            
-        current_hash = calculate_file_hash(file_path)
-        if current_hash != expected_hash:
-            print(f"\nCORRUPTED (Hash mismatch): {rel_path_str}")
-            issues += 1
-            continue
+            if processed_count == 1 or processed_count == total_files or processed_count % 100 == 0:
+                percentage = (processed_count / total_files) * 100 if total_files > 0 else 0
+                print(f"Verifying: {processed_count}/{total_files} ({percentage:.1f}%)", end="\r")
             
-        # Update last_verified
-        #cursor.execute("UPDATE files SET last_verified = CURRENT_TIMESTAMP WHERE id = ?", (file_id,))
-        # Commit periodically or at end? SQLite is fast enough for batch commit at end for this tool size probably,
-        # but let's commit every file or batch to be safe against interruption?
-        # Let's commit at the end for performance.
-    
-    conn.commit()
-    conn.close()
+            if not result.ok:
+                print(f"\n{STATUS_LABELS[result.status]}: {result.path}")
+                for offset, length in result.bad_chunks[:10]:
+                    print(f"  Damaged: bytes {offset}-{offset + length - 1}")
+                if len(result.bad_chunks) > 10:
+                    print(f"  ... and {len(result.bad_chunks) - 10} more damaged chunks.")
+                if report:
+                    report.issue(result.file_id, result.path, result.status, result.bad_chunks)
+            run.record(result.file_id, result.path, result.status)
+        run.finish()
+        complete = True
+    finally:
+        if not complete:
+            # Keep what was checked so far for --resume
+            run.checkpoint()
+            print(f"\nVerify run #{run.run_id} stopped after {run.checked}/{total_files} files. Continue it with 'archive verify --resume'.")
+        if report:
+            report.close(run.checked, run.issues, complete=complete)
+        if run.touched:
+            refresh_verified(conn, run.touched)
+        if metrics and complete:
+            # Files checked by this process; issues of the whole (resumed) run
+            metrics.set_throughput(checked_files, checked_bytes)
+            metrics.set("verify_issues", run.issues, "Missing or damaged files found by the last verify run.")
+            metrics.set_archive(archive.stats())
+            metrics.write()
+        archive.close()
     
     print() # Clear progress line
+    if run.issues == 0:
+        print("Verification complete: All files OK.")
+    else:
+        print(f"Verification complete: {run.issues} issues found.")
+
+def _format_size(size: int) -> str:
+    for unit in ("bytes", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            return f"{size} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def cmd_verify_quick(root_path: Path, fraction: float, db_path_override: Path = None, shard: tuple[int, int] = (1, 1), report_path: Path = None, seed: int = None, workers: int = DEFAULT_WORKERS, metrics_path: Path = None):
+    """Checks a random sample of the archive's blocks as a cheap health check."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path, profile="read")
+    archive = Archive(root_path, db_path, conn=conn)
+    total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM files WHERE id % ? = ?", (shard[1], shard[0] - 1)).fetchone()[0]
+    print(f"Quick verify: sampling {fraction:.2%} of {_format_size(total_bytes)}...")
+    untreed = conn.execute(
+        "SELECT count(*) FROM files WHERE size >= ? AND id NOT IN (SELECT file_id FROM file_trees)",
+        (TREE_HASH_MIN_SIZE,)
+    ).fetchone()[0]
+    if untreed:
+        print(f"Note: {untreed} large files have no tree hash and are read in full when sampled. 'archive tree-hash' records them.")
+
+    # Quick runs are not recorded as verify runs and leave last_verified alone
+    report = VerifyReport(report_path, shard, archive.count_files(shard)) if report_path else None
+    metrics = MetricsFile(metrics_path, "verify_quick", root_path) if metrics_path else None
+    files = issues = checked_bytes = 0
+    try:
+        for result in archive.sample_iter(fraction, shard, seed, workers):
+            files += 1
+            checked_bytes += result.checked_bytes
+            if files == 1 or files % 100 == 0:
+                print(f"Sampled {files} files ({_format_size(checked_bytes)})", end="\r")
+            if not result.ok:
+                print(f"\n{STATUS_LABELS[result.status]}: {result.path}")
+                for offset, length in result.bad_chunks:
+                    print(f"  Damaged: bytes {offset}-{offset + length - 1}")
+                issues += 1
+                if report:
+                    report.issue(result.file_id, result.path, result.status, result.bad_chunks)
+    finally:
+        if report:
+            report.close(files, issues, complete=False)
+        archive.close()
+
+    if metrics:
+        metrics.set_throughput(files, checked_bytes)
+        metrics.set("verify_quick_issues", issues, "Damaged files found in the sample of the last quick verify run.")
+        metrics.write()
+
+    print()
+    print(f"Sampled {files} files, read {_format_size(checked_bytes)} of {_format_size(total_bytes)}.")
     if issues == 0:
+        print("Quick verification complete: No damage found in the sample. Run a full 'archive verify' to rule out damage elsewhere.")
+    else:
+        print(f"Quick verification complete: {issues} damaged files found in the sample. Run a full 'archive verify' to find all of them.")
+
+def cmd_verify_log(root_path: Path, run_id: int = None, db_path_override: Path = None):
+    """Lists recorded verify runs, or the issues found by one run."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path, profile="read")
+    try:
+        if run_id is None:
+            runs = conn.execute("SELECT id, started_at, updated_at, status, shard_k, shard_n, checked, total, issues FROM verify_runs ORDER BY id").fetchall()
+            if not runs:
+                print("No verify runs recorded.")
+            for run_id, started_at, updated_at, status, shard_k, shard_n, checked, total, issues in runs:
+                shard_str = f" shard {shard_k}/{shard_n}" if shard_n > 1 else ""
+                print(f"#{run_id} {started_at} - {updated_at} {status}{shard_str}: {checked}/{total} files, {issues} issues")
+            return
+
+        row = conn.execute("SELECT status, checked, total FROM verify_runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            print(f"Error: No verify run #{run_id}.")
+            sys.exit(1)
+        status, checked, total = row
+        results = get_run_results(conn, run_id)
+        for _, rel_path_str, issue in results:
+            print(f"{STATUS_LABELS[issue]}: {rel_path_str}")
+        print(f"Verify run #{run_id} ({status}): {checked}/{total} files checked, {len(results)} issues.")
+    finally:
+        conn.close()
+
+def cmd_verify_merge(report_paths: list[Path], output: Path = None):
+    """Combines per-shard verify reports into one result."""
+    shards = {}
+    for report_path in report_paths:
+        try:
+            header, results, summary = read_report(report_path)
+        except (OSError, ValueError) as e:
+            print(f"Error: Cannot read report {report_path}: {e}")
+            sys.exit(1)
+        k, n = header["shard"]
+        if (k, n) in shards:
+            print(f"Error: Shard {k}/{n} appears more than once ({report_path}).")
+            sys.exit(1)
+        shards[(k, n)] = (report_path, header, results, summary)
+
+    shard_counts = {n for _, n in shards}
+    if len(shard_counts) != 1:
+        print(f"Error: Reports come from different shard counts: {sorted(shard_counts)}")
+        sys.exit(1)
+    shard_n = shard_counts.pop()
+
+    complete = True
+    missing_shards = [k for k in range(1, shard_n + 1) if (k, shard_n) not in shards]
+    for k in missing_shards:
+        print(f"Warning: No report for shard {k}/{shard_n}.")
+        complete = False
+
+    checked = 0
+    total = 0
+    all_results = []
+    for (k, n), (report_path, header, results, summary) in sorted(shards.items()):
+        total += header["total"]
+        if summary is None or not summary["complete"]:
+            print(f"Warning: Shard {k}/{n} did not finish ({report_path}).")
+            complete = False
+        if summary is not None:
+            checked += summary["checked"]
+        all_results.extend(results)
+
+    all_results.sort(key=lambda r: r["id"])
+    for result in all_results:
+        print(f"{STATUS_LABELS[result['status']]}: {result['path']}")
+
+    if output:
+        merged = VerifyReport(output, (1, 1), total)
+        for result in all_results:
+            merged.issue(result["id"], result["path"], result["status"])
+        merged.close(checked, len(all_results), complete)
+
+    print(f"Merged {len(shards)}/{shard_n} shards: {checked}/{total} files checked.")
+    if not complete:
+        print(f"Verification incomplete: {len(all_results)} issues found so far.")
+    elif not all_results:
         print("Verification complete: All files OK.")
     else:
-        print(f"Verification complete: {issues} issues found.")
+        print(f"Verification complete: {len(all_results)} issues found.")
+
+def cmd_fix(root_path: Path, paths: list[Path], from_files: list[Path] = (), workers: int = DEFAULT_WORKERS, db_path_override: Path = None):
+    """Adopts the on-disk content of archived files into the index."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    rel_paths = []
+    for path in paths:
+        if path.is_absolute():
+            try:
+                # Only the parent: an archived symlink is fixed itself, not its target
+                path = (path.parent.resolve() / path.name).relative_to(root_path)
+            except ValueError:
+                print(f"Error: {path} is not inside the archive {root_path}.")
+                sys.exit(1)
+        rel_paths.append(str(path))
+    for from_file in from_files:
+        try:
+            rel_paths.extend(read_issue_paths(from_file))
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Error: Cannot read {from_file}: {e}")
+            sys.exit(1)
+
+    if not rel_paths:
+        print("Error: No files to fix.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path)
+    with Archive(root_path, db_path, conn=conn) as archive:
+        results = archive.fix(rel_paths, workers)
+
+    counts = dict.fromkeys(("fixed", "unchanged", "missing", "not_indexed", "error"), 0)
+    for result in results:
+        counts[result.status] += 1
+        if result.status == "fixed":
+            print(f"FIXED: {result.path}")
+            if result.size != result.old_size:
+                print(f"  Size: {result.old_size} -> {result.size}")
+            if result.hash != result.old_hash:
+                print(f"  Hash: {result.old_hash} -> {result.hash}")
+        elif result.status == "missing":
+            print(f"MISSING: {result.path} (cannot adopt a file that is not on disk)")
+        elif result.status == "not_indexed":
+            print(f"NOT INDEXED: {result.path}")
+        elif result.status == "error":
+            print(f"Error reading {result.path}: {result.error}")
+
+    print(f"Fix complete. {counts['fixed']} fixed, {counts['unchanged']} already matched, {counts['missing']} missing, {counts['not_indexed']} not indexed, {counts['error']} errors.")
+    if counts["not_indexed"]:
+        print("Use 'archive scan --update' to index files that are not in the index yet.")
+
+def cmd_tree_hash(root_path: Path, min_size: int = TREE_HASH_MIN_SIZE, workers: int = DEFAULT_WORKERS, db_path_override: Path = None):
+    """Records tree hashes for large archived files that lack one."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path)
+    counts = {"added": 0, "hash_mismatch": 0, "missing": 0}
+    with Archive(root_path, db_path, conn=conn) as archive:
+        for rel_path_str, status in archive.build_trees(min_size, workers):
+            counts[status] += 1
+            if status == "added":
+                print(f"Tree hashed: {rel_path_str}")
+            else:
+                # Never record leaves for content the index does not vouch for
+                print(f"{STATUS_LABELS[status]}: {rel_path_str} (skipped)")
+
+    print(f"Tree hashing complete. {counts['added']} files hashed, {counts['hash_mismatch'] + counts['missing']} skipped.")
+    if counts["hash_mismatch"] or counts["missing"]:
+        print("Run 'archive verify' to review skipped files.")
+
+def cmd_db_maintain(root_path: Path, full_vacuum: bool = False, db_path_override: Path = None):
+    """Checks the index for consistency and keeps its indices and statistics in shape."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    size_before = database_size(db_path)
+    print(f"Database: {db_path} ({_format_size(size_before)})")
+    conn = _get_ready_connection(db_path, interactive=False)
+    try:
+        for name in ensure_indices(conn):
+            print(f"Created missing index {name}.")
+
+        print("Checking consistency of files and hash_index...")
+        problems = check_consistency(conn)
+        for description, count in problems:
+            print(f"  INCONSISTENT: {count} {description}")
+
+        rebuild_rollups(conn)
+        if optimize_fts(conn):
+            print("Optimized the path search index.")
+
+        print("Analyzing...")
+        analyze(conn)
+
+        freed, done = vacuum(conn, full=full_vacuum)
+        if done:
+            print(f"Vacuumed: {freed} free pages returned.")
+        elif freed:
+            print(f"{freed} free pages can only be returned by a full vacuum (run with --vacuum).")
+        checkpoint(conn)
+    finally:
+        conn.close()
+
+    print(f"Database size: {_format_size(size_before)} -> {_format_size(database_size(db_path))}")
+    if problems:
+        print(f"Maintenance complete. {len(problems)} consistency checks failed.")
+        sys.exit(1)
+    print("Maintenance complete. Index is consistent.")
+
+def _report_walk_error(path: Path, error: OSError):
+    print(f"Error reading {path}: {error}")
+
+def _walk_archive(root_path: Path):
+    """Yields a FileEntry for every indexable file below the archive root."""
+    # Skips .archive-index and root dotfiles; hidden files below root are kept
+    return walk_files(root_path, archive_root=True, on_error=_report_walk_error)
+
+def cmd_store_xattrs(root_path: Path, db_path_override: Path = None):
+    """Stores the indexed digest of every unchanged archived file in its extended attributes."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path, profile="bulk")
+    archive = Archive(root_path, db_path, conn=conn)
+    counts = {}
+    try:
+        for i, (rel_path_str, status) in enumerate(archive.store_xattrs(), 1):
+            counts[status] = counts.get(status, 0) + 1
+            if status == "stale":
+                print(f"Changed since indexed: {rel_path_str}")
+            elif status in ("missing", "error"):
+                print(f"{status.upper()}: {rel_path_str}")
+            if i % 1000 == 0:
+                print(f"Checked {i} files...", end="\r")
+        checkpoint(conn)
+    finally:
+        archive.close()
+
+    print(f"\nStored digests of {counts.get('written', 0)} files ({counts.get('current', 0)} already current).")
+    if counts.get("unsupported"):
+        print(f"{counts['unsupported']} files cannot carry extended attributes (symlinks or file system without xattr support).")
+    if counts.get("stale"):
+        print(f"{counts['stale']} files changed since they were indexed; run 'scan --update' and try again.")
+    if counts.get("missing") or counts.get("error"):
+        sys.exit(1)
 
-def cmd_scan(root_path: Path, resume: bool = False, db_path_override: Path = None):
+def cmd_scan(root_path: Path, resume: bool = False, db_path_override: Path = None, update: bool = False, prune: bool = False, tree_hash: bool = False, trust_xattrs: bool = False, metrics_path: Path = None):
     """Rebuilds the database from disk."""
     db_path = get_db_path(root_path, db_path_override)
+
+    metrics = MetricsFile(metrics_path, "scan", root_path) if metrics_path else None
+    if update:
+        _scan_update(root_path, db_path, prune, tree_hash, metrics)
+        return
     
     existing_paths = set()
 
     if db_path.exists():
-        conn = _get_ready_connection(db_path)
+        conn = _get_ready_connection(db_path, profile="bulk")
         cursor = conn.cursor()
 
         if not resume:
             cursor.execute("SELECT count(*) FROM files")
             if cursor.fetchone()[0] > 0:
-                print("Error: Database already contains data. Use --continue to resume or delete the database to restart.")
+                print("Error: Database already contains data. Use --continue to resume, --update to sync or delete the database to restart.")
                 conn.close()
                 sys.exit(1)
 
@@ -280,97 +572,436 @@ def cmd_scan(root_path: Path, resume: bool = False, db_path_override: Path = Non
             print(f"Found {len(existing_paths)} existing entries in database.")
         else:
             print("Rebuilding database...")
+            cursor.execute("DELETE FROM dir_rollups")
+            cursor.execute("DELETE FROM file_chunks")
+            cursor.execute("DELETE FROM file_trees")
             cursor.execute("DELETE FROM hash_index")
             cursor.execute("DELETE FROM files")
             cursor.execute("DELETE FROM sqlite_sequence") # Reset autoincrement
             conn.commit()
     else:
         init_db(db_path)
-        conn = get_connection(db_path)
+        conn = get_connection(db_path, "bulk")
         cursor = conn.cursor()
 
     count = 0
     skipped_count = 0
-    # Walk archive excluding .archive-index
-    for root, dirs, files in os.walk(root_path):
-        # Modify dirs in-place to skip .archive-index
-        if DB_DIR_NAME in dirs:
-            dirs.remove(DB_DIR_NAME)
-        
-        # If in root, skip hidden directories and files
-        if Path(root) == root_path:
-             # Filter out hidden directories (e.g. .git, .config)
-             dirs[:] = [d for d in dirs if not d.startswith(".")]
-             
-             # Filter out hidden files
-             files = [f for f in files if not f.startswith(".")]
-
-        for file in files:
-            if file == ".DS_Store":
+    trusted_count = 0
+    indexed_bytes = 0
+    for file_path, st in _walk_archive(root_path):
+        try:
+            rel_path = file_path.relative_to(root_path)
+            rel_path_str = str(rel_path)
+
+            if resume and rel_path_str in existing_paths:
+                skipped_count += 1
                 continue
-            file_path = Path(root) / file
-            # "Include hidden files below root" -> so we don't skip hidden files here.
-            
-            try:
-                rel_path = file_path.relative_to(root_path)
-                rel_path_str = str(rel_path)
-
-                if resume and rel_path_str in existing_paths:
-                    skipped_count += 1
-                    continue
-
-                size = 0 if file_path.is_symlink() else file_path.stat().st_size
-
-                file_hash = calculate_file_hash(file_path)
-                
-                cursor.execute(
-                    "INSERT INTO files (path, size, hash) VALUES (?, ?, ?)",
-                    (rel_path_str, size, file_hash)
-                )
-                file_id = cursor.lastrowid
-                cursor.execute(
-                    "INSERT INTO hash_index (hash, size, file_id) VALUES (?, ?, ?)",
-                    (file_hash, size, file_id)
-                )
-                count += 1
-                if count % 100 == 0:
-                    print(f"Scanned {count} files...", end="\r")
-                    conn.commit()
-            except Exception as e:
-                print(f"Error scanning {file_path}: {e}")
+
+            size = 0 if stat.S_ISLNK(st.st_mode) else st.st_size
+
+            file_hash = read_digest(file_path, st) if trust_xattrs else None
+            if file_hash is not None:
+                digests = None
+                trusted_count += 1
+            else:
+                file_hash, digests = hash_for_index(file_path, st, tree_hash)
+
+            # Rollups are rebuilt in one go at the end
+            file_id = insert_file(cursor, rel_path_str, size, file_hash, st, rollup=False)
+            if digests is not None:
+                store_tree(cursor, file_id, digests)
+            count += 1
+            indexed_bytes += size
+            if count % 100 == 0:
+                print(f"Scanned {count} files...", end="\r")
+            if count % SCAN_COMMIT_INTERVAL == 0:
+                conn.commit()
+        except Exception as e:
+            print(f"Error scanning {file_path}: {e}")
 
     conn.commit()
+    rebuild_rollups(conn)
+    checkpoint(conn)
     conn.close()
     if resume:
         print(f"\nScan complete. Added {count} new files (Skipped {skipped_count} existing).")
     else:
         print(f"\nScan complete. Indexed {count} files.")
+    if trust_xattrs:
+        print(f"Took the digests of {trusted_count} files from their extended attributes, hashed {count - trusted_count}.")
+    if metrics:
+        metrics.set_throughput(count, indexed_bytes)
+        metrics.write()
+
+def _scan_update(root_path: Path, db_path: Path, prune: bool, tree_hash: bool = False, metrics: MetricsFile = None):
+    """Syncs the index with disk, re-hashing only files whose stat signature changed."""
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path, profile="bulk")
+    archive = Archive(root_path, db_path, conn=conn)
+
+    print("Updating database...")
+    indexed_count = conn.execute("SELECT count(*) FROM files").fetchone()[0]
+    print(f"Found {indexed_count} existing entries in database.")
 
-def cmd_status(root_path: Path, db_path_override: Path = None):
+    counts = dict.fromkeys(("new", "changed", "resigned", "unchanged", "gone", "removed"), 0)
+    hashed_bytes = 0
+    for event in archive.scan_iter(prune, SCAN_COMMIT_INTERVAL, on_error=_report_walk_error, tree_hash=tree_hash):
+        if event.status == "error":
+            print(f"Error scanning {root_path / event.path}: {event.error}")
+            continue
+        counts[event.status] += 1
+        hashed_bytes += event.hashed_bytes
+        if event.status in ("new", "changed", "gone", "removed"):
+            print(f"{event.status.upper()}: {event.path}")
+
+    checkpoint(conn)
+    archive.close()
+    if metrics:
+        # Bytes are those hashed; unchanged files cost only a stat
+        metrics.set_throughput(sum(counts.values()), hashed_bytes)
+        for status, count in counts.items():
+            metrics.set("scan_update_files", count, "Files seen by the last scan --update by outcome.", status=status)
+        metrics.write()
+    gone = counts["gone"] + counts["removed"]
+    print(f"Update complete. {counts['new']} new, {counts['changed']} changed, {counts['resigned']} re-signed, {counts['unchanged']} unchanged, {gone} gone.")
+    if gone and not prune:
+        print("Use --prune to remove entries for files that are gone.")
+
+def _print_status(root_path: Path, stats: Stats):
+    print(f"Archive Status for {root_path}")
+    print(f"--------------------------------")
+    print(f"Total Files: {stats.file_count}")
+    print(f"Total Size:  {stats.total_size} bytes")
+    print(f"Duplicate Groups: {stats.duplicate_groups}")
+    print(f"Unverified Files: {stats.never_verified}")
+
+def _print_dir_stats(dir_stats: list[DirStats]):
+    print()
+    print(f"{'Files':>10}  {'Size':>15}  {'Duplicates':>15}  {'Unverified':>10}  {'Oldest verified':<19}  Directory")
+    for d in dir_stats:
+        oldest = d.oldest_verified or "never"
+        print(f"{d.file_count:>10}  {d.total_bytes:>15}  {d.dup_bytes:>15}  {d.unverified:>10}  {oldest:<19}  {d.dir}/")
+
+def cmd_status(root_path: Path, db_path_override: Path = None, by_dir: bool = False, depth: int = 1, rebuild: bool = False, metrics_path: Path = None):
     """Displays archive status."""
     db_path = get_db_path(root_path, db_path_override)
     if not db_path.exists():
         print("Archive not initialized.")
         return
 
-    conn = _get_ready_connection(db_path)
+    if rebuild:
+        with Archive(root_path, db_path, conn=_get_ready_connection(db_path)) as archive:
+            archive.rebuild_rollups()
+
+    conn = _get_ready_connection(db_path, profile="read")
+    with Archive(root_path, db_path, conn=conn) as archive:
+        stats = archive.stats()
+        _print_status(root_path, stats)
+        dir_stats = archive.dir_stats(depth) if by_dir else []
+        if by_dir:
+            _print_dir_stats(dir_stats)
+
+    if metrics_path:
+        metrics = MetricsFile(metrics_path, "status", root_path)
+        metrics.set_archive(stats)
+        for d in dir_stats:
+            metrics.set("dir_bytes", d.total_bytes, "Total size of the indexed files below a directory.", dir=d.dir)
+            metrics.set("dir_unverified_files", d.unverified, "Indexed files below a directory that were never verified.", dir=d.dir)
+        metrics.write()
+
+def cmd_find(root_path: Path, pattern: str, limit: int = None, db_path_override: Path = None):
+    """Searches the index for archived paths, without touching the archive disk."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path, profile="read")
+    with Archive(root_path, db_path, conn=conn) as archive:
+        matches = archive.find(pattern, limit)
+    for rel_path_str, _ in matches:
+        print(rel_path_str)
+    if limit is not None and len(matches) == limit:
+        print(f"(showing the first {limit} matches)")
+
+def cmd_ls(root_path: Path, rel_dir: str = "", db_path_override: Path = None):
+    """Lists an archive directory from the index."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    if Path(rel_dir).is_absolute():
+        try:
+            rel_dir = str(Path(rel_dir).resolve().relative_to(root_path))
+        except ValueError:
+            print(f"Error: {rel_dir} is not inside the archive {root_path}.")
+            sys.exit(1)
+
+    conn = _get_ready_connection(db_path, profile="read")
+    with Archive(root_path, db_path, conn=conn) as archive:
+        entries = archive.ls(rel_dir)
+    if not entries and rel_dir.strip("/") not in ("", "."):
+        print(f"Error: No archived files below {rel_dir}.")
+        sys.exit(1)
+    for name, is_dir, size in entries:
+        if is_dir:
+            print(f"{'':>12}  {name}/")
+        else:
+            print(f"{size:>12}  {name}")
+
+def cmd_check(root_path: Path, sources: list[Path], workers: int = DEFAULT_WORKERS, db_path_override: Path = None):
+    """Reports which files of external sources are already in the archive."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path, profile="read")
+    try:
+        _check(conn, sources, workers)
+    finally:
+        conn.close()
+
+def _query_known_sizes(conn: sqlite3.Connection) -> set[int]:
+    return {row[0] for row in conn.execute("SELECT DISTINCT size FROM hash_index")}
+
+def _check(conn: sqlite3.Connection, sources: list[Path], workers: int = DEFAULT_WORKERS, executor=None, known_sizes: set[int] = None):
+    """Core of `check`, run on an open connection (also used by `serve`)."""
+    entries = []
+    for source in sources:
+        if source.is_symlink() or source.is_file():
+            if source.name != ".DS_Store":
+                entries.append(file_entry(source))
+        elif source.is_dir():
+            entries.extend(walk_files(source, on_error=_report_walk_error))
+        else:
+            print(f"Error: Source {source} does not exist.")
+            sys.exit(1)
+
     cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*), SUM(size) FROM files")
-    file_count, total_size = cursor.fetchone()
-    if total_size is None: total_size = 0
-    
-    cursor.execute("SELECT COUNT(*) FROM (SELECT hash, size FROM hash_index GROUP BY hash, size HAVING COUNT(*) > 1)")
-    duplicate_groups = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) FROM files WHERE last_verified IS NULL")
-    never_verified = cursor.fetchone()[0]
-    
-    print(f"Archive Status for {root_path}")
-    print(f"--------------------------------")
-    print(f"Total Files: {file_count}")
-    print(f"Total Size:  {total_size} bytes")
-    print(f"Duplicate Groups: {duplicate_groups}")
-    print(f"Unverified Files: {never_verified}")
-    
+
+    # Size pre-filter: a file whose size is not in the index cannot be a
+    # duplicate, so there is no need to read it at all.
+    if known_sizes is None:
+        known_sizes = _query_known_sizes(conn)
+
+    missing = []
+    candidates = []
+    errors = 0
+    for entry in entries:
+        if entry.size in known_sizes:
+            candidates.append(entry)
+        else:
+            missing.append((entry.path, entry.size))
+
+    print(f"Checking {len(entries)} files ({len(candidates)} need hashing)...")
+
+    # Hash the remaining candidates in parallel, then resolve all of them
+    # with a single join instead of one query per file.
+    cursor.execute("CREATE TEMP TABLE check_candidates (idx INTEGER PRIMARY KEY, hash TEXT NOT NULL, size INTEGER NOT NULL)")
+    try:
+        hashed = []
+        rows = []
+        for (src_file, file_hash, error), entry in zip(hash_files(candidates, workers, executor), candidates):
+            if error is not None:
+                print(f"Error checking {src_file}: {error}")
+                errors += 1
+                continue
+            rows.append((len(hashed), file_hash, entry.size))
+            hashed.append((src_file, entry.size))
+        cursor.executemany("INSERT INTO check_candidates (idx, hash, size) VALUES (?, ?, ?)", rows)
+
+        cursor.execute("""
+            SELECT c.idx, MIN(f.path)
+            FROM check_candidates c
+            JOIN hash_index h ON h.hash = c.hash AND h.size = c.size
+            JOIN files f ON f.id = h.file_id
+            GROUP BY c.idx
+        """)
+        matches = dict(cursor.fetchall())
+    finally:
+        # The serve connection outlives this request
+        cursor.execute("DROP TABLE check_candidates")
+
+    present = []
+    for idx, (src_file, size) in enumerate(hashed):
+        if idx in matches:
+            present.append((src_file, size, matches[idx]))
+        else:
+            missing.append((src_file, size))
+
+    for src_file, _, archived_path in sorted(present):
+        print(f"PRESENT: {src_file} -> {archived_path}")
+    for src_file, _ in sorted(missing):
+        print(f"MISSING: {src_file}")
+
+    print(f"Check complete: {len(present) + len(missing)} files checked.")
+    print(f"Present: {len(present)} files ({sum(p[1] for p in present)} bytes)")
+    print(f"Missing: {len(missing)} files ({sum(m[1] for m in missing)} bytes)")
+    if errors:
+        print(f"Errors:  {errors} files could not be read")
+
+def cmd_export_manifest(root_path: Path, output: Path, db_path_override: Path = None):
+    """Exports the index as a compact sorted manifest."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path, profile="read")
+    count = write_manifest(output, iter_db_entries(conn))
     conn.close()
+    print(f"Exported {count} entries to {output} ({output.stat().st_size} bytes).")
+
+def cmd_diff(location_a: Path, location_b: Path):
+    """Compares two manifests, databases or archive roots."""
+    for location in (location_a, location_b):
+        if not location.exists():
+            print(f"Error: {location} does not exist.")
+            sys.exit(1)
+
+    counts = {"missing": 0, "extra": 0, "mismatch": 0}
+    with open_entries(location_a) as entries_a, open_entries(location_b) as entries_b:
+        for kind, path in diff_entries(entries_a, entries_b):
+            counts[kind] += 1
+            print(f"{kind.upper()}: {path}")
+
+    if not any(counts.values()):
+        print("Diff complete: Indices are identical.")
+    else:
+        print(f"Diff complete: {counts['missing']} missing, {counts['extra']} extra, {counts['mismatch']} mismatched.")
+
+def cmd_replicate(root_path: Path, dest_root: Path, workers: int = DEFAULT_WORKERS, reuse: bool = True, db_path_override: Path = None):
+    """Brings a mirror archive up to date by copying only what its index lacks."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+    if not dest_root.is_dir():
+        print(f"Error: Mirror {dest_root} does not exist.")
+        sys.exit(1)
+    root_abs, dest_abs = root_path.resolve(), dest_root.resolve()
+    if root_abs == dest_abs or root_abs in dest_abs.parents or dest_abs in root_abs.parents:
+        print("Error: The mirror must not overlap the archive.")
+        sys.exit(1)
+
+    dest_db_path = get_db_path(dest_root)
+    if not dest_db_path.exists():
+        init_db(dest_db_path).close()
+        print(f"Mirror initialized at {dest_root}")
+
+    print(f"Comparing {root_path} with {dest_root}...")
+    counts = {"copied": 0, "reused": 0, "adopted": 0, "exists": 0, "conflict": 0, "extra": 0, "mismatch": 0, "error": 0}
+    copied_bytes = 0
+    with Archive(root_path, db_path, conn=_get_ready_connection(db_path, interactive=False, profile="read")) as archive, \
+         Archive(dest_root, dest_db_path, conn=_get_ready_connection(dest_db_path, interactive=False)) as mirror:
+        for result in archive.replicate_to(mirror, workers, reuse):
+            counts[result.status] += 1
+            if result.status == "copied":
+                copied_bytes += result.size
+                print(f"Copied: {result.path}")
+            elif result.status == "reused":
+                print(f"Copied: {result.path} (from {result.reused_from} on the mirror)")
+            elif result.status == "adopted":
+                print(f"Indexed: {result.path} (already on the mirror)")
+            elif result.status == "exists":
+                print(f"Skipped: {result.path} (a different file exists on the mirror)")
+            elif result.status == "conflict":
+                print(f"CONFLICT: {result.path} (indexed with different content on the mirror)")
+            elif result.status == "mismatch":
+                print(f"CORRUPTED (Hash mismatch): {result.path} (not copied; run 'archive verify')")
+            elif result.status == "error":
+                print(f"Error copying {result.path}: {result.error}")
+
+    print(f"Replication complete. {counts['copied']} files copied ({_format_size(copied_bytes)}), "
+          f"{counts['reused']} copied from identical content on the mirror, {counts['adopted']} already present.")
+    if counts["extra"]:
+        print(f"{counts['extra']} files exist only on the mirror (left in place).")
+    failed = counts["exists"] + counts["conflict"] + counts["mismatch"] + counts["error"]
+    if failed:
+        print(f"{failed} files could not be replicated.")
+        sys.exit(1)
+
+def cmd_watch(root_path: Path, workers: int = DEFAULT_WORKERS, debounce: float = DEFAULT_DEBOUNCE, db_path_override: Path = None):
+    """Keeps the index current by watching the archive tree with inotify."""
+    if not sys.platform.startswith("linux"):
+        print("Error: watch requires Linux inotify.")
+        sys.exit(1)
+
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path, interactive=False)
+    watcher = ArchiveWatcher(root_path, conn, workers=workers, debounce=debounce)
+    try:
+        watcher.start()
+        print(f"Watching {root_path} ({len(watcher.watches)} directories). Press Ctrl-C to stop.")
+        print("Note: files added while not watching are picked up by 'archive scan --update'.")
+        watcher.run()
+    finally:
+        watcher.close()
+        conn.close()
+        print(f"\nWatch stopped. Indexed {watcher.indexed_count} files.")
+
+def cmd_serve(root_path: Path, workers: int = DEFAULT_WORKERS, db_path_override: Path = None):
+    """Serves read-only commands from a long-lived process."""
+    db_path = get_db_path(root_path, db_path_override)
+    if not db_path.exists():
+        print("Error: Archive not initialized.")
+        sys.exit(1)
+
+    conn = _get_ready_connection(db_path, interactive=False, profile="read")
+    archive = Archive(root_path, db_path, conn=conn)
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+
+    # Results derived from the whole index are cached until another
+    # connection commits, which bumps PRAGMA data_version.
+    cache = {}
+    def cached(key, compute):
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if cache.get("version") != version:
+            cache.clear()
+            cache["version"] = version
+        if key not in cache:
+            cache[key] = compute()
+        return cache[key]
+
+    def check_root(request):
+        if request.get("root") != str(root_path):
+            print(f"Error: This server serves {root_path}, not {request.get('root')}.")
+            sys.exit(1)
+
+    def handle_status(request):
+        check_root(request)
+        _print_status(root_path, cached("status", archive.stats))
+        if request.get("by_dir"):
+            depth = request.get("depth", 1)
+            _print_dir_stats(cached(("dirs", depth), lambda: archive.dir_stats(depth)))
+
+    def handle_check(request):
+        check_root(request)
+        sources = [Path(p) for p in request["sources"]]
+        known_sizes = cached("sizes", lambda: _query_known_sizes(conn))
+        _check(conn, sources, request.get("workers", workers), executor, known_sizes)
+
+    try:
+        server = ArchiveServer(get_socket_path(db_path), {"status": handle_status, "check": handle_check})
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(f"Serving {root_path} on {server.socket_path}. Press Ctrl-C to stop.")
+    # Clean up the socket on `kill` as well as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve()
+    finally:
+        server.close()
+        executor.shutdown()
+        conn.close()
@@ -1,7 +1,15 @@
 import sqlite3
 import os
+import random
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+from .migrations import migrate
+from .rollup import join_content, leave_content, mark_verified
+from .treehash import drop_tree
+from .utils import stat_signature
+
 DB_DIR_NAME = ".archive-index"
 DB_NAME = "archive.db"
 
@@ -13,6 +21,14 @@ def get_db_path(root_path: Path, db_path_override: Path = None) -> Path:
 def init_db(db_path: Path):
     """Initialize the database schema."""
     db_path.parent.mkdir(parents=True, exist_ok=True)
+    if not db_path.exists():
+        # auto_vacuum must be chosen before anything is written, including
+        # the switch to WAL. It lets db-maintain return free pages to the
+        # file system without rewriting the whole database.
+        new_conn = sqlite3.connect(db_path)
+        new_conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        new_conn.execute("PRAGMA journal_mode=WAL")
+        new_conn.close()
     conn = get_connection(db_path)
     cursor = conn.cursor()
     
@@ -23,7 +39,10 @@ def init_db(db_path: Path):
         size INTEGER NOT NULL,
         hash TEXT NOT NULL,
         added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        last_verified TIMESTAMP
+        last_verified TIMESTAMP,
+        mtime_ns INTEGER,
+        inode INTEGER,
+        ctime_ns INTEGER
     )
     """)
     
@@ -36,27 +55,175 @@ def init_db(db_path: Path):
     )
     """)
     
-    # Adding an index for performance as per common sense, though spec didn't explicitly ask for the CREATE INDEX statement, 
-    # it implies it's an index.
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hash_size ON hash_index(hash, size)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_files_path ON files(path)")
-    
+    conn.commit()
+    # A new database goes through the same migrations as an old one
+    migrate(conn)
+    for statement in INDICES.values():
+        cursor.execute(statement)
     conn.commit()
     return conn
 
-def get_connection(db_path: Path) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
+# Connection profiles, applied as PRAGMAs after connecting.
+#   write: interactive commands that modify the index (add, watch, fix, ...)
+#   read:  commands that only read the index, opened with mode=ro
+#   bulk:  long-running writers (scan) that insert millions of rows
+# Large indices are served from memory-mapped pages instead of read() calls.
+PROFILES = {
+    "write": {
+        "busy_timeout": 5000,
+        "cache_size": -64 * 1024,          # KiB, i.e. 64 MB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "read": {
+        "busy_timeout": 5000,
+        "cache_size": -64 * 1024,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "bulk": {
+        "busy_timeout": 5000,
+        "cache_size": -256 * 1024,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        # Checkpoint every ~40 MB of WAL instead of every ~4 MB
+        "wal_autocheckpoint": 10000,
+    },
+}
+READ_ONLY_PROFILES = {"read"}
+
+# User overrides (from -P/--sqlite-pragma or ARCHIVER_SQLITE_PRAGMAS), applied
+# on top of every profile.
+PRAGMA_OVERRIDES = {}
+
+def parse_pragmas(spec: str) -> dict:
+    """Parses 'name=value[,name=value...]' into a dict of PRAGMA settings."""
+    pragmas = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, value = item.partition("=")
+        name, value = name.strip().lower(), value.strip()
+        if not sep or not name.isidentifier() or not (value.lstrip("-").isdigit() or value.isidentifier()):
+            raise ValueError(f"Invalid SQLite pragma setting '{item}', expected name=value")
+        pragmas[name] = int(value) if value.lstrip("-").isdigit() else value
+    return pragmas
+
+def get_connection(db_path: Path, profile: str = "write") -> sqlite3.Connection:
+    if profile in READ_ONLY_PROFILES:
+        conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+    for name, value in {**PROFILES[profile], **PRAGMA_OVERRIDES}.items():
+        conn.execute(f"PRAGMA {name}={value};")
     return conn
 
+# Attempts at taking the write lock, each waiting up to busy_timeout
+WRITE_LOCK_ATTEMPTS = 5
+
+@contextmanager
+def write_transaction(conn: sqlite3.Connection):
+    """Runs a block in a BEGIN IMMEDIATE transaction and commits it.
+
+    The write lock is taken up front, so concurrent writers queue on
+    busy_timeout instead of failing when a read turns into a write. If the
+    lock is still busy after that, taking it is retried with a randomized
+    backoff before giving up.
+    """
+    conn.commit()
+    for attempt in range(1, WRITE_LOCK_ATTEMPTS + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            break
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or attempt == WRITE_LOCK_ATTEMPTS:
+                raise
+            time.sleep(random.uniform(0.05, 0.25) * attempt)
+    try:
+        yield conn.cursor()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+def checkpoint(conn: sqlite3.Connection):
+    """Folds the WAL back into the database after a bulk write."""
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
+# Indices on the core tables. Databases from older versions may lack some,
+# and they can be dropped by hand; `db-maintain` recreates them.
+INDICES = {
+    "idx_hash_size": "CREATE INDEX IF NOT EXISTS idx_hash_size ON hash_index(hash, size)",
+    "idx_files_path": "CREATE INDEX IF NOT EXISTS idx_files_path ON files(path)",
+    "idx_verify_results_run": "CREATE INDEX IF NOT EXISTS idx_verify_results_run ON verify_results(run_id, file_id)",
+}
+
 def check_missing_indices(conn: sqlite3.Connection) -> list[str]:
-    """Checks for missing optional indices."""
-    cursor = conn.cursor()
-    missing = []
-    
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND name='idx_files_path'")
-    if not cursor.fetchone():
-        missing.append("idx_files_path")
-        
+    """Checks for missing indices."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    return [name for name in INDICES if name not in existing]
+
+def ensure_indices(conn: sqlite3.Connection) -> list[str]:
+    """Creates missing indices without asking, returning their names."""
+    missing = check_missing_indices(conn)
+    for name in missing:
+        conn.execute(INDICES[name])
+    if missing:
+        conn.commit()
     return missing
+
+def insert_file(cursor: sqlite3.Cursor, rel_path_str: str, size: int, file_hash: str, st: os.stat_result, rollup: bool = True) -> int:
+    """Inserts a file into `files` and `hash_index`, returning its id.
+
+    Bulk writers pass `rollup=False` and call rebuild_rollups once at the end.
+    """
+    cursor.execute(
+        "INSERT INTO files (path, size, hash, mtime_ns, inode, ctime_ns) VALUES (?, ?, ?, ?, ?, ?)",
+        (rel_path_str, size, file_hash, *stat_signature(st))
+    )
+    file_id = cursor.lastrowid
+    if rollup:
+        join_content(cursor, file_id, rel_path_str, file_hash, size, new_file=True)
+    cursor.execute(
+        "INSERT INTO hash_index (hash, size, file_id) VALUES (?, ?, ?)",
+        (file_hash, size, file_id)
+    )
+    return file_id
+
+def set_verified(cursor: sqlite3.Cursor, file_id: int, rel_path_str: str):
+    """Records that a file that was never verified matches its hash."""
+    cursor.execute("UPDATE files SET last_verified = CURRENT_TIMESTAMP WHERE id = ? AND last_verified IS NULL", (file_id,))
+    if cursor.rowcount:
+        mark_verified(cursor, file_id, rel_path_str)
+
+def replace_hash_index(cursor: sqlite3.Cursor, file_id: int, file_hash: str, size: int):
+    """Points a file's hash_index entry at new content.
+
+    Delete and re-insert rather than UPDATE, so hash_index stays append-only
+    from the point of view of readers that follow it by rowid (see dupfilter).
+    A tree hash of the old content is dropped.
+    """
+    drop_tree(cursor, file_id)
+    old_hash, old_size, rel_path_str = cursor.execute(
+        "SELECT h.hash, h.size, f.path FROM hash_index h JOIN files f ON f.id = h.file_id WHERE h.file_id = ?", (file_id,)
+    ).fetchone()
+    leave_content(cursor, file_id, rel_path_str, old_hash, old_size, removed=False)
+    cursor.execute("DELETE FROM hash_index WHERE file_id = ?", (file_id,))
+    join_content(cursor, file_id, rel_path_str, file_hash, size, new_file=False)
+    cursor.execute(
+        "INSERT INTO hash_index (hash, size, file_id) VALUES (?, ?, ?)",
+        (file_hash, size, file_id)
+    )
+
+def delete_file(cursor: sqlite3.Cursor, file_id: int):
+    """Removes a file and everything recorded about it from the index."""
+    rel_path_str, file_hash, size, last_verified = cursor.execute(
+        "SELECT f.path, h.hash, h.size, f.last_verified FROM files f JOIN hash_index h ON h.file_id = f.id WHERE f.id = ?", (file_id,)
+    ).fetchone()
+    leave_content(cursor, file_id, rel_path_str, file_hash, size, removed=True, verified=last_verified is not None)
+    drop_tree(cursor, file_id)
+    cursor.execute("DELETE FROM hash_index WHERE file_id = ?", (file_id,))
+    cursor.execute("DELETE FROM files WHERE id = ?", (file_id,))
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import struct
+from pathlib import Path
+
+# Bloom filter sizing: 16 bits per entry and 4 probes give a false positive
+# rate of about 0.25%. False positives only cost one extra index query.
+BITS_PER_ENTRY = 16
+NUM_PROBES = 4
+MIN_CAPACITY = 100_000
+
+MAGIC = b"ARCHDUP1"
+# num_bits, max_rowid, count, sentinel size, sentinel hash
+HEADER = struct.Struct(">Qqqq64s")
+
+def get_filter_path(db_path: Path) -> Path:
+    """The filter is persisted next to the database it summarizes."""
+    return db_path.parent / (db_path.name + ".dupfilter")
+
+class DuplicateFilter:
+    """In-memory Bloom filter over the (size, hash) pairs in hash_index.
+
+    A negative answer means the content is definitely not archived, so the
+    index query can be skipped. The filter is persisted alongside the DB and
+    caught up incrementally from hash_index rowids on the next run.
+    """
+
+    def __init__(self, num_bits: int):
+        self.num_bits = num_bits
+        self.bits = bytearray((num_bits + 7) // 8)
+        self.max_rowid = 0
+        self.count = 0
+        # Content of the row at max_rowid, used to detect rowid reuse
+        self.sentinel = (0, "")
+
+    @property
+    def capacity(self) -> int:
+        return self.num_bits // BITS_PER_ENTRY
+
+    def _positions(self, size: int, file_hash: str):
+        # The SHA-256 digest is already uniformly distributed, so its bits can
+        # serve directly as the two base hashes for double hashing.
+        h1 = int(file_hash[:16], 16)
+        h2 = (int(file_hash[16:32], 16) ^ size) | 1
+        for i in range(NUM_PROBES):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, size: int, file_hash: str):
+        for pos in self._positions(size, file_hash):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, size: int, file_hash: str) -> bool:
+        for pos in self._positions(size, file_hash):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def catch_up(self, conn: sqlite3.Connection):
+        """Adds hash_index rows inserted since the filter was last updated."""
+        cursor = conn.execute("SELECT rowid, hash, size FROM hash_index WHERE rowid > ? ORDER BY rowid", (self.max_rowid,))
+        for rowid, file_hash, size in cursor:
+            self.add(size, file_hash)
+            self.max_rowid = rowid
+            self.sentinel = (size, file_hash)
+            self.count += 1
+
+    @classmethod
+    def build(cls, conn: sqlite3.Connection) -> "DuplicateFilter":
+        count = conn.execute("SELECT count(*) FROM hash_index").fetchone()[0]
+        dup_filter = cls(max(2 * count, MIN_CAPACITY) * BITS_PER_ENTRY)
+        dup_filter.catch_up(conn)
+        return dup_filter
+
+    @classmethod
+    def load(cls, filter_path: Path, conn: sqlite3.Connection) -> "DuplicateFilter | None":
+        """Loads a persisted filter, or returns None if it no longer matches the index."""
+        try:
+            with open(filter_path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    return None
+                num_bits, max_rowid, count, sentinel_size, sentinel_hash = HEADER.unpack(f.read(HEADER.size))
+                dup_filter = cls(num_bits)
+                if f.readinto(dup_filter.bits) != len(dup_filter.bits):
+                    return None
+        except (OSError, struct.error):
+            return None
+        dup_filter.max_rowid = max_rowid
+        dup_filter.count = count
+        dup_filter.sentinel = (sentinel_size, sentinel_hash.decode("ascii").rstrip("\0"))
+
+        # Rows may only have been appended since the filter was saved: any
+        # delete, update or rowid reuse means it has to be rebuilt.
+        total = conn.execute("SELECT count(*) FROM hash_index").fetchone()[0]
+        newer = conn.execute("SELECT count(*) FROM hash_index WHERE rowid > ?", (max_rowid,)).fetchone()[0]
+        if total != count + newer or total > dup_filter.capacity:
+            return None
+        if max_rowid:
+            row = conn.execute("SELECT size, hash FROM hash_index WHERE rowid = ?", (max_rowid,)).fetchone()
+            if row != dup_filter.sentinel:
+                return None
+        dup_filter.catch_up(conn)
+        return dup_filter
+
+    @classmethod
+    def open(cls, filter_path: Path, conn: sqlite3.Connection) -> "DuplicateFilter":
+        return cls.load(filter_path, conn) or cls.build(conn)
+
+    def save(self, filter_path: Path):
+        tmp_path = filter_path.with_name(filter_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(HEADER.pack(self.num_bits, self.max_rowid, self.count, self.sentinel[0], self.sentinel[1].encode("ascii")))
+            f.write(self.bits)
+        os.replace(tmp_path, filter_path)
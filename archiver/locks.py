@@ -0,0 +1,31 @@
+import fcntl
+import hashlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+LOCK_DIR_NAME = "locks"
+
+def get_lock_path(db_path: Path, rel_dir: str) -> Path:
+    """Lock file of an archive directory, kept next to the database."""
+    name = hashlib.sha1(rel_dir.encode("utf-8")).hexdigest()[:16]
+    return db_path.parent / LOCK_DIR_NAME / f"{name}.lock"
+
+@contextmanager
+def directory_lock(db_path: Path, rel_dir: str):
+    """Holds an exclusive advisory lock on an archive directory.
+
+    Writers hold it while they move a finished copy into the directory and
+    index it, so concurrent processes never both claim one destination
+    name. Copying happens before the lock is taken, so writers into the
+    same directory only queue for that short step.
+    """
+    lock_path = get_lock_path(db_path, rel_dir)
+    lock_path.parent.mkdir(exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
@@ -1,12 +1,33 @@
 import argparse
+import os
 import sys
 from pathlib import Path
-from .commands import cmd_init, cmd_add, cmd_verify, cmd_scan, cmd_status
+from .database import PRAGMA_OVERRIDES, parse_pragmas, get_db_path
+from .server import FORWARDED_COMMANDS, forward, get_socket_path
+from .treehash import CHUNK_SIZE, TREE_HASH_MIN_SIZE
+from .utils import DEFAULT_WORKERS
+from .watch import DEFAULT_DEBOUNCE
+
+def _shard_arg(value: str) -> tuple[int, int]:
+    from .report import parse_shard
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def _sample_arg(value: str) -> float:
+    from .report import parse_sample
+    try:
+        return parse_sample(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 def main():
     parser = argparse.ArgumentParser(description="Local Archival CLI Tool")
     parser.add_argument("-C", "--directory", type=Path, default=Path.cwd(), help="Directory to operate on (default: current directory)")
     parser.add_argument("-D", "--database", type=Path, default=None, help="Path to database file (default: .archive-index/archive.db inside directory)")
+    parser.add_argument("-P", "--sqlite-pragma", action="append", default=[], metavar="NAME=VALUE", help="Override an SQLite PRAGMA for this run, e.g. mmap_size=0 (also read from ARCHIVER_SQLITE_PRAGMAS)")
+    parser.add_argument("--no-daemon", action="store_true", help="Never forward commands to a running 'archive serve' process")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # archive init
@@ -19,32 +40,186 @@ def main():
     parser_add.add_argument("-n", "--non-interactive", action="store_true", help="Skip duplicates automatically (unless overridden)")
     parser_add.add_argument("--accept-duplicates", action="store_true", help="Automatically accept duplicates")
     parser_add.add_argument("--skip-duplicates", action="store_true", help="Automatically skip duplicates")
+    parser_add.add_argument("--dup-filter", action="store_true", help="Use an in-memory filter to skip index lookups for content that is certainly new (persisted next to the database)")
+    parser_add.add_argument("--verify-copy", action="store_true", help="Flush each copy and read it back from the disk (bypassing the page cache) in the background, marking matching files as verified")
+    parser_add.add_argument("--metrics-file", type=Path, default=None, help="Write Prometheus metrics of the run to this file, replaced atomically (for node_exporter's textfile collector, use a .prom name)")
+    parser_add.add_argument("--tree-hash", action="store_true", help=f"Also record {CHUNK_SIZE // 2**20} MB chunk digests of files of at least {TREE_HASH_MIN_SIZE // 2**20} MB, so verify can check them on several threads")
 
     # archive verify
     parser_verify = subparsers.add_parser("verify", help="Verify archive integrity")
+    parser_verify.add_argument("--shard", type=_shard_arg, default=(1, 1), metavar="K/N", help="Only verify the K-th of N deterministic partitions of the index")
+    parser_verify.add_argument("--report", type=Path, default=None, help="Write results as NDJSON to this file")
+    parser_verify.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of threads hashing the chunks of files with a tree hash (default: {DEFAULT_WORKERS})")
+    parser_verify.add_argument("--quick", action="store_true", help="Only check a random sample of blocks (see --sample); a fast health check, not a full verification")
+    parser_verify.add_argument("--sample", type=_sample_arg, default=None, metavar="SIZE", help="Share of the archive checked by --quick, e.g. 1%% or 0.01 (default: 1%%)")
+    parser_verify.add_argument("--seed", type=int, default=None, help="Random seed for --quick, to repeat a sample")
+    parser_verify.add_argument("-r", "--resume", action="store_true", help="Continue the last unfinished run of this shard from its checkpoint")
+    parser_verify.add_argument("--metrics-file", type=Path, default=None, help="Write Prometheus metrics of the run to this file, replaced atomically (for node_exporter's textfile collector, use a .prom name)")
+
+    # archive verify-log
+    parser_verify_log = subparsers.add_parser("verify-log", help="List recorded verify runs or the issues of one run")
+    parser_verify_log.add_argument("run_id", type=int, nargs="?", default=None, help="Show the issues found by this run")
+
+    # archive verify-merge
+    parser_verify_merge = subparsers.add_parser("verify-merge", help="Combine per-shard verify reports")
+    parser_verify_merge.add_argument("reports", type=Path, nargs="+", help="NDJSON reports written by 'verify --report'")
+    parser_verify_merge.add_argument("-o", "--output", type=Path, default=None, help="Write the merged report to this file")
+
+    # archive fix
+    parser_fix = subparsers.add_parser("fix", help="Accept the current content of archived files as correct")
+    parser_fix.add_argument("paths", type=Path, nargs="*", help="Archived files (relative to the archive root, or absolute)")
+    parser_fix.add_argument("-f", "--from", dest="from_files", type=Path, action="append", default=[], metavar="FILE", help="Read paths from a verify report, saved verify output or a list of paths")
+    parser_fix.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of parallel hashing workers (default: {DEFAULT_WORKERS})")
+
+    # archive replicate
+    parser_replicate = subparsers.add_parser("replicate", help="Copy files missing from a mirror archive, comparing the two indices")
+    parser_replicate.add_argument("dest", type=Path, help="Root of the mirror archive (initialized if needed)")
+    parser_replicate.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of files copied at the same time (default: {DEFAULT_WORKERS})")
+    parser_replicate.add_argument("--no-reuse", action="store_true", help="Always copy from the source, even if the mirror has the same content under another path")
+
+    # archive store-xattrs
+    subparsers.add_parser("store-xattrs", help="Store the indexed digest of unchanged archived files in their extended attributes")
+
+    # archive db-maintain
+    parser_maintain = subparsers.add_parser("db-maintain", help="Check index consistency, recreate missing indices, analyze and vacuum the database")
+    parser_maintain.add_argument("--vacuum", action="store_true", help="Rewrite the whole database to return all free space (needs room for a copy; takes a while on large indices)")
+
+    # archive tree-hash
+    parser_tree = subparsers.add_parser("tree-hash", help="Record chunk digests of large archived files for parallel verification")
+    parser_tree.add_argument("--min-size", type=int, default=TREE_HASH_MIN_SIZE, help=f"Only files of at least this many bytes (default: {TREE_HASH_MIN_SIZE})")
+    parser_tree.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of files hashed in parallel (default: {DEFAULT_WORKERS})")
 
     # archive scan
     parser_scan = subparsers.add_parser("scan", help="Rebuild database from disk")
-    parser_scan.add_argument("-c", "--continue", dest="resume", action="store_true", help="Continue interrupted scan (skip existing files)")
+    scan_mode = parser_scan.add_mutually_exclusive_group()
+    scan_mode.add_argument("-c", "--continue", dest="resume", action="store_true", help="Continue interrupted scan (skip existing files)")
+    scan_mode.add_argument("-u", "--update", action="store_true", help="Sync the index with disk, re-hashing only files whose metadata changed")
+    parser_scan.add_argument("--tree-hash", action="store_true", help=f"Record chunk digests of files of at least {TREE_HASH_MIN_SIZE // 2**20} MB that are hashed (see 'add --tree-hash')")
+    parser_scan.add_argument("--prune", action="store_true", help="With --update, remove index entries for files that are gone")
+    parser_scan.add_argument("--trust-xattrs", action="store_true", help="Take the digest of files whose size and mtime match their user.archive.sha256 attribute instead of hashing them")
+    parser_scan.add_argument("--metrics-file", type=Path, default=None, help="Write Prometheus metrics of the run to this file, replaced atomically (for node_exporter's textfile collector, use a .prom name)")
 
     # archive status
     parser_status = subparsers.add_parser("status", help="Show archive status")
+    parser_status.add_argument("--by-dir", action="store_true", help="Also show file count, size, duplicate size and verification state per directory")
+    parser_status.add_argument("--depth", type=int, default=1, help="With --by-dir, show directories up to this many levels below the root (default: 1)")
+    parser_status.add_argument("--rebuild", action="store_true", help="Recompute the per-directory totals from the files table first")
+    parser_status.add_argument("--metrics-file", type=Path, default=None, help="Also write the numbers as Prometheus metrics to this file, replaced atomically")
+
+    # archive find
+    parser_find = subparsers.add_parser("find", help="Search archived paths in the index")
+    parser_find.add_argument("pattern", help="Text anywhere in the path (case-insensitive), or a glob over the whole path such as '*.jpg'")
+    parser_find.add_argument("-n", "--limit", type=int, default=None, help="Show at most this many matches")
+
+    # archive ls
+    parser_ls = subparsers.add_parser("ls", help="List an archive directory from the index")
+    parser_ls.add_argument("ls_dir", metavar="directory", nargs="?", default="", help="Directory relative to the archive root (default: the root)")
+
+    # archive check
+    parser_check = subparsers.add_parser("check", help="Report which files of a source are already archived")
+    parser_check.add_argument("sources", type=Path, nargs="+", help="Source files or directories")
+    parser_check.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of parallel hashing workers (default: {DEFAULT_WORKERS})")
+
+    # archive export-manifest
+    parser_export = subparsers.add_parser("export-manifest", help="Export the index as a compact sorted manifest")
+    parser_export.add_argument("output", type=Path, help="Manifest file to write")
+
+    # archive diff
+    parser_diff = subparsers.add_parser("diff", help="Compare two manifests, databases or archive roots")
+    parser_diff.add_argument("a", type=Path, help="Manifest, database file or archive root")
+    parser_diff.add_argument("b", type=Path, help="Manifest, database file or archive root")
+
+    # archive watch
+    parser_watch = subparsers.add_parser("watch", help="Index files as they are placed into the archive (Linux only)")
+    parser_watch.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of parallel hashing workers (default: {DEFAULT_WORKERS})")
+    parser_watch.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help=f"Seconds a file must be quiet before it is hashed (default: {DEFAULT_DEBOUNCE})")
+
+    # archive serve
+    parser_serve = subparsers.add_parser("serve", help="Keep the index open and answer status/check from other invocations")
+    parser_serve.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of parallel hashing workers (default: {DEFAULT_WORKERS})")
 
     args = parser.parse_args()
     root_path = args.directory.resolve()
     db_path_override = args.database.resolve() if args.database else None
 
+    try:
+        for spec in [os.environ.get("ARCHIVER_SQLITE_PRAGMAS", "")] + args.sqlite_pragma:
+            PRAGMA_OVERRIDES.update(parse_pragmas(spec))
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Rebuilding writes to the index, which the server never does; metrics
+    # files are written by this process
+    forwardable = not (args.command == "status" and (args.rebuild or args.metrics_file))
+    if args.command in FORWARDED_COMMANDS and forwardable and not args.no_daemon:
+        # Let a running server answer with its warm connection and caches
+        request = {"command": args.command, "root": str(root_path)}
+        if args.command == "check":
+            request.update(sources=[str(p) for p in args.sources], workers=args.workers)
+        elif args.command == "status":
+            request.update(by_dir=args.by_dir, depth=args.depth)
+        try:
+            code = forward(get_socket_path(get_db_path(root_path, db_path_override)), request)
+        except KeyboardInterrupt:
+            print("\nOperation cancelled by user.")
+            sys.exit(1)
+        if code is not None:
+            sys.exit(code)
+
+    # Imported only now: a forwarded command must not pay for loading the
+    # whole package
+    from .commands import cmd_init, cmd_add, cmd_verify, cmd_scan, cmd_status, cmd_check, cmd_export_manifest, cmd_diff, cmd_watch, cmd_verify_merge, cmd_serve, cmd_fix, cmd_verify_log, cmd_tree_hash, cmd_verify_quick, cmd_find, cmd_ls, cmd_db_maintain, cmd_replicate, cmd_store_xattrs
+
     try:
         if args.command == "init":
             cmd_init(root_path, db_path_override)
         elif args.command == "add":
-            cmd_add(root_path, args.source, args.dest_subdir, args.non_interactive, args.accept_duplicates, args.skip_duplicates, db_path_override)
+            cmd_add(root_path, args.source, args.dest_subdir, args.non_interactive, args.accept_duplicates, args.skip_duplicates, db_path_override, use_dup_filter=args.dup_filter, tree_hash=args.tree_hash, metrics_path=args.metrics_file, verify_copy=args.verify_copy)
         elif args.command == "verify":
-            cmd_verify(root_path, db_path_override)
+            if args.quick:
+                if args.resume:
+                    parser.error("--resume cannot be combined with --quick")
+                cmd_verify_quick(root_path, args.sample or 0.01, db_path_override, shard=args.shard, report_path=args.report, seed=args.seed, workers=args.workers, metrics_path=args.metrics_file)
+            elif args.sample is not None or args.seed is not None:
+                parser.error("--sample and --seed require --quick")
+            else:
+                cmd_verify(root_path, db_path_override, shard=args.shard, report_path=args.report, resume=args.resume, workers=args.workers, metrics_path=args.metrics_file)
+        elif args.command == "verify-log":
+            cmd_verify_log(root_path, args.run_id, db_path_override)
+        elif args.command == "verify-merge":
+            cmd_verify_merge(args.reports, args.output)
+        elif args.command == "fix":
+            cmd_fix(root_path, args.paths, args.from_files, args.workers, db_path_override)
+        elif args.command == "replicate":
+            cmd_replicate(root_path, args.dest, args.workers, not args.no_reuse, db_path_override)
+        elif args.command == "store-xattrs":
+            cmd_store_xattrs(root_path, db_path_override)
+        elif args.command == "db-maintain":
+            cmd_db_maintain(root_path, args.vacuum, db_path_override)
+        elif args.command == "tree-hash":
+            cmd_tree_hash(root_path, args.min_size, args.workers, db_path_override)
         elif args.command == "scan":
-            cmd_scan(root_path, args.resume, db_path_override)
+            if args.prune and not args.update:
+                parser.error("--prune requires --update")
+            if args.trust_xattrs and args.update:
+                parser.error("--trust-xattrs cannot be combined with --update")
+            cmd_scan(root_path, args.resume, db_path_override, update=args.update, prune=args.prune, tree_hash=args.tree_hash, trust_xattrs=args.trust_xattrs, metrics_path=args.metrics_file)
         elif args.command == "status":
-            cmd_status(root_path, db_path_override)
+            cmd_status(root_path, db_path_override, by_dir=args.by_dir, depth=args.depth, rebuild=args.rebuild, metrics_path=args.metrics_file)
+        elif args.command == "find":
+            cmd_find(root_path, args.pattern, args.limit, db_path_override)
+        elif args.command == "ls":
+            cmd_ls(root_path, args.ls_dir, db_path_override)
+        elif args.command == "check":
+            cmd_check(root_path, args.sources, args.workers, db_path_override)
+        elif args.command == "export-manifest":
+            cmd_export_manifest(root_path, args.output, db_path_override)
+        elif args.command == "diff":
+            cmd_diff(args.a, args.b)
+        elif args.command == "watch":
+            cmd_watch(root_path, args.workers, args.debounce, db_path_override)
+        elif args.command == "serve":
+            cmd_serve(root_path, args.workers, db_path_override)
     except KeyboardInterrupt:
         print("\nOperation cancelled by user.")
         sys.exit(1)
@@ -0,0 +1,76 @@
+import sqlite3
+from pathlib import Path
+
+from .search import has_fts_index
+
+# Set-based consistency checks between files and the tables derived from it.
+# Each query counts offending rows; they scan each table once instead of
+# probing one file at a time, so they stay cheap on large indices.
+CONSISTENCY_CHECKS = {
+    "files without a hash_index entry": """
+        SELECT count(*) FROM (SELECT id FROM files EXCEPT SELECT file_id FROM hash_index)
+    """,
+    "hash_index entries without a file": """
+        SELECT count(*) FROM (SELECT file_id FROM hash_index EXCEPT SELECT id FROM files)
+    """,
+    "files with several hash_index entries": """
+        SELECT count(*) FROM (SELECT file_id FROM hash_index GROUP BY file_id HAVING count(*) > 1)
+    """,
+    "hash_index entries that disagree with files on hash or size": """
+        SELECT count(*) FROM hash_index h JOIN files f ON f.id = h.file_id
+        WHERE h.hash != f.hash OR h.size != f.size
+    """,
+    "paths indexed more than once": """
+        SELECT count(*) FROM (SELECT path FROM files GROUP BY path HAVING count(*) > 1)
+    """,
+    "tree hashes of files no longer indexed": """
+        SELECT count(*) FROM (SELECT file_id FROM file_trees EXCEPT SELECT id FROM files)
+    """,
+}
+
+def check_consistency(conn: sqlite3.Connection) -> list[tuple[str, int]]:
+    """Returns (problem, row count) for every check that found something."""
+    problems = []
+    for description, query in CONSISTENCY_CHECKS.items():
+        count = conn.execute(query).fetchone()[0]
+        if count:
+            problems.append((description, count))
+    return problems
+
+def database_size(db_path: Path) -> int:
+    """Size of the database file and its write-ahead log."""
+    return sum(p.stat().st_size for p in (db_path, Path(f"{db_path}-wal")) if p.exists())
+
+def optimize_fts(conn: sqlite3.Connection) -> bool:
+    """Merges the segments of the path index into one b-tree, if there is one."""
+    if not has_fts_index(conn):
+        return False
+    conn.execute("INSERT INTO files_fts(files_fts) VALUES ('optimize')")
+    conn.commit()
+    return True
+
+def analyze(conn: sqlite3.Connection):
+    """Refreshes the statistics the query planner picks indices by."""
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+
+def vacuum(conn: sqlite3.Connection, full: bool = False) -> tuple[int, bool]:
+    """Returns free pages to the file system, returning (pages freed, done).
+
+    Databases created with auto_vacuum=INCREMENTAL are trimmed in place.
+    Older ones can only shrink through a full VACUUM, which rewrites the file
+    and is only done with `full`; it also switches them to incremental mode,
+    so later runs are cheap.
+    """
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    if full:
+        if not incremental:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    elif incremental:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+    else:
+        return free_pages, False
+    return free_pages - conn.execute("PRAGMA freelist_count").fetchone()[0], True
@@ -0,0 +1,104 @@
+import gzip
+import sqlite3
+import struct
+from contextlib import contextmanager
+from pathlib import Path
+
+from .database import get_db_path, get_connection
+
+# Manifest format (gzip-compressed):
+#   MAGIC
+#   records sorted by (path, hash), each:
+#     prefix_len:u16 suffix_len:u16 suffix:bytes size:u64 digest:32 bytes
+# Paths are front-coded against the previous record, which makes the sorted
+# path list very small before gzip even sees it.
+MAGIC = b"ARCHMAN1"
+RECORD_HEADER = struct.Struct(">HH")
+RECORD_TRAILER = struct.Struct(">Q32s")
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+def _common_prefix_len(a: bytes, b: bytes) -> int:
+    limit = min(len(a), len(b), 0xFFFF)
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+def write_manifest(output: Path, entries) -> int:
+    """Writes sorted (path, size, hash) entries to a manifest file.
+
+    Returns the number of records written.
+    """
+    count = 0
+    previous = b""
+    with gzip.open(output, "wb") as f:
+        f.write(MAGIC)
+        for path, size, file_hash in entries:
+            encoded = path.encode("utf-8")
+            prefix_len = _common_prefix_len(previous, encoded)
+            suffix = encoded[prefix_len:]
+            f.write(RECORD_HEADER.pack(prefix_len, len(suffix)))
+            f.write(suffix)
+            f.write(RECORD_TRAILER.pack(size, bytes.fromhex(file_hash)))
+            previous = encoded
+            count += 1
+    return count
+
+def read_manifest(manifest_path: Path):
+    """Yields (path, size, hash) entries from a manifest file."""
+    with gzip.open(manifest_path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{manifest_path} is not an archive manifest")
+        previous = b""
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if not header:
+                return
+            prefix_len, suffix_len = RECORD_HEADER.unpack(header)
+            encoded = previous[:prefix_len] + f.read(suffix_len)
+            size, digest = RECORD_TRAILER.unpack(f.read(RECORD_TRAILER.size))
+            yield encoded.decode("utf-8"), size, digest.hex()
+            previous = encoded
+
+def iter_db_entries(conn: sqlite3.Connection):
+    """Yields (path, size, hash) from the files table in manifest order."""
+    # BINARY collation orders UTF-8 bytes, which matches Python str ordering.
+    yield from conn.execute("SELECT path, size, hash FROM files ORDER BY path, hash")
+
+@contextmanager
+def open_entries(location: Path):
+    """Opens a manifest, a database file or an archive root as a sorted entry stream."""
+    if location.is_dir():
+        location = get_db_path(location)
+    with open(location, "rb") as f:
+        header = f.read(len(SQLITE_MAGIC))
+    if header == SQLITE_MAGIC:
+        conn = get_connection(location, "read")
+        try:
+            yield iter_db_entries(conn)
+        finally:
+            conn.close()
+    else:
+        yield read_manifest(location)
+
+def diff_entries(entries_a, entries_b):
+    """Merge-joins two sorted entry streams.
+
+    Yields (kind, path) where kind is "missing" (only in A), "extra" (only
+    in B) or "mismatch" (same path, different size or hash).
+    """
+    sentinel = object()
+    a = next(entries_a, sentinel)
+    b = next(entries_b, sentinel)
+    while a is not sentinel or b is not sentinel:
+        if b is sentinel or (a is not sentinel and a[0] < b[0]):
+            yield "missing", a[0]
+            a = next(entries_a, sentinel)
+        elif a is sentinel or b[0] < a[0]:
+            yield "extra", b[0]
+            b = next(entries_b, sentinel)
+        else:
+            if a[1] != b[1] or a[2] != b[2]:
+                yield "mismatch", a[0]
+            a = next(entries_a, sentinel)
+            b = next(entries_b, sentinel)
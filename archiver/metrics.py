@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Prometheus text exposition format, for node_exporter's textfile collector:
+# point it at a directory and have each command write its own *.prom file
+# there. Every sample carries the archive root as a label, so several
+# archives can report into one directory.
+METRIC_PREFIX = "archiver"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def timestamp_seconds(sqlite_timestamp: str | None) -> float | None:
+    """Unix time of an SQLite CURRENT_TIMESTAMP value (UTC)."""
+    if sqlite_timestamp is None:
+        return None
+    return datetime.fromisoformat(sqlite_timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+class MetricsFile:
+    """Gauges of one command run, written in one go when the run ends.
+
+    The file is replaced atomically, so the collector never reads half a
+    file; metrics of a run that did not get to write() keep their previous
+    values, including the last success timestamp.
+    """
+    def __init__(self, path: Path, command: str, root_path: Path):
+        self.path = Path(path)
+        self.command = command
+        self.labels = {"archive": str(root_path)}
+        self.started = time.monotonic()
+        self._samples: dict[str, tuple[str, list[tuple[dict, float]]]] = {}
+
+    def set(self, name: str, value: float, help_text: str, **labels):
+        """Sets `archiver_<name>`; samples of one name differ in their labels."""
+        _, samples = self._samples.setdefault(f"{METRIC_PREFIX}_{name}", (help_text, []))
+        samples.append((labels, value))
+
+    def set_throughput(self, files: int, size: int = None):
+        """Sets the duration, files and, if given, bytes and bytes per second of the run."""
+        duration = time.monotonic() - self.started
+        self.set(f"{self.command}_duration_seconds", duration, f"Wall time of the last {self.command} run.")
+        self.set(f"{self.command}_files", files, f"Files processed by the last {self.command} run.")
+        if size is not None:
+            self.set(f"{self.command}_bytes", size, f"Bytes processed by the last {self.command} run.")
+            self.set(f"{self.command}_bytes_per_second", size / duration if duration > 0 else 0, f"Throughput of the last {self.command} run.")
+
+    def set_archive(self, stats):
+        """Archive-wide gauges from Archive.stats()."""
+        self.set("files", stats.file_count, "Files in the archive index.")
+        self.set("bytes", stats.total_size, "Total size of the indexed files.")
+        self.set("duplicate_groups", stats.duplicate_groups, "Contents stored more than once.")
+        self.set("unverified_files", stats.never_verified, "Indexed files that were never verified.")
+        oldest = timestamp_seconds(stats.oldest_verified)
+        if oldest is not None:
+            self.set("oldest_verified_timestamp_seconds", oldest, "Unix time of the oldest last successful verification of any file.")
+
+    def render(self) -> str:
+        lines = []
+        for name, (help_text, samples) in self._samples.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                label_str = ",".join(f'{key}="{_escape(str(val))}"' for key, val in {**self.labels, **labels}.items())
+                lines.append(f"{name}{{{label_str}}} {float(value):.17g}")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        self.set(f"{self.command}_last_success_timestamp_seconds", time.time(), f"Unix time the last {self.command} run completed.")
+        # A temporary file in the same directory, so the rename is atomic
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.render())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,217 @@
+import sqlite3
+from dataclasses import dataclass
+from typing import Callable
+
+from .rollup import ROLLUP_TABLE, backfill_rollups
+
+# Schema upgrades, keyed on PRAGMA user_version. Each migration makes a quick
+# schema change, and then, if it created something that has to be filled
+# from existing rows, a backfill over ranges of file ids. Every batch is one
+# short write transaction that records its position in migration_progress,
+# so other processes can use the index between batches and an interrupted
+# upgrade continues where it stopped. Table rewrites follow the same pattern:
+# create the new table, copy in batches, swap in `finish`.
+#
+# Writers that maintain a structure under backfill leave files beyond
+# last_id to the backfill (see rollup._pending and the files_fts triggers).
+MIGRATION_BATCH_SIZE = 50000
+
+PROGRESS_TABLE = """
+CREATE TABLE IF NOT EXISTS migration_progress(
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+"""
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    description: str
+    # Idempotent schema change; returns True if existing rows need a backfill
+    schema: Callable[[sqlite3.Connection], bool]
+    # Fills in the files with ids in (after_id, up_to_id]
+    backfill: Callable[[sqlite3.Connection, int, int], None] = None
+    # Runs in the transaction of the last batch
+    finish: Callable[[sqlite3.Connection], None] = None
+
+def fts_available(conn: sqlite3.Connection) -> bool:
+    """Whether this SQLite build can maintain the files_fts path index.
+
+    Needs FTS5 and the trigram tokenizer, which came with SQLite 3.34.
+    """
+    if sqlite3.sqlite_version_info < (3, 34, 0):
+        return False
+    return bool(conn.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0])
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def _run_script(conn: sqlite3.Connection, script: str):
+    # executescript() would commit the surrounding transaction
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+def _create_tables(*names: str, script: str) -> Callable[[sqlite3.Connection], bool]:
+    """Schema step for new tables; a backfill is needed unless they already existed."""
+    def schema(conn: sqlite3.Connection) -> bool:
+        existed = all(_table_exists(conn, name) for name in names)
+        _run_script(conn, script)
+        return not existed
+    return schema
+
+# Columns added to files after the initial schema
+FILES_EXTRA_COLUMNS = {
+    "mtime_ns": "INTEGER",
+    "inode": "INTEGER",
+    "ctime_ns": "INTEGER",
+}
+
+def _add_file_columns(conn: sqlite3.Connection) -> bool:
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(files)")}
+    for name, column_type in FILES_EXTRA_COLUMNS.items():
+        if name not in existing:
+            # Only touches the schema; scan --update fills them in lazily
+            conn.execute(f"ALTER TABLE files ADD COLUMN {name} {column_type}")
+    return False
+
+# Verify runs are checkpointed so an interrupted run can be resumed; only
+# issues are stored per file, OK files just get last_verified.
+VERIFY_TABLES = """
+CREATE TABLE IF NOT EXISTS verify_runs(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    status TEXT NOT NULL DEFAULT 'running',
+    shard_k INTEGER NOT NULL,
+    shard_n INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    checked INTEGER NOT NULL DEFAULT 0,
+    issues INTEGER NOT NULL DEFAULT 0,
+    last_file_id INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS verify_results(
+    run_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    FOREIGN KEY(run_id) REFERENCES verify_runs(id)
+);
+CREATE INDEX IF NOT EXISTS idx_verify_results_run ON verify_results(run_id, file_id);
+"""
+
+# Optional tree hashes of large files (see treehash.py)
+TREE_TABLES = """
+CREATE TABLE IF NOT EXISTS file_trees(
+    file_id INTEGER PRIMARY KEY,
+    chunk_size INTEGER NOT NULL,
+    root TEXT NOT NULL,
+    FOREIGN KEY(file_id) REFERENCES files(id)
+);
+CREATE TABLE IF NOT EXISTS file_chunks(
+    file_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    PRIMARY KEY(file_id, idx)
+) WITHOUT ROWID;
+"""
+
+# Trigram index over paths for `find`, kept in sync with files by triggers.
+FTS_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(path, content='files', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files
+WHEN NOT EXISTS (SELECT 1 FROM migration_progress WHERE name = 'files_fts' AND new.id > last_id) BEGIN
+    INSERT INTO files_fts(rowid, path) VALUES (new.id, new.path);
+END;
+CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files
+WHEN NOT EXISTS (SELECT 1 FROM migration_progress WHERE name = 'files_fts' AND old.id > last_id) BEGIN
+    INSERT INTO files_fts(files_fts, rowid, path) VALUES ('delete', old.id, old.path);
+END;
+CREATE TRIGGER IF NOT EXISTS files_fts_update AFTER UPDATE OF path ON files
+WHEN NOT EXISTS (SELECT 1 FROM migration_progress WHERE name = 'files_fts' AND old.id > last_id) BEGIN
+    INSERT INTO files_fts(files_fts, rowid, path) VALUES ('delete', old.id, old.path);
+    INSERT INTO files_fts(rowid, path) VALUES (new.id, new.path);
+END;
+"""
+
+def _create_fts(conn: sqlite3.Connection) -> bool:
+    if not fts_available(conn):
+        # `find` falls back to scanning the files table
+        return False
+    return _create_tables("files_fts", script=FTS_TABLE)(conn)
+
+def _backfill_fts(conn: sqlite3.Connection, after_id: int, up_to_id: int):
+    conn.execute("INSERT INTO files_fts(rowid, path) SELECT id, path FROM files WHERE id > ? AND id <= ?", (after_id, up_to_id))
+
+MIGRATIONS = [
+    Migration(1, "file_columns", "Add file signature columns", _add_file_columns),
+    Migration(2, "verify_runs", "Add verify run tables", _create_tables("verify_runs", "verify_results", script=VERIFY_TABLES)),
+    Migration(3, "file_trees", "Add tree hash tables", _create_tables("file_trees", "file_chunks", script=TREE_TABLES)),
+    Migration(4, "dir_rollups", "Add per-directory totals", _create_tables("dir_rollups", script=ROLLUP_TABLE), backfill_rollups),
+    Migration(5, "files_fts", "Add path search index", _create_fts, _backfill_fts),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _step(conn: sqlite3.Connection, migration: Migration, batch_size: int, progress: Callable) -> bool:
+    """Runs one transaction of a migration, returning True once it is applied."""
+    if schema_version(conn) >= migration.version:
+        # Another process got there first
+        return True
+    row = conn.execute("SELECT last_id FROM migration_progress WHERE name = ?", (migration.name,)).fetchone()
+    if row is not None:
+        last_id = row[0]
+    elif migration.schema(conn) and migration.backfill:
+        last_id = 0
+        conn.execute("INSERT INTO migration_progress (name, last_id) VALUES (?, 0)", (migration.name,))
+    else:
+        last_id = None
+
+    if last_id is not None:
+        # Files added meanwhile are picked up too
+        max_id = conn.execute("SELECT coalesce(max(id), 0) FROM files").fetchone()[0]
+        up_to_id = min(last_id + batch_size, max_id)
+        if up_to_id > last_id:
+            migration.backfill(conn, last_id, up_to_id)
+        if progress and max_id:
+            progress(migration, up_to_id, max_id)
+        if up_to_id < max_id:
+            conn.execute("UPDATE migration_progress SET last_id = ? WHERE name = ?", (up_to_id, migration.name))
+            return False
+        conn.execute("DELETE FROM migration_progress WHERE name = ?", (migration.name,))
+
+    if migration.finish:
+        migration.finish(conn)
+    conn.execute(f"PRAGMA user_version = {migration.version}")
+    return True
+
+def migrate(conn: sqlite3.Connection, batch_size: int = MIGRATION_BATCH_SIZE, progress: Callable[[Migration, int, int], None] = None) -> list[Migration]:
+    """Brings the schema up to LATEST_VERSION, returning the migrations applied.
+
+    `progress(migration, done_id, max_id)` is called after every batch of a backfill.
+    """
+    conn.commit()
+    conn.execute(PROGRESS_TABLE)
+    applied = []
+    for migration in MIGRATIONS:
+        if schema_version(conn) >= migration.version:
+            continue
+        done = False
+        while not done:
+            # Taking the write lock up front keeps concurrent upgrades in step
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                done = _step(conn, migration, batch_size, progress)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        applied.append(migration)
+    return applied
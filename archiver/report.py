@@ -0,0 +1,187 @@
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from .database import set_verified
+from .rollup import ancestors
+
+# Verify result statuses and the console labels used for them
+STATUS_LABELS = {
+    "missing": "MISSING",
+    "size_mismatch": "CORRUPTED (Size mismatch)",
+    "hash_mismatch": "CORRUPTED (Hash mismatch)",
+}
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parses a 'K/N' shard spec (1-based) into (k, n)."""
+    try:
+        k, n = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{value}', expected K/N")
+    if n < 1 or not 1 <= k <= n:
+        raise ValueError(f"Invalid shard '{value}', K must be between 1 and N")
+    return k, n
+
+def parse_sample(value: str) -> float:
+    """Parses a sample size given as a percentage ('1%') or a fraction ('0.01')."""
+    try:
+        fraction = float(value[:-1]) / 100 if value.endswith("%") else float(value)
+    except ValueError:
+        raise ValueError(f"Invalid sample size '{value}', expected e.g. 1% or 0.01")
+    if not 0 < fraction <= 1:
+        raise ValueError(f"Invalid sample size '{value}', must be more than 0% and at most 100%")
+    return fraction
+
+class VerifyReport:
+    """Writes verify results as NDJSON: a header, one line per issue and a summary."""
+
+    def __init__(self, report_path: Path, shard: tuple[int, int], total: int):
+        self.f = open(report_path, "w", encoding="utf-8")
+        self._write({"type": "header", "shard": list(shard), "total": total})
+
+    def _write(self, record: dict):
+        self.f.write(json.dumps(record) + "\n")
+
+    def issue(self, file_id: int, path: str, status: str, bad_chunks: list[tuple[int, int]] = None):
+        record = {"type": "result", "id": file_id, "path": path, "status": status}
+        if bad_chunks:
+            # (offset, length) of damaged regions of files with a tree hash
+            record["chunks"] = [list(chunk) for chunk in bad_chunks]
+        self._write(record)
+        self.f.flush()
+
+    def close(self, checked: int, issues: int, complete: bool):
+        self._write({"type": "summary", "checked": checked, "issues": issues, "complete": complete})
+        self.f.close()
+
+def read_report(report_path: Path) -> tuple[dict, list[dict], dict]:
+    """Reads an NDJSON verify report into (header, results, summary).
+
+    `summary` is None if the run did not finish writing its report.
+    """
+    header, results, summary = None, [], None
+    with open(report_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["type"] == "header":
+                header = record
+            elif record["type"] == "result":
+                results.append(record)
+            elif record["type"] == "summary":
+                summary = record
+    if header is None:
+        raise ValueError(f"{report_path} is not a verify report")
+    return header, results, summary
+
+def read_issue_paths(path: Path) -> list[str]:
+    """Reads archive paths to act on from a verify report or a list file.
+
+    Accepts an NDJSON report, captured console output of `verify` (only the
+    issue lines are used) or a plain list with one archive path per line.
+    """
+    try:
+        _, results, _ = read_report(path)
+        return [result["path"] for result in results]
+    except (ValueError, KeyError, TypeError):
+        # Not NDJSON
+        pass
+
+    with open(path, encoding="utf-8") as f:
+        # splitlines also splits on the \r of verify's progress indicator
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    prefixes = tuple(f"{label}: " for label in STATUS_LABELS.values())
+    issues = [line for line in lines if line.startswith(prefixes)]
+    if issues:
+        return [line.split(": ", 1)[1] for line in issues]
+    return lines
+
+# A verify run is checkpointed after this many files or seconds, whichever
+# comes first (a single huge file can take longer than the interval).
+VERIFY_CHECKPOINT_FILES = 1000
+VERIFY_CHECKPOINT_SECONDS = 60
+
+class VerifyRun:
+    """A verify run recorded in the index.
+
+    Issues and the id of the last checked file are written at checkpoints,
+    so an interrupted run can continue where it stopped and its results can
+    be queried afterwards. OK files get their last_verified timestamp;
+    `touched` collects their directories for refresh_verified.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, run_id: int, shard: tuple[int, int], total: int, last_file_id: int = 0, checked: int = 0, issues: int = 0):
+        self.conn = conn
+        self.run_id = run_id
+        self.shard = shard
+        self.total = total
+        self.last_file_id = last_file_id
+        self.checked = checked
+        self.issues = issues
+        self._verified = []
+        self._issues = []
+        self.touched = set()
+        self._last_checkpoint = time.monotonic()
+
+    @classmethod
+    def start(cls, conn: sqlite3.Connection, shard: tuple[int, int], total: int) -> "VerifyRun":
+        # A new run supersedes unfinished runs of the same shard
+        conn.execute("UPDATE verify_runs SET status = 'abandoned' WHERE status = 'running' AND shard_k = ? AND shard_n = ?", shard)
+        cursor = conn.execute("INSERT INTO verify_runs (shard_k, shard_n, total) VALUES (?, ?, ?)", (*shard, total))
+        conn.commit()
+        return cls(conn, cursor.lastrowid, shard, total)
+
+    @classmethod
+    def find_unfinished(cls, conn: sqlite3.Connection, shard: tuple[int, int]) -> "VerifyRun | None":
+        row = conn.execute("""
+            SELECT id, total, last_file_id, checked, issues FROM verify_runs
+            WHERE status = 'running' AND shard_k = ? AND shard_n = ?
+            ORDER BY id DESC LIMIT 1
+        """, shard).fetchone()
+        if row is None:
+            return None
+        run_id, total, last_file_id, checked, issues = row
+        return cls(conn, run_id, shard, total, last_file_id, checked, issues)
+
+    def record(self, file_id: int, path: str, status: str):
+        self.checked += 1
+        self.last_file_id = file_id
+        if status == "ok":
+            self._verified.append((file_id, path))
+        else:
+            self.issues += 1
+            self._issues.append((self.run_id, file_id, path, status))
+        if (len(self._verified) + len(self._issues) >= VERIFY_CHECKPOINT_FILES
+                or time.monotonic() - self._last_checkpoint >= VERIFY_CHECKPOINT_SECONDS):
+            self.checkpoint()
+
+    def checkpoint(self):
+        self.conn.executemany("INSERT INTO verify_results (run_id, file_id, path, status) VALUES (?, ?, ?, ?)", self._issues)
+        cursor = self.conn.cursor()
+        for file_id, path in self._verified:
+            # Counts files verified for the first time in the rollups
+            set_verified(cursor, file_id, path)
+            self.touched.update(ancestors(path))
+        cursor.executemany("UPDATE files SET last_verified = CURRENT_TIMESTAMP WHERE id = ?", [(file_id,) for file_id, _ in self._verified])
+        self.conn.execute(
+            "UPDATE verify_runs SET total = ?, checked = ?, issues = ?, last_file_id = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (self.total, self.checked, self.issues, self.last_file_id, self.run_id)
+        )
+        self.conn.commit()
+        self._verified.clear()
+        self._issues.clear()
+        self._last_checkpoint = time.monotonic()
+
+    def finish(self):
+        self.checkpoint()
+        self.conn.execute("UPDATE verify_runs SET status = 'complete', finished_at = CURRENT_TIMESTAMP WHERE id = ?", (self.run_id,))
+        self.conn.commit()
+
+    def results(self) -> list[tuple[int, str, str]]:
+        """(file_id, path, status) of the issues recorded so far."""
+        return get_run_results(self.conn, self.run_id)
+
+def get_run_results(conn: sqlite3.Connection, run_id: int) -> list[tuple[int, str, str]]:
+    return conn.execute("SELECT file_id, path, status FROM verify_results WHERE run_id = ? ORDER BY file_id", (run_id,)).fetchall()
@@ -0,0 +1,155 @@
+import sqlite3
+
+# Per-directory totals for `status --by-dir`. Every file counts towards each
+# of its ancestor directories; "" is the archive root. A file counts as
+# duplicate bytes unless it is the oldest (lowest id) copy of its content.
+# Counts, sizes and duplicates are kept current by the index writers in
+# database.py; verify runs refresh oldest_verified of the directories they
+# checked.
+ROLLUP_TABLE = """
+CREATE TABLE IF NOT EXISTS dir_rollups(
+    dir TEXT PRIMARY KEY,
+    file_count INTEGER NOT NULL,
+    total_bytes INTEGER NOT NULL,
+    dup_bytes INTEGER NOT NULL,
+    unverified INTEGER NOT NULL,
+    oldest_verified TIMESTAMP
+) WITHOUT ROWID;
+"""
+
+# (file id, ancestor dir) pairs, generated by splitting paths at '/'
+_ANCESTORS = """
+    WITH RECURSIVE ancestors(id, dir, rest) AS (
+        SELECT id, '', path FROM files {where}
+        UNION ALL
+        SELECT id,
+               CASE WHEN dir = '' THEN '' ELSE dir || '/' END || substr(rest, 1, instr(rest, '/') - 1),
+               substr(rest, instr(rest, '/') + 1)
+        FROM ancestors WHERE instr(rest, '/') > 0
+    )
+"""
+
+ROLLUP_REBUILD = _ANCESTORS.format(where="") + """
+    INSERT INTO dir_rollups (dir, file_count, total_bytes, dup_bytes, unverified, oldest_verified)
+    SELECT a.dir, count(*), sum(f.size), sum(CASE WHEN d.is_dup THEN f.size ELSE 0 END),
+           count(*) - count(f.last_verified), min(f.last_verified)
+    FROM ancestors a
+    JOIN files f ON f.id = a.id
+    LEFT JOIN (
+        SELECT file_id, row_number() OVER (PARTITION BY hash, size ORDER BY file_id) > 1 AS is_dup
+        FROM hash_index
+    ) d ON d.file_id = f.id
+    GROUP BY a.dir;
+"""
+
+# Adds the files with ids in a range to the totals. A file is a duplicate if
+# a copy with a lower id exists, as in the rebuild.
+_ROLLUP_BACKFILL = _ANCESTORS.format(where="WHERE id > ? AND id <= ?") + """
+    INSERT INTO dir_rollups (dir, file_count, total_bytes, dup_bytes, unverified, oldest_verified)
+    SELECT a.dir, count(*), sum(f.size),
+           sum(CASE WHEN EXISTS (
+               SELECT 1 FROM hash_index d WHERE d.hash = f.hash AND d.size = f.size AND d.file_id < f.id
+           ) THEN f.size ELSE 0 END),
+           count(*) - count(f.last_verified), min(f.last_verified)
+    FROM ancestors a
+    JOIN files f ON f.id = a.id
+    GROUP BY a.dir
+    ON CONFLICT(dir) DO UPDATE SET
+        file_count = file_count + excluded.file_count,
+        total_bytes = total_bytes + excluded.total_bytes,
+        dup_bytes = dup_bytes + excluded.dup_bytes,
+        unverified = unverified + excluded.unverified,
+        oldest_verified = min(coalesce(oldest_verified, excluded.oldest_verified), coalesce(excluded.oldest_verified, oldest_verified))
+"""
+
+def ancestors(rel_path: str) -> list[str]:
+    """The directories containing an archive path, from the root ("") down."""
+    parts = rel_path.split("/")[:-1]
+    return [""] + ["/".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+def _apply(cursor: sqlite3.Cursor, rel_path: str, files: int = 0, size: int = 0, dup: int = 0, unverified: int = 0):
+    cursor.executemany("""
+        INSERT INTO dir_rollups (dir, file_count, total_bytes, dup_bytes, unverified) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(dir) DO UPDATE SET
+            file_count = file_count + excluded.file_count,
+            total_bytes = total_bytes + excluded.total_bytes,
+            dup_bytes = dup_bytes + excluded.dup_bytes,
+            unverified = unverified + excluded.unverified
+    """, [(d, files, size, dup, unverified) for d in ancestors(rel_path)])
+    if files < 0:
+        cursor.execute("DELETE FROM dir_rollups WHERE file_count <= 0")
+
+def backfill_rollups(conn: sqlite3.Connection, after_id: int, up_to_id: int):
+    """Migration step: counts the files with ids in (after_id, up_to_id]."""
+    conn.execute(_ROLLUP_BACKFILL, (after_id, up_to_id))
+
+def _pending(cursor: sqlite3.Cursor, file_id: int) -> bool:
+    """Whether a running backfill has yet to reach a file; it is counted as it is then."""
+    row = cursor.execute("SELECT last_id FROM migration_progress WHERE name = 'dir_rollups'").fetchone()
+    return row is not None and file_id > row[0]
+
+def _first_copy(cursor: sqlite3.Cursor, file_hash: str, size: int, exclude_id: int) -> tuple[int, str] | None:
+    """(id, path) of the oldest file with this content, other than `exclude_id`."""
+    return cursor.execute("""
+        SELECT f.id, f.path FROM hash_index h JOIN files f ON f.id = h.file_id
+        WHERE h.hash = ? AND h.size = ? AND h.file_id != ?
+        ORDER BY h.file_id LIMIT 1
+    """, (file_hash, size, exclude_id)).fetchone()
+
+def join_content(cursor: sqlite3.Cursor, file_id: int, rel_path: str, file_hash: str, size: int, new_file: bool):
+    """Accounts for a file taking on content; call before its hash_index row exists."""
+    first = _first_copy(cursor, file_hash, size, file_id)
+    is_dup = first is not None and first[0] < file_id
+    if not _pending(cursor, file_id):
+        _apply(cursor, rel_path, int(new_file), size, size if is_dup else 0, int(new_file))
+    if first is not None and not is_dup and not _pending(cursor, first[0]):
+        # The previous oldest copy is a duplicate of this one now
+        _apply(cursor, first[1], dup=size)
+
+def leave_content(cursor: sqlite3.Cursor, file_id: int, rel_path: str, file_hash: str, size: int, removed: bool, verified: bool = True):
+    """Accounts for a file giving up content; call before its hash_index row is deleted."""
+    first = _first_copy(cursor, file_hash, size, file_id)
+    is_dup = first is not None and first[0] < file_id
+    if not _pending(cursor, file_id):
+        _apply(cursor, rel_path, -int(removed), -size, -size if is_dup else 0, -int(removed and not verified))
+    if first is not None and not is_dup and not _pending(cursor, first[0]):
+        # The next copy becomes the oldest one
+        _apply(cursor, first[1], dup=-size)
+
+def mark_verified(cursor: sqlite3.Cursor, file_id: int, rel_path: str):
+    """Accounts for a file that was never verified passing verification now."""
+    if _pending(cursor, file_id):
+        return
+    cursor.executemany("""
+        UPDATE dir_rollups SET unverified = unverified - 1, oldest_verified = coalesce(oldest_verified, CURRENT_TIMESTAMP)
+        WHERE dir = ?
+    """, [(d,) for d in ancestors(rel_path)])
+
+def rebuild_rollups(conn: sqlite3.Connection):
+    conn.execute("DELETE FROM dir_rollups")
+    conn.execute(ROLLUP_REBUILD)
+    conn.commit()
+
+def refresh_verified(conn: sqlite3.Connection, dirs: set[str]):
+    """Recomputes oldest_verified of the given directories after a verify run.
+
+    Files verified again get a newer timestamp, which can move the oldest
+    one forward; the unverified counts are kept by set_verified.
+    """
+    for d in dirs:
+        # Paths below d sort between 'd/' and 'd0' ('0' follows '/')
+        where, params = ("WHERE path >= ? AND path < ?", (d + "/", d + "0")) if d else ("", ())
+        conn.execute(f"""
+            UPDATE dir_rollups SET oldest_verified = (SELECT min(last_verified) FROM files {where})
+            WHERE dir = ?
+        """, (*params, d))
+    conn.commit()
+
+def query_rollups(conn: sqlite3.Connection, depth: int = 1) -> list[tuple]:
+    """Rollup rows of directories at most `depth` levels below the root, by path."""
+    return conn.execute("""
+        SELECT dir, file_count, total_bytes, dup_bytes, unverified, oldest_verified
+        FROM dir_rollups
+        WHERE dir != '' AND length(dir) - length(replace(dir, '/', '')) < ?
+        ORDER BY dir
+    """, (depth,)).fetchall()
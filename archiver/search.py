@@ -0,0 +1,64 @@
+import sqlite3
+from typing import Iterator
+
+# Paths are compared as UTF-8 bytes (BINARY collation), so every path below
+# "dir/" sorts in the range ["dir/", "dir0"): '0' is the byte after '/'.
+_AFTER_SLASH = chr(ord("/") + 1)
+
+def has_fts_index(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_fts'").fetchone() is not None
+
+def _is_glob(pattern: str) -> bool:
+    return any(c in pattern for c in "*?[")
+
+def find_paths(conn: sqlite3.Connection, pattern: str, limit: int = None) -> list[tuple[str, int]]:
+    """Returns (path, size) of indexed files matching `pattern`, sorted by path.
+
+    A plain pattern matches anywhere in the path, ignoring case; a pattern
+    with *, ? or [ is a case-sensitive glob over the whole path. Both use the
+    trigram index when it exists and the pattern has at least 3 literal
+    characters in a row; otherwise the files table is scanned.
+    """
+    fts = has_fts_index(conn)
+    if _is_glob(pattern):
+        if fts:
+            query = "SELECT f.path, f.size FROM files_fts JOIN files f ON f.id = files_fts.rowid WHERE files_fts.path GLOB ? ORDER BY f.path"
+        else:
+            query = "SELECT path, size FROM files WHERE path GLOB ? ORDER BY path"
+        params = (pattern,)
+    elif fts and len(pattern) >= 3:
+        # Quoted, so the pattern is matched as a literal substring
+        query = "SELECT f.path, f.size FROM files_fts JOIN files f ON f.id = files_fts.rowid WHERE files_fts MATCH ? ORDER BY f.path"
+        params = ('"' + pattern.replace('"', '""') + '"',)
+    else:
+        query = "SELECT path, size FROM files WHERE instr(lower(path), lower(?)) > 0 ORDER BY path"
+        params = (pattern,)
+
+    if limit is not None:
+        query += " LIMIT ?"
+        params += (limit,)
+    return conn.execute(query, params).fetchall()
+
+def list_dir(conn: sqlite3.Connection, rel_dir: str) -> Iterator[tuple[str, bool, int | None]]:
+    """Yields (name, is_dir, size) for the entries directly inside an archive directory.
+
+    Each step is one seek on idx_files_path: after a subdirectory is found,
+    the scan jumps past its whole subtree, so the cost depends on the number
+    of entries listed, not on the number of files below them.
+    """
+    prefix = rel_dir.strip("/")
+    prefix = "" if prefix in ("", ".") else prefix + "/"
+    bound = " AND path < ?" if prefix else ""
+    upper = (prefix[:-1] + _AFTER_SLASH,) if prefix else ()
+
+    row = conn.execute(f"SELECT path, size FROM files WHERE path >= ?{bound} ORDER BY path LIMIT 1", (prefix, *upper)).fetchone()
+    while row is not None:
+        path, size = row
+        name, sep, _ = path[len(prefix):].partition("/")
+        if sep:
+            yield name, True, None
+            # Skip the rest of this subdirectory
+            row = conn.execute(f"SELECT path, size FROM files WHERE path >= ?{bound} ORDER BY path LIMIT 1", (prefix + name + _AFTER_SLASH, *upper)).fetchone()
+        else:
+            yield name, False, size
+            row = conn.execute(f"SELECT path, size FROM files WHERE path > ?{bound} ORDER BY path LIMIT 1", (path, *upper)).fetchone()
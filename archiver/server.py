@@ -0,0 +1,150 @@
+import hashlib
+import io
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from pathlib import Path
+
+# Commands the CLI forwards to a running `archive serve` process. They only
+# read the index, so one long-lived connection can answer all of them.
+FORWARDED_COMMANDS = ("status", "check")
+
+def get_socket_path(db_path: Path) -> Path:
+    """Socket of the server for a database.
+
+    Unix socket paths are limited to ~100 bytes, so the socket lives in the
+    runtime directory under a name derived from the database path.
+    """
+    digest = hashlib.sha256(str(db_path).encode("utf-8")).hexdigest()[:16]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return Path(runtime_dir) / f"archiver-{os.getuid()}-{digest}.sock"
+
+def _send(sock: socket.socket, message: dict):
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+class _SocketWriter(io.TextIOBase):
+    """stdout replacement that streams printed output to the client."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+
+    def write(self, s: str) -> int:
+        if s:
+            _send(self.sock, {"out": s})
+        return len(s)
+
+class ArchiveServer:
+    """Serves forwarded commands on a Unix socket, one request at a time.
+
+    `handlers` maps a command name to a callable taking the request dict;
+    whatever it prints is streamed back to the client. Requests are handled
+    sequentially on the calling thread, so handlers may share one SQLite
+    connection.
+    """
+
+    def __init__(self, socket_path: Path, handlers: dict):
+        self.socket_path = socket_path
+        self.handlers = handlers
+        if is_running(socket_path):
+            raise RuntimeError(f"A server is already listening on {socket_path}")
+        socket_path.unlink(missing_ok=True)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            self.sock.bind(str(socket_path))
+        finally:
+            os.umask(old_umask)
+        self.sock.listen()
+
+    def serve(self):
+        while True:
+            client, _ = self.sock.accept()
+            with client:
+                self._handle(client)
+
+    def _handle(self, client: socket.socket):
+        try:
+            line = client.makefile("rb").readline()
+            request = json.loads(line)
+        except (OSError, ValueError):
+            return
+
+        code = 0
+        cwd = os.getcwd()
+        try:
+            with redirect_stdout(_SocketWriter(client)):
+                try:
+                    handler = self.handlers[request["command"]]
+                    # Relative paths in the request are the client's
+                    os.chdir(request.get("cwd", cwd))
+                    handler(request)
+                except SystemExit as e:
+                    code = e.code if isinstance(e.code, int) else 1
+                except Exception as e:
+                    print(f"\nAn unexpected error occurred: {e}")
+                    code = 1
+            _send(client, {"exit": code})
+        except OSError:
+            # Client went away mid-response
+            pass
+        finally:
+            os.chdir(cwd)
+
+    def close(self):
+        self.sock.close()
+        self.socket_path.unlink(missing_ok=True)
+
+def _is_own_socket(socket_path: Path) -> bool:
+    """Whether a socket exists at `socket_path` and belongs to this user.
+
+    Without XDG_RUNTIME_DIR the name is predictable in the shared temp
+    directory, where another user could listen in the server's place.
+    """
+    try:
+        st = os.lstat(socket_path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid()
+
+def is_running(socket_path: Path) -> bool:
+    if not _is_own_socket(socket_path):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(socket_path))
+        return True
+    except OSError:
+        return False
+
+def forward(socket_path: Path, request: dict) -> int | None:
+    """Runs a command on a running server, streaming its output to stdout.
+
+    Returns the command's exit code, or None if no server is running (the
+    caller then runs the command itself). Sockets of other users are
+    never talked to.
+    """
+    if not _is_own_socket(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        # Stale socket left behind by a server that died
+        sock.close()
+        return None
+
+    with sock:
+        _send(sock, {**request, "cwd": os.getcwd()})
+        for line in sock.makefile("rb"):
+            message = json.loads(line)
+            if "out" in message:
+                sys.stdout.write(message["out"])
+                sys.stdout.flush()
+            elif "exit" in message:
+                return message["exit"]
+    print("Error: Server closed the connection unexpectedly.")
+    return 1
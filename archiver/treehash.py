@@ -0,0 +1,87 @@
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from .utils import iter_file_blocks, read_blocks, is_sparse
+
+# Tree hashes split a file into fixed-size leaves. The leaf digests are
+# recorded next to the regular SHA-256 (which stays the identity used for
+# duplicate detection), so verify can hash the leaves of one huge file on
+# many threads and point at the damaged region when something is wrong.
+CHUNK_SIZE = 16 * 1024 * 1024
+# Smaller files are verified faster as a whole than as a handful of leaves
+TREE_HASH_MIN_SIZE = 4 * CHUNK_SIZE
+
+def tree_root(digests: list[bytes]) -> str:
+    """Root digest of a tree: the SHA-256 over the concatenated leaf digests."""
+    return hashlib.sha256(b"".join(digests)).hexdigest()
+
+def hash_file_with_chunks(file_path: Path, chunk_size: int = CHUNK_SIZE) -> tuple[str, list[bytes]]:
+    """Returns a file's SHA-256 and its leaf digests, computed in one sequential pass."""
+    full_hash = hashlib.sha256()
+    digests = []
+    chunk_hash, chunk_left = hashlib.sha256(), chunk_size
+    for block in iter_file_blocks(file_path):
+        full_hash.update(block)
+        view = memoryview(block)
+        while view:
+            part = view[:chunk_left]
+            chunk_hash.update(part)
+            chunk_left -= len(part)
+            view = view[len(part):]
+            if not chunk_left:
+                digests.append(chunk_hash.digest())
+                chunk_hash, chunk_left = hashlib.sha256(), chunk_size
+    if chunk_left < chunk_size:
+        digests.append(chunk_hash.digest())
+    return full_hash.hexdigest(), digests
+
+def _hash_range(fd: int, offset: int, length: int, sparse: bool) -> bytes:
+    chunk_hash = hashlib.sha256()
+    for block in read_blocks(fd, offset, length, sparse):
+        chunk_hash.update(block)
+    return chunk_hash.digest()
+
+def chunk_count(size: int, chunk_size: int = CHUNK_SIZE) -> int:
+    return -(-size // chunk_size)
+
+def hash_chunks(file_path: Path, size: int, executor: ThreadPoolExecutor, chunk_size: int = CHUNK_SIZE, indexes: list[int] = None) -> list[bytes]:
+    """Leaf digests of a file, with the leaves hashed concurrently on `executor`.
+
+    With `indexes`, only those leaves are read and their digests returned.
+    """
+    if indexes is None:
+        indexes = range(chunk_count(size, chunk_size))
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        # Holes of sparse images are not read
+        sparse = is_sparse(os.fstat(fd))
+        futures = [executor.submit(_hash_range, fd, idx * chunk_size, chunk_size, sparse) for idx in indexes]
+        # All reads must be done before the descriptor is closed
+        wait(futures)
+        return [future.result() for future in futures]
+    finally:
+        os.close(fd)
+
+def store_tree(cursor: sqlite3.Cursor, file_id: int, digests: list[bytes], chunk_size: int = CHUNK_SIZE):
+    drop_tree(cursor, file_id)
+    cursor.execute("INSERT INTO file_trees (file_id, chunk_size, root) VALUES (?, ?, ?)", (file_id, chunk_size, tree_root(digests)))
+    cursor.executemany("INSERT INTO file_chunks (file_id, idx, digest) VALUES (?, ?, ?)", ((file_id, idx, digest) for idx, digest in enumerate(digests)))
+
+def load_tree(conn: sqlite3.Connection, file_id: int) -> tuple[int, list[bytes]] | None:
+    """Returns (chunk_size, leaf digests) of a file, or None if it has no tree hash."""
+    row = conn.execute("SELECT chunk_size, root FROM file_trees WHERE file_id = ?", (file_id,)).fetchone()
+    if row is None:
+        return None
+    chunk_size, root = row
+    digests = [digest for (digest,) in conn.execute("SELECT digest FROM file_chunks WHERE file_id = ? ORDER BY idx", (file_id,))]
+    if tree_root(digests) != root:
+        # Damaged index rows; fall back to the full hash
+        return None
+    return chunk_size, digests
+
+def drop_tree(cursor: sqlite3.Cursor, file_id: int):
+    cursor.execute("DELETE FROM file_chunks WHERE file_id = ?", (file_id,))
+    cursor.execute("DELETE FROM file_trees WHERE file_id = ?", (file_id,))
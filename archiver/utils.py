@@ -1,26 +1,291 @@
+import errno
 import hashlib
 import os
+import re
+import shutil
+import stat
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterator
 
 # 4MB buffer size
 BUFFER_SIZE = 4 * 1024 * 1024
 
-def calculate_file_hash(file_path: Path) -> str:
-    """Calculates SHA-256 hash of a file or symlink."""
+# Hashing is I/O bound and hashlib releases the GIL, so threads scale well.
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+
+# Well-known SHA-256 of zero bytes; empty files are never opened
+EMPTY_HASH = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+
+# Files up to this size are read with a single read() and kept in memory,
+# so they can be hashed and copied without touching the source twice.
+SMALL_FILE_THRESHOLD = 1024 * 1024
+
+# Holes of sparse files are hashed from this instead of being read
+_ZEROS = memoryview(bytes(BUFFER_SIZE))
+
+def is_sparse(st: os.stat_result) -> bool:
+    """Whether a regular file has fewer blocks allocated than its size needs."""
+    return stat.S_ISREG(st.st_mode) and getattr(st, "st_blocks", None) is not None and st.st_blocks * 512 < st.st_size
+
+def file_segments(fd: int, start: int, end: int) -> Iterator[tuple[int, int, bool]]:
+    """Yields (offset, length, is_data) covering [start, end) of a file.
+
+    Holes are found with SEEK_DATA/SEEK_HOLE; where the file system or OS
+    does not support them, the whole range is reported as data.
+    """
+    if not hasattr(os, "SEEK_DATA"):
+        yield start, end - start, True
+        return
+    pos = start
+    while pos < end:
+        try:
+            data = os.lseek(fd, pos, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # Nothing but a hole up to the end of the file
+                data = end
+            elif e.errno == errno.EINVAL:
+                yield pos, end - pos, True
+                return
+            else:
+                raise
+        data = min(data, end)
+        if data > pos:
+            yield pos, data - pos, False
+        if data >= end:
+            return
+        hole = min(os.lseek(fd, data, os.SEEK_HOLE), end)
+        yield data, hole - data, True
+        pos = hole
+
+def _zero_blocks(length: int) -> Iterator[memoryview]:
+    while length > 0:
+        block = _ZEROS[:min(BUFFER_SIZE, length)]
+        yield block
+        length -= len(block)
+
+def read_blocks(fd: int, offset: int, length: int, sparse: bool = False) -> Iterator[bytes]:
+    """Yields [offset, offset + length) of a file in blocks, reading with pread.
+
+    With `sparse`, holes are yielded as zeros without touching the disk.
+    Stops early if the file is shorter.
+    """
+    if sparse:
+        # A hole never reaches past the end of the file
+        segments = file_segments(fd, offset, min(offset + length, os.fstat(fd).st_size))
+    else:
+        segments = [(offset, length, True)]
+    for start, seg_length, is_data in segments:
+        if not is_data:
+            yield from _zero_blocks(seg_length)
+            continue
+        pos, end = start, start + seg_length
+        while pos < end:
+            # pread does not move a shared file position, so threads can share fd
+            block = os.pread(fd, min(BUFFER_SIZE, end - pos), pos)
+            if not block:
+                return
+            yield block
+            pos += len(block)
+
+def iter_file_blocks(file_path: Path) -> Iterator[bytes]:
+    """Yields the content of a regular file in blocks of up to BUFFER_SIZE.
+
+    Holes of sparse files are yielded as zeros without being read, so
+    hashing a sparse image costs only its allocated size in I/O.
+    """
+    with open(file_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if is_sparse(st):
+            yield from read_blocks(f.fileno(), 0, st.st_size, sparse=True)
+        else:
+            yield from iter(lambda: f.read(BUFFER_SIZE), b"")
+
+def calculate_file_hash(file_path: Path, st: os.stat_result = None) -> str:
+    """Calculates SHA-256 hash of a file or symlink.
+
+    `st` is the file's lstat result, if the caller already has it.
+    """
+    if st is None:
+        st = os.lstat(file_path)
+
     sha256_hash = hashlib.sha256()
     
-    if file_path.is_symlink():
+    if stat.S_ISLNK(st.st_mode):
         # Hash the target path string for symlinks
         target = os.readlink(file_path)
         sha256_hash.update(target.encode('utf-8'))
+    elif stat.S_ISREG(st.st_mode) and st.st_size == 0:
+        return EMPTY_HASH
     else:
         # Hash content for regular files
-        with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(BUFFER_SIZE), b""):
-                sha256_hash.update(byte_block)
+        for byte_block in iter_file_blocks(file_path):
+            sha256_hash.update(byte_block)
                 
     return sha256_hash.hexdigest()
 
+def read_back_hash(file_path: Path) -> str:
+    """Hashes a regular file as stored on the device rather than in the page cache.
+
+    The file is flushed first, since POSIX_FADV_DONTNEED only drops clean
+    pages, and dropped again afterwards so the copy does not crowd out other
+    data. Without posix_fadvise (e.g. macOS) the read may come from memory.
+    """
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        file_hash = calculate_file_hash(file_path, os.fstat(fd))
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return file_hash
+
+def read_small_file(file_path: Path, st: os.stat_result) -> bytes | None:
+    """Reads a regular file of at most SMALL_FILE_THRESHOLD bytes in one go.
+
+    Returns None for symlinks and larger files, which are streamed instead.
+    """
+    if not stat.S_ISREG(st.st_mode) or st.st_size > SMALL_FILE_THRESHOLD:
+        return None
+    if st.st_size == 0:
+        return b""
+    with open(file_path, "rb", buffering=0) as f:
+        # One extra byte tells us if the file grew since the stat
+        data = f.read(st.st_size + 1)
+    if len(data) > st.st_size:
+        return None
+    return data
+
+def copy_file(src: Path, dest: Path, data: bytes = None):
+    """Copies a file preserving symlinks and metadata.
+
+    If the content has already been read (see read_small_file), it is
+    written directly instead of reading the source again. Sparse files
+    stay sparse.
+    """
+    if data is None:
+        st = os.lstat(src)
+        if is_sparse(st):
+            _copy_content(src, dest)
+            shutil.copystat(src, dest, follow_symlinks=False)
+        else:
+            shutil.copy2(src, dest, follow_symlinks=False)
+        return
+    with open(dest, "wb") as f:
+        f.write(data)
+    shutil.copystat(src, dest, follow_symlinks=False)
+
+# .<name>.<pid>.partial, see partial_path
+_PARTIAL_NAME = re.compile(r"\..+\.\d+\.partial")
+
+def partial_path(dest: Path) -> Path:
+    """Temporary name a copy is written to before it is moved to `dest`.
+
+    Unique per process, so concurrent writers never share one.
+    """
+    return dest.with_name(f".{dest.name}.{os.getpid()}.partial")
+
+def is_partial_name(name: str) -> bool:
+    """Whether a file name is one given by partial_path, e.g. left by a killed `add`."""
+    return _PARTIAL_NAME.fullmatch(name) is not None
+
+def link_into_place(partial: Path, dest: Path) -> bool:
+    """Gives a finished copy its final name, unless the name is already taken.
+
+    Returns False if `dest` exists; it is never overwritten. A hard link
+    claims the name atomically. File systems without hard links fall back
+    to check-and-rename, which callers make safe with directory_lock.
+    """
+    try:
+        os.link(partial, dest, follow_symlinks=False)
+    except FileExistsError:
+        return False
+    except OSError:
+        if os.path.lexists(dest):
+            return False
+        os.rename(partial, dest)
+        return True
+    os.unlink(partial)
+    return True
+
+def copy_and_hash(src: Path, dest: Path) -> str:
+    """Copies a file or symlink like copy_file, returning its SHA-256.
+
+    The hash is computed from the blocks as they are copied, so the source
+    is read only once.
+    """
+    sha256_hash = hashlib.sha256()
+    if os.path.islink(src):
+        target = os.readlink(src)
+        os.symlink(target, dest)
+        sha256_hash.update(target.encode('utf-8'))
+    else:
+        _copy_content(src, dest, sha256_hash)
+    shutil.copystat(src, dest, follow_symlinks=False)
+    return sha256_hash.hexdigest()
+
+def _copy_content(src: Path, dest: Path, sha256_hash=None):
+    """Copies a regular file's bytes, leaving the holes of sparse files unallocated."""
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+        st = os.fstat(fsrc.fileno())
+        if is_sparse(st):
+            segments = file_segments(fsrc.fileno(), 0, st.st_size)
+        else:
+            segments = [(0, st.st_size, True)]
+        for start, length, is_data in segments:
+            if not is_data:
+                if sha256_hash is not None:
+                    for block in _zero_blocks(length):
+                        sha256_hash.update(block)
+                continue
+            fdst.seek(start)
+            for byte_block in read_blocks(fsrc.fileno(), start, length):
+                if sha256_hash is not None:
+                    sha256_hash.update(byte_block)
+                fdst.write(byte_block)
+        # Extends the copy over a trailing hole without allocating it
+        fdst.truncate(st.st_size)
+
+def _hash_or_error(entry):
+    file_path, st = entry
+    try:
+        return file_path, calculate_file_hash(file_path, st), None
+    except Exception as e:
+        return file_path, None, e
+
+def hash_files(entries, workers: int = DEFAULT_WORKERS, executor: ThreadPoolExecutor = None):
+    """Hashes files concurrently.
+
+    Takes (path, lstat) pairs such as walk.FileEntry and yields
+    (path, hash, error) tuples in input order. Per-file errors are returned
+    instead of raised so callers can report and continue. A long-lived
+    `executor` can be passed in to reuse its threads.
+    """
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            yield from hash_files(entries, workers, executor)
+        return
+
+    window = max(1, workers) * 4
+    pending = deque()
+    # Keep a bounded number of files in flight so huge trees don't queue
+    # millions of futures up front.
+    for entry in entries:
+        pending.append(executor.submit(_hash_or_error, entry))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def stat_signature(st: os.stat_result) -> tuple[int, int, int]:
+    """Returns the (mtime_ns, inode, ctime_ns) signature recorded in the index."""
+    return st.st_mtime_ns, st.st_ino, st.st_ctime_ns
+
 def is_hidden(path: Path) -> bool:
     """Checks if a file or directory is hidden (starts with .)."""
     return path.name.startswith(".")
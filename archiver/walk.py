@@ -0,0 +1,73 @@
+import os
+import stat
+from pathlib import Path
+from typing import NamedTuple
+
+from .database import DB_DIR_NAME
+from .utils import is_partial_name
+
+class FileEntry(NamedTuple):
+    """A file found by walk_files, with the lstat taken during the walk."""
+    path: Path
+    st: os.stat_result
+
+    @property
+    def size(self) -> int:
+        # Symlinks always count as size 0; their own size is filesystem dependent
+        return 0 if stat.S_ISLNK(self.st.st_mode) else self.st.st_size
+
+def is_excluded(name: str, at_archive_root: bool = False, in_archive: bool = False) -> bool:
+    """Exclusion rules shared by every command that walks a tree.
+
+    `in_archive` is set for names inside an archive tree, as opposed to a
+    source being added or checked.
+    """
+    if name == ".DS_Store":
+        return True
+    # Copies in progress (or left behind by an interrupted add/replicate)
+    if in_archive and is_partial_name(name):
+        return True
+    # Root dotfiles/dotdirs hold filesystem metadata (.Spotlight-V100,
+    # .fseventsd, ...) and the index itself
+    return at_archive_root and name.startswith(".")
+
+def file_entry(path: Path) -> FileEntry:
+    return FileEntry(path, os.lstat(path))
+
+def walk_files(top: Path, archive_root: bool = False, on_error=None):
+    """Yields a FileEntry for every file below `top`.
+
+    Built on os.scandir so directory entries come with their type for free
+    and every file costs exactly one lstat. With `archive_root`, dot entries
+    directly in `top` and any index directory are skipped as well.
+    Symlinks to directories are neither followed nor returned, like os.walk.
+    """
+    stack = [top]
+    while stack:
+        directory = stack.pop()
+        at_root = archive_root and directory == top
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if is_excluded(entry.name, at_root, in_archive=archive_root):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not (archive_root and entry.name == DB_DIR_NAME):
+                                subdirs.append(Path(entry.path))
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                        if stat.S_ISLNK(st.st_mode) and entry.is_dir():
+                            continue
+                    except OSError as e:
+                        if on_error:
+                            on_error(Path(entry.path), e)
+                        continue
+                    yield FileEntry(Path(entry.path), st)
+        except OSError as e:
+            if on_error:
+                on_error(directory, e)
+            continue
+        # Depth-first, in directory order
+        stack.extend(reversed(subdirs))
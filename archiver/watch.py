@@ -0,0 +1,208 @@
+import errno
+import os
+import select
+import sqlite3
+import stat
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .database import insert_file
+from .utils import calculate_file_hash, DEFAULT_WORKERS
+from .walk import is_excluded
+from .xattrs import refresh_digest
+
+# Constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+DEFAULT_DEBOUNCE = 2.0
+
+class Inotify:
+    """Minimal ctypes binding for the Linux inotify API."""
+
+    def __init__(self):
+        # Imported here so that the CLI can read DEFAULT_DEBOUNCE without
+        # loading ctypes on every run
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+
+    def add_watch(self, path: Path, mask: int = WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            import ctypes
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def read_events(self, timeout: float):
+        """Yields (wd, mask, name) for events arriving within `timeout` seconds."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            yield wd, mask, os.fsdecode(name)
+
+    def close(self):
+        os.close(self.fd)
+
+def is_indexable(rel_path: Path) -> bool:
+    """Applies the same exclusion rules as `scan`."""
+    if not rel_path.parts or is_excluded(rel_path.parts[0], at_archive_root=True):
+        return False
+    return not is_excluded(rel_path.name, in_archive=True)
+
+def _hash_entry(file_path: Path):
+    st = file_path.lstat()
+    size = 0 if stat.S_ISLNK(st.st_mode) else st.st_size
+    file_hash = calculate_file_hash(file_path, st)
+    if refresh_digest(file_path, file_hash, st):
+        st = file_path.lstat()
+    return size, file_hash, st
+
+class ArchiveWatcher:
+    """Indexes files placed into the archive tree as they appear.
+
+    Events are debounced per path: a file is only hashed once no event has
+    been seen for it for `debounce` seconds. Hashing runs in a thread pool,
+    while all database writes stay on the calling thread.
+    """
+
+    def __init__(self, root_path: Path, conn: sqlite3.Connection, workers: int = DEFAULT_WORKERS, debounce: float = DEFAULT_DEBOUNCE):
+        self.root_path = root_path
+        self.conn = conn
+        self.debounce = debounce
+        self.inotify = Inotify()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.watches = {}
+        self.pending = {}
+        self.in_flight = {}
+        self.indexed_count = 0
+
+    def start(self):
+        self._watch_tree(self.root_path, enqueue=False)
+
+    def _watch_tree(self, top: Path, enqueue: bool):
+        for root, dirs, files in os.walk(top):
+            root = Path(root)
+            dirs[:] = [d for d in dirs if not is_excluded(d, at_archive_root=root == self.root_path)]
+            try:
+                wd = self.inotify.add_watch(root)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    print("Error: inotify watch limit reached. Raise fs.inotify.max_user_watches.")
+                    raise
+                print(f"Error watching {root}: {e}")
+                continue
+            self.watches[wd] = root
+            if enqueue:
+                # Files that landed before the watch on their directory existed
+                for file in files:
+                    self._touch(root / file)
+
+    def _touch(self, file_path: Path):
+        if is_indexable(file_path.relative_to(self.root_path)):
+            self.pending[file_path] = time.monotonic()
+
+    def poll(self, timeout: float):
+        """Reads pending inotify events and updates the debounce queue."""
+        for wd, mask, name in self.inotify.read_events(timeout):
+            if mask & IN_Q_OVERFLOW:
+                print("Warning: inotify queue overflowed, events were lost. Run 'archive scan --update'.")
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / name
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and is_indexable(path.relative_to(self.root_path)):
+                    self._watch_tree(path, enqueue=True)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._touch(path)
+            elif mask & IN_CREATE:
+                # Symlinks are never opened for writing, so creation is all we get
+                if path.is_symlink():
+                    self._touch(path)
+            elif mask & IN_MODIFY and path in self.pending:
+                # Still being written: push the deadline out
+                self.pending[path] = time.monotonic()
+
+    def flush(self, force: bool = False):
+        """Hashes settled paths and indexes finished hashes."""
+        now = time.monotonic()
+        for path, last_event in list(self.pending.items()):
+            if force or now - last_event >= self.debounce:
+                del self.pending[path]
+                if path not in self.in_flight:
+                    self.in_flight[path] = self.executor.submit(_hash_entry, path)
+
+        for path, future in list(self.in_flight.items()):
+            if not (force or future.done()):
+                continue
+            del self.in_flight[path]
+            self._index(path, future)
+        self.conn.commit()
+
+    def _index(self, path: Path, future):
+        rel_path_str = str(path.relative_to(self.root_path))
+        try:
+            size, file_hash, st = future.result()
+        except FileNotFoundError:
+            # Temporary file that was renamed or deleted again
+            return
+        except Exception as e:
+            print(f"Error indexing {rel_path_str}: {e}")
+            return
+
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT hash FROM files WHERE path = ?", (rel_path_str,))
+        row = cursor.fetchone()
+        if row is not None:
+            if row[0] != file_hash:
+                print(f"Warning: indexed file was modified: {rel_path_str}. Run 'archive scan --update'.")
+            return
+
+        insert_file(cursor, rel_path_str, size, file_hash, st)
+        self.indexed_count += 1
+        print(f"Indexed: {rel_path_str}")
+
+    def run(self):
+        while True:
+            self.poll(timeout=min(self.debounce, 1.0))
+            self.flush()
+
+    def close(self):
+        self.flush(force=True)
+        self.executor.shutdown()
+        self.inotify.close()
@@ -0,0 +1,57 @@
+import os
+import stat
+from pathlib import Path
+
+# Archived files carry their SHA-256 in an extended attribute, together with
+# the size and mtime it was computed for, so a lost index can be rebuilt by
+# reading metadata only (`scan --trust-xattrs`). The digest is only trusted
+# while size and mtime still match. Only regular files are signed: Linux does
+# not allow user attributes on symlinks.
+XATTR_NAME = "user.archive.sha256"
+
+def format_digest(file_hash: str, st: os.stat_result) -> bytes:
+    return f"{file_hash} {st.st_size} {st.st_mtime_ns}".encode("ascii")
+
+def write_digest(file_path: Path, file_hash: str, st: os.stat_result) -> bool:
+    """Stores a file's digest for its current size and mtime (`st`).
+
+    Returns False if it cannot be stored (symlinks, file systems or
+    platforms without user xattrs). Note that this changes the file's ctime.
+    """
+    if not hasattr(os, "setxattr") or not stat.S_ISREG(st.st_mode):
+        return False
+    try:
+        os.setxattr(file_path, XATTR_NAME, format_digest(file_hash, st), follow_symlinks=False)
+    except OSError:
+        return False
+    return True
+
+def refresh_digest(file_path: Path, file_hash: str, st: os.stat_result) -> bool:
+    """Rewrites the stored digest of a re-hashed file if it is out of date.
+
+    Files without the attribute are left alone. Returns True if it was
+    written, which moved the file's ctime.
+    """
+    if not hasattr(os, "getxattr") or not stat.S_ISREG(st.st_mode):
+        return False
+    try:
+        os.getxattr(file_path, XATTR_NAME, follow_symlinks=False)
+    except OSError:
+        return False
+    if read_digest(file_path, st) == file_hash:
+        return False
+    return write_digest(file_path, file_hash, st)
+
+def read_digest(file_path: Path, st: os.stat_result) -> str | None:
+    """The stored digest of a file, or None if there is none valid for `st`."""
+    if not hasattr(os, "getxattr") or not stat.S_ISREG(st.st_mode):
+        return None
+    try:
+        value = os.getxattr(file_path, XATTR_NAME, follow_symlinks=False)
+        file_hash, size, mtime_ns = value.decode("ascii").split()
+        if int(size) != st.st_size or int(mtime_ns) != st.st_mtime_ns or len(file_hash) != 64:
+            return None
+        int(file_hash, 16)
+    except (OSError, ValueError):
+        return None
+    return file_hash
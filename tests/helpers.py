@@ -0,0 +1,8 @@
+from io import StringIO
+from unittest.mock import patch
+
+def run_cmd(func, *args, **kwargs) -> str:
+    """Runs a command function and returns what it printed."""
+    with patch('sys.stdout', new=StringIO()) as out:
+        func(*args, **kwargs)
+    return out.getvalue()
@@ -0,0 +1,97 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.api import Archive, NotInitializedError, InvalidDestinationError, SourceNotFoundError
+from archiver.commands import cmd_init
+
+class TestArchiveAPI(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        self.source_path.mkdir()
+
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, content):
+        path = self.source_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        return path
+
+    def test_not_initialized(self):
+        with self.assertRaises(NotInitializedError):
+            Archive(self.source_path)
+
+    def test_add_many_reports_each_file(self):
+        a = self.write("a.txt", "alpha")
+        b = self.write("sub/b.txt", "beta")
+        with Archive(self.root_path) as archive:
+            results = list(archive.add_many([a, self.source_path], "batch"))
+        self.assertEqual(
+            [(r.status, r.path) for r in results],
+            [("added", "batch/a.txt"), ("duplicate", None), ("added", "batch/sub/b.txt")]
+        )
+        self.assertEqual(results[2].size, 4)
+        self.assertTrue((self.root_path / "batch" / "sub" / "b.txt").exists())
+
+    def test_duplicate_policies(self):
+        a = self.write("a.txt", "same")
+        b = self.write("b.txt", "same")
+        c = self.write("c.txt", "same")
+        seen = []
+        def policy(source, size, file_hash, existing):
+            seen.append((source.name, existing))
+            return True
+
+        with Archive(self.root_path) as archive:
+            self.assertEqual(next(archive.add_many(a, "one")).status, "added")
+            skipped = next(archive.add_many(b, "two"))
+            self.assertEqual(skipped.status, "duplicate")
+            self.assertEqual(skipped.existing, ["one/a.txt"])
+            self.assertEqual(next(archive.add_many(c, "three", policy)).status, "added")
+            self.assertEqual(seen, [("c.txt", ["one/a.txt"])])
+            self.assertEqual(next(archive.add_many(b, "two", "accept")).status, "added")
+
+    def test_invalid_arguments(self):
+        with Archive(self.root_path) as archive:
+            with self.assertRaises(InvalidDestinationError):
+                list(archive.add_many(self.source_path, ".hidden"))
+            with self.assertRaises(SourceNotFoundError):
+                list(archive.add_many(self.source_path / "nope", "dest"))
+
+    def test_contains_verify_and_stats(self):
+        a = self.write("a.txt", "alpha")
+        other = self.write("other.txt", "other")
+        with Archive(self.root_path) as archive:
+            list(archive.add_many(a, "docs"))
+            self.assertEqual(archive.contains(a), ["docs/a.txt"])
+            self.assertEqual(archive.contains(other), [])
+
+        (self.root_path / "docs" / "a.txt").write_text("ALPHA")
+        with Archive(self.root_path, read_only=True) as archive:
+            results = list(archive.verify_iter())
+            self.assertEqual([(r.path, r.status) for r in results], [("docs/a.txt", "hash_mismatch")])
+            stats = archive.stats()
+            self.assertEqual((stats.file_count, stats.total_size), (1, 5))
+
+    def test_scan(self):
+        (self.root_path / "new.txt").write_text("new")
+        with Archive(self.root_path) as archive:
+            result = archive.scan()
+            self.assertEqual(result.new, ["new.txt"])
+            (self.root_path / "new.txt").unlink()
+            result = archive.scan(prune=True)
+            self.assertEqual(result.gone, ["new.txt"])
+            self.assertEqual(archive.stats().file_count, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -183,6 +183,19 @@ class TestArchiver(unittest.TestCase):
             cmd_verify(self.root_path)
         self.assertIn("MISSING", captured_output.getvalue())
 
+    def test_verify_parent_replaced_by_file(self):
+        """A file where an archived directory used to be is reported, not fatal."""
+        cmd_init(self.root_path)
+        cmd_add(self.root_path, self.source_dir, "docs", False, False, False)
+        shutil.rmtree(self.root_path / "docs" / "subdir")
+        (self.root_path / "docs" / "subdir").write_text("not a directory")
+
+        captured_output = StringIO()
+        with patch('sys.stdout', captured_output):
+            cmd_verify(self.root_path)
+        self.assertIn("MISSING: docs/subdir/file2.txt", captured_output.getvalue())
+        self.assertIn("1 issues found", captured_output.getvalue())
+
     def test_scan_rebuild(self):
         """Test rebuilding database from disk."""
         cmd_init(self.root_path)
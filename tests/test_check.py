@@ -0,0 +1,78 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_add, cmd_check, _check
+from archiver.database import get_db_path, get_connection
+
+class TestCheck(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        self.source_path.mkdir()
+        cmd_init(self.root_path)
+
+        archived = self.source_path / "archived.txt"
+        archived.write_text("already here")
+        with patch('sys.stdout', new=StringIO()):
+            cmd_add(self.root_path, archived, "docs", True, False, False)
+
+        self.old_drive = Path(self.test_dir) / "old_drive"
+        (self.old_drive / "sub").mkdir(parents=True)
+        (self.old_drive / "copy.txt").write_text("already here")
+        (self.old_drive / "sub" / "same_size.txt").write_text("not arrived!")
+        (self.old_drive / "sub" / "new.txt").write_text("brand new content")
+        (self.old_drive / ".DS_Store").write_text("junk")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def run_check(self, sources):
+        captured_output = StringIO()
+        with patch('sys.stdout', captured_output):
+            cmd_check(self.root_path, sources, workers=2)
+        return captured_output.getvalue()
+
+    def test_check_reports_present_and_missing(self):
+        output = self.run_check([self.old_drive])
+
+        self.assertIn(f"PRESENT: {self.old_drive / 'copy.txt'} -> docs/archived.txt", output)
+        self.assertIn(f"MISSING: {self.old_drive / 'sub' / 'same_size.txt'}", output)
+        self.assertIn(f"MISSING: {self.old_drive / 'sub' / 'new.txt'}", output)
+        self.assertNotIn(".DS_Store", output)
+        self.assertIn("Present: 1 files (12 bytes)", output)
+        self.assertIn("Missing: 2 files (29 bytes)", output)
+
+    def test_size_prefilter_skips_hashing(self):
+        # Only the two files whose size exists in the index are hashed
+        output = self.run_check([self.old_drive])
+        self.assertIn("Checking 3 files (2 need hashing)", output)
+
+    def test_check_multiple_sources(self):
+        output = self.run_check([self.old_drive / "copy.txt", self.old_drive / "sub"])
+        self.assertIn("Present: 1 files", output)
+        self.assertIn("Missing: 2 files", output)
+
+    def test_failed_check_leaves_connection_usable(self):
+        # serve answers every check on one connection
+        conn = get_connection(get_db_path(self.root_path), "read")
+        with patch('sys.stdout', new=StringIO()), patch('archiver.commands.hash_files', side_effect=OSError("Broken pipe")):
+            with self.assertRaises(OSError):
+                _check(conn, [self.old_drive], workers=2)
+        captured_output = StringIO()
+        with patch('sys.stdout', captured_output):
+            _check(conn, [self.old_drive], workers=2)
+        conn.close()
+        self.assertIn("Present: 1 files", captured_output.getvalue())
+
+    def test_check_missing_source(self):
+        with patch('sys.stdout', new=StringIO()):
+            with self.assertRaises(SystemExit):
+                cmd_check(self.root_path, [self.old_drive / "nope"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.api import Archive
+from archiver.commands import cmd_init
+from archiver.database import get_db_path, get_connection, write_transaction
+from archiver.utils import calculate_file_hash
+
+def _add_all(root_path, source, dest, queue):
+    with Archive(root_path) as archive:
+        queue.put([(r.status, str(r.error)) for r in archive.add_many([source], dest, duplicates="accept")])
+
+class TestConcurrentAdd(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.db_path = get_db_path(self.root_path)
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def make_source(self, name, count=40):
+        source = Path(self.test_dir) / name
+        source.mkdir()
+        for i in range(count):
+            (source / f"file{i}.txt").write_text(f"{name} {i}")
+        return source
+
+    def add_in_parallel(self, sources, dest):
+        queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_add_all, args=(self.root_path, source, dest, queue)) for source in sources]
+        for process in processes:
+            process.start()
+        results = [queue.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join()
+        return results
+
+    def indexed(self):
+        conn = get_connection(self.db_path)
+        rows = conn.execute("SELECT path, hash FROM files").fetchall()
+        conn.close()
+        return rows
+
+    def test_parallel_sources_into_one_directory(self):
+        sources = [self.make_source(f"card{i}") for i in range(3)]
+        for source, name in zip(sources, ("a", "b", "c")):
+            for path in source.iterdir():
+                path.rename(source / f"{name}-{path.name}")
+
+        results = self.add_in_parallel(sources, "photos")
+        self.assertEqual([status for result in results for status, _ in result], ["added"] * 120)
+        rows = self.indexed()
+        self.assertEqual(len(rows), 120)
+        for path, file_hash in rows:
+            self.assertEqual(calculate_file_hash(self.root_path / path), file_hash)
+        self.assertEqual([p.name for p in (self.root_path / "photos").iterdir() if p.name.startswith(".")], [])
+
+    def test_racing_for_the_same_names(self):
+        sources = [self.make_source(f"card{i}") for i in range(3)]
+        results = self.add_in_parallel(sources, "photos")
+        statuses = [status for result in results for status, _ in result]
+        self.assertEqual(statuses.count("added"), 40)
+        self.assertEqual(statuses.count("exists"), 80)
+
+        # One index entry per name, describing the file that won
+        rows = self.indexed()
+        self.assertEqual(len({path for path, _ in rows}), 40)
+        self.assertEqual(len(rows), 40)
+        for path, file_hash in rows:
+            self.assertEqual(calculate_file_hash(self.root_path / path), file_hash)
+
+    def test_without_hard_links(self):
+        source = self.make_source("card", 2)
+        (self.root_path / "photos").mkdir()
+        (self.root_path / "photos" / "file1.txt").write_text("already here")
+        with patch('os.link', side_effect=PermissionError("not supported")), Archive(self.root_path) as archive:
+            statuses = sorted((r.dest.name, r.status) for r in archive.add_many([source], "photos"))
+        self.assertEqual(statuses, [("file0.txt", "added"), ("file1.txt", "exists")])
+        self.assertEqual((self.root_path / "photos" / "file1.txt").read_text(), "already here")
+        self.assertEqual(sorted(os.listdir(self.root_path / "photos")), ["file0.txt", "file1.txt"])
+
+    def test_write_lock_is_retried(self):
+        # Another process holding the write lock, released from a timer thread
+        holder = sqlite3.connect(self.db_path, check_same_thread=False)
+        holder.execute("BEGIN IMMEDIATE")
+        release = threading.Timer(0.3, holder.commit)
+        release.start()
+
+        conn = get_connection(self.db_path)
+        conn.execute("PRAGMA busy_timeout=50")
+        with write_transaction(conn) as cursor:
+            cursor.execute("INSERT INTO verify_runs (shard_k, shard_n, total) VALUES (1, 1, 0)")
+        release.join()
+        self.assertEqual(conn.execute("SELECT count(*) FROM verify_runs").fetchone()[0], 1)
+
+        holder.execute("BEGIN IMMEDIATE")
+        with patch('archiver.database.WRITE_LOCK_ATTEMPTS', 1), self.assertRaises(sqlite3.OperationalError):
+            with write_transaction(conn):
+                pass
+        holder.rollback()
+        holder.close()
+        conn.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_scan, cmd_db_maintain
+from archiver.database import get_db_path, get_connection
+from archiver.maintenance import check_consistency
+from tests.helpers import run_cmd
+
+class TestDbMaintain(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        (self.root_path / "docs").mkdir(parents=True)
+        for i in range(3):
+            (self.root_path / "docs" / f"file{i}.txt").write_text(f"Content {i}")
+        self.db_path = get_db_path(self.root_path)
+
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+            cmd_scan(self.root_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def execute(self, *statements):
+        conn = get_connection(self.db_path)
+        for statement in statements:
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+
+    def test_consistent_index(self):
+        self.execute("DROP INDEX idx_hash_size")
+        output = run_cmd(cmd_db_maintain, self.root_path)
+        self.assertIn("Created missing index idx_hash_size.", output)
+        self.assertIn("Database size:", output)
+        self.assertIn("Index is consistent.", output)
+
+        conn = get_connection(self.db_path)
+        self.assertIsNotNone(conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_hash_size'").fetchone())
+        self.assertIsNotNone(conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone())
+        conn.close()
+
+    def test_inconsistencies_are_reported(self):
+        self.execute(
+            "DELETE FROM hash_index WHERE file_id = (SELECT min(id) FROM files)",
+            "INSERT INTO hash_index (hash, size, file_id) VALUES ('abc', 1, 999)",
+            "UPDATE files SET size = size + 1 WHERE id = (SELECT max(id) FROM files)",
+        )
+        conn = get_connection(self.db_path)
+        problems = dict(check_consistency(conn))
+        conn.close()
+        self.assertEqual(problems, {
+            "files without a hash_index entry": 1,
+            "hash_index entries without a file": 1,
+            "hash_index entries that disagree with files on hash or size": 1,
+        })
+
+        with patch('sys.stdout', new=StringIO()) as out, self.assertRaises(SystemExit):
+            cmd_db_maintain(self.root_path)
+        self.assertIn("INCONSISTENT: 1 files without a hash_index entry", out.getvalue())
+        self.assertIn("3 consistency checks failed", out.getvalue())
+
+    def test_vacuum(self):
+        padding = "x" * 4000
+        self.execute(
+            "CREATE TABLE scratch(data TEXT)",
+            *[f"INSERT INTO scratch VALUES ('{padding}')" for _ in range(50)],
+        )
+        self.execute("DROP TABLE scratch")
+        output = run_cmd(cmd_db_maintain, self.root_path)
+        self.assertRegex(output, r"Vacuumed: [1-9]\d* free pages returned")
+
+        # Databases from older versions only shrink with a full vacuum
+        self.execute("PRAGMA auto_vacuum=NONE", "VACUUM")
+        self.execute(
+            "CREATE TABLE scratch(data TEXT)",
+            *[f"INSERT INTO scratch VALUES ('{padding}')" for _ in range(50)],
+        )
+        self.execute("DROP TABLE scratch")
+        self.assertIn("run with --vacuum", run_cmd(cmd_db_maintain, self.root_path))
+        self.assertIn("Vacuumed:", run_cmd(cmd_db_maintain, self.root_path, full_vacuum=True))
+
+        conn = get_connection(self.db_path)
+        self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        self.assertEqual(conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+        conn.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import hashlib
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_add, cmd_scan
+from archiver.database import get_db_path, get_connection
+from archiver.dupfilter import DuplicateFilter, get_filter_path
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+class TestDuplicateFilter(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        self.source_path.mkdir()
+        self.db_path = get_db_path(self.root_path)
+        self.filter_path = get_filter_path(self.db_path)
+
+        self.suppress_output = patch('sys.stdout', new=StringIO())
+        self.suppress_output.start()
+        cmd_init(self.root_path)
+
+    def tearDown(self):
+        self.suppress_output.stop()
+        shutil.rmtree(self.test_dir)
+
+    def add(self, name, content, dest):
+        src = self.source_path / name
+        src.write_text(content)
+        cmd_add(self.root_path, src, dest, True, False, False, use_dup_filter=True)
+
+    def test_no_false_negatives(self):
+        dup_filter = DuplicateFilter(1000 * 16)
+        entries = [(i, digest(str(i).encode())) for i in range(1000)]
+        for size, file_hash in entries:
+            dup_filter.add(size, file_hash)
+        for size, file_hash in entries:
+            self.assertTrue(dup_filter.might_contain(size, file_hash))
+        false_positives = sum(dup_filter.might_contain(i, digest(b"x%d" % i)) for i in range(10000))
+        self.assertLess(false_positives, 100)
+
+    def test_duplicates_still_detected(self):
+        self.add("a.txt", "same", "one")
+        self.assertTrue(self.filter_path.exists())
+        self.add("b.txt", "same", "two")
+        self.assertFalse((self.root_path / "two" / "b.txt").exists())
+
+    def test_new_content_skips_index_query(self):
+        self.add("a.txt", "first", "one")
+        conn = get_connection(self.db_path)
+        dup_filter = DuplicateFilter.load(self.filter_path, conn)
+        conn.close()
+        self.assertIsNotNone(dup_filter)
+        self.assertTrue(dup_filter.might_contain(5, digest(b"first")))
+        self.assertFalse(dup_filter.might_contain(6, digest(b"second")))
+
+    def test_catch_up_after_other_writers(self):
+        self.add("a.txt", "first", "one")
+        # Add without the filter: the persisted filter is now behind
+        src = self.source_path / "b.txt"
+        src.write_text("second")
+        cmd_add(self.root_path, src, "two", True, False, False)
+
+        conn = get_connection(self.db_path)
+        dup_filter = DuplicateFilter.load(self.filter_path, conn)
+        conn.close()
+        self.assertIsNotNone(dup_filter)
+        self.assertEqual(dup_filter.count, 2)
+        self.assertTrue(dup_filter.might_contain(6, digest(b"second")))
+
+    def test_rebuild_after_index_rewrite(self):
+        self.add("a.txt", "first", "one")
+        (self.root_path / "one" / "a.txt").unlink()
+        (self.root_path / "one" / "other.txt").write_text("other")
+        cmd_scan(self.root_path, update=True, prune=True)
+
+        conn = get_connection(self.db_path)
+        self.assertIsNone(DuplicateFilter.load(self.filter_path, conn))
+        dup_filter = DuplicateFilter.open(self.filter_path, conn)
+        conn.close()
+        self.assertTrue(dup_filter.might_contain(5, digest(b"other")))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import hashlib
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_add, cmd_verify, cmd_fix
+from archiver.database import get_db_path, get_connection
+from tests.helpers import run_cmd
+
+class TestFix(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        self.source_path.mkdir()
+        self.db_path = get_db_path(self.root_path)
+
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+            for name in ("a.txt", "b.txt", "c.txt"):
+                (self.source_path / name).write_text(f"original {name}")
+            cmd_add(self.root_path, self.source_path, "docs", True, False, False)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def indexed(self, rel_path):
+        conn = get_connection(self.db_path)
+        row = conn.execute("""
+            SELECT f.size, f.hash, h.size, h.hash
+            FROM files f JOIN hash_index h ON h.file_id = f.id
+            WHERE f.path = ?
+        """, (rel_path,)).fetchone()
+        conn.close()
+        return row
+
+    def test_fix_paths(self):
+        (self.root_path / "docs" / "a.txt").write_text("edited")
+        output = run_cmd(cmd_fix, self.root_path, [Path("docs/a.txt"), self.root_path / "docs" / "b.txt", Path("docs/nope.txt")])
+
+        digest = hashlib.sha256(b"edited").hexdigest()
+        self.assertEqual(self.indexed("docs/a.txt"), (6, digest, 6, digest))
+        self.assertIn("FIXED: docs/a.txt", output)
+        self.assertIn("NOT INDEXED: docs/nope.txt", output)
+        self.assertIn("1 fixed, 1 already matched, 0 missing, 1 not indexed, 0 errors.", output)
+
+    def test_fix_symlink_not_its_target(self):
+        (self.source_path / "link.txt").symlink_to("a.txt")
+        run_cmd(cmd_add, self.root_path, self.source_path / "link.txt", "docs", True, True, False)
+        link = self.root_path / "docs" / "link.txt"
+        link.unlink()
+        link.symlink_to("b.txt")
+        (self.root_path / "docs" / "a.txt").write_text("edited")
+
+        output = run_cmd(cmd_fix, self.root_path, [link])
+        self.assertIn("FIXED: docs/link.txt", output)
+        self.assertEqual(self.indexed("docs/link.txt")[1], hashlib.sha256(b"b.txt").hexdigest())
+        self.assertEqual(self.indexed("docs/a.txt")[1], hashlib.sha256(b"original a.txt").hexdigest())
+
+    def test_fix_from_verify_output_and_report(self):
+        (self.root_path / "docs" / "a.txt").write_text("edited a")
+        (self.root_path / "docs" / "b.txt").write_text("edited b, longer")
+        (self.root_path / "docs" / "c.txt").unlink()
+        report = Path(self.test_dir) / "report.ndjson"
+        console = Path(self.test_dir) / "verify.log"
+        console.write_text(run_cmd(cmd_verify, self.root_path, report_path=report))
+
+        for from_file in (console, report):
+            output = run_cmd(cmd_fix, self.root_path, [], [from_file])
+            self.assertIn("MISSING: docs/c.txt", output)
+
+        self.assertIn("0 fixed, 2 already matched, 1 missing", output)
+        self.assertEqual(self.indexed("docs/b.txt")[0], 16)
+        output = run_cmd(cmd_verify, self.root_path)
+        self.assertNotIn("CORRUPTED", output)
+
+    def test_no_paths(self):
+        with self.assertRaises(SystemExit):
+            run_cmd(cmd_fix, self.root_path, [])
+
+if __name__ == '__main__':
+    unittest.main()
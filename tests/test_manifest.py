@@ -0,0 +1,85 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_scan, cmd_export_manifest, cmd_diff
+from archiver.database import get_db_path
+from archiver.manifest import write_manifest, read_manifest, diff_entries
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.archive_a = Path(self.test_dir) / "a"
+        self.archive_b = Path(self.test_dir) / "b"
+        for root in (self.archive_a, self.archive_b):
+            (root / "photos").mkdir(parents=True)
+            (root / "photos" / "same.jpg").write_text("same")
+            (root / "photos" / "changed.jpg").write_text(f"changed in {root.name}")
+        (self.archive_a / "photos" / "only_a.jpg").write_text("a")
+        (self.archive_b / "photos" / "only_b.jpg").write_text("b")
+
+        self.suppress_output = patch('sys.stdout', new=StringIO())
+        self.suppress_output.start()
+        for root in (self.archive_a, self.archive_b):
+            cmd_init(root)
+            cmd_scan(root)
+
+    def tearDown(self):
+        self.suppress_output.stop()
+        shutil.rmtree(self.test_dir)
+
+    def test_roundtrip(self):
+        entries = [
+            ("dir/a.txt", 1, "00" * 32),
+            ("dir/b.txt", 2 ** 40, "ab" * 32),
+            ("dir/sub/ü.txt", 0, "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"),
+        ]
+        manifest = Path(self.test_dir) / "m.manifest"
+        self.assertEqual(write_manifest(manifest, entries), 3)
+        self.assertEqual(list(read_manifest(manifest)), entries)
+
+    def test_export_is_sorted(self):
+        manifest = Path(self.test_dir) / "a.manifest"
+        cmd_export_manifest(self.archive_a, manifest)
+        paths = [e[0] for e in read_manifest(manifest)]
+        self.assertEqual(paths, ["photos/changed.jpg", "photos/only_a.jpg", "photos/same.jpg"])
+
+    def test_diff_entries(self):
+        a = iter([("a", 1, "x"), ("b", 1, "x"), ("c", 1, "x")])
+        b = iter([("b", 1, "y"), ("c", 1, "x"), ("d", 1, "x")])
+        self.assertEqual(list(diff_entries(a, b)), [("missing", "a"), ("mismatch", "b"), ("extra", "d")])
+
+    def check_diff_output(self, location_a, location_b):
+        captured_output = StringIO()
+        with patch('sys.stdout', captured_output):
+            cmd_diff(location_a, location_b)
+        output = captured_output.getvalue()
+        self.assertIn("MISSING: photos/only_a.jpg", output)
+        self.assertIn("EXTRA: photos/only_b.jpg", output)
+        self.assertIn("MISMATCH: photos/changed.jpg", output)
+        self.assertNotIn("same.jpg", output)
+        self.assertIn("1 missing, 1 extra, 1 mismatched", output)
+
+    def test_diff_manifests(self):
+        manifest_a = Path(self.test_dir) / "a.manifest"
+        manifest_b = Path(self.test_dir) / "b.manifest"
+        cmd_export_manifest(self.archive_a, manifest_a)
+        cmd_export_manifest(self.archive_b, manifest_b)
+        self.check_diff_output(manifest_a, manifest_b)
+
+    def test_diff_mixed_sources(self):
+        manifest_a = Path(self.test_dir) / "a.manifest"
+        cmd_export_manifest(self.archive_a, manifest_a)
+        self.check_diff_output(manifest_a, get_db_path(self.archive_b))
+        self.check_diff_output(self.archive_a, self.archive_b)
+
+    def test_diff_identical(self):
+        captured_output = StringIO()
+        with patch('sys.stdout', captured_output):
+            cmd_diff(self.archive_a, self.archive_a)
+        self.assertIn("Indices are identical", captured_output.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
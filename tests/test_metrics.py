@@ -0,0 +1,84 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_add, cmd_scan, cmd_verify, cmd_status
+from archiver.metrics import MetricsFile, timestamp_seconds
+from tests.helpers import run_cmd
+
+def read_metrics(path: Path) -> dict[str, float]:
+    """Samples by name and labels, e.g. 'archiver_files{archive="/a"}'."""
+    samples = {}
+    for line in path.read_text().splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        (self.source_path / "2023").mkdir(parents=True)
+        (self.source_path / "2023" / "a.jpg").write_text("photo a")
+        (self.source_path / "b.jpg").write_text("photo bb")
+        self.metrics_path = Path(self.test_dir) / "archiver.prom"
+        self.label = f'archive="{self.root_path}"'
+
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def run_metrics(self, func, *args, **kwargs):
+        run_cmd(func, *args, **kwargs)
+        return read_metrics(self.metrics_path)
+
+    def test_format(self):
+        metrics = MetricsFile(self.metrics_path, "add", Path('/mnt/"odd"'))
+        metrics.set("add_results", 2, "By outcome.", status="added")
+        metrics.set("add_results", 1, "By outcome.", status="duplicate")
+        metrics.write()
+        text = self.metrics_path.read_text()
+        self.assertEqual(text.count("# TYPE archiver_add_results gauge"), 1)
+        self.assertIn('archiver_add_results{archive="/mnt/\\"odd\\"",status="added"} 2\n', text)
+        self.assertIn("archiver_add_last_success_timestamp_seconds", text)
+        # Written under a temporary name and renamed
+        self.assertEqual(list(Path(self.test_dir).glob(".archiver.prom.*")), [])
+        self.assertEqual(timestamp_seconds("1970-01-02 00:00:00"), 86400)
+
+    def test_add_verify_scan_status(self):
+        m = self.run_metrics(cmd_add, self.root_path, self.source_path, "photos", True, False, False, metrics_path=self.metrics_path)
+        self.assertEqual(m[f"archiver_add_files{{{self.label}}}"], 2)
+        self.assertEqual(m[f"archiver_add_bytes{{{self.label}}}"], 15)
+        self.assertEqual(m[f'archiver_add_results{{{self.label},status="added"}}'], 2)
+
+        m = self.run_metrics(cmd_status, self.root_path, metrics_path=self.metrics_path)
+        self.assertEqual(m[f"archiver_unverified_files{{{self.label}}}"], 2)
+        self.assertNotIn(f"archiver_oldest_verified_timestamp_seconds{{{self.label}}}", m)
+
+        (self.root_path / "photos" / "b.jpg").write_text("damaged!")
+        m = self.run_metrics(cmd_verify, self.root_path, metrics_path=self.metrics_path)
+        self.assertEqual(m[f"archiver_verify_files{{{self.label}}}"], 2)
+        self.assertEqual(m[f"archiver_verify_bytes{{{self.label}}}"], 15)
+        self.assertEqual(m[f"archiver_verify_issues{{{self.label}}}"], 1)
+        self.assertEqual(m[f"archiver_unverified_files{{{self.label}}}"], 1)
+        self.assertGreater(m[f"archiver_oldest_verified_timestamp_seconds{{{self.label}}}"], 0)
+        self.assertIn(f"archiver_verify_bytes_per_second{{{self.label}}}", m)
+
+        m = self.run_metrics(cmd_scan, self.root_path, update=True, metrics_path=self.metrics_path)
+        self.assertEqual(m[f'archiver_scan_update_files{{{self.label},status="changed"}}'], 1)
+        self.assertEqual(m[f"archiver_scan_files{{{self.label}}}"], 2)
+        self.assertEqual(m[f"archiver_scan_bytes{{{self.label}}}"], 8)
+        self.assertIn(f"archiver_scan_bytes_per_second{{{self.label}}}", m)
+
+        m = self.run_metrics(cmd_status, self.root_path, by_dir=True, metrics_path=self.metrics_path)
+        self.assertEqual(m[f'archiver_dir_bytes{{{self.label},dir="photos"}}'], 15)
+
+if __name__ == '__main__':
+    unittest.main()
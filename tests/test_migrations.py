@@ -0,0 +1,85 @@
+import unittest
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from archiver.database import get_connection, init_db, insert_file, delete_file
+from archiver.migrations import migrate, schema_version, fts_available, LATEST_VERSION
+from archiver.rollup import rebuild_rollups
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = Path(self.test_dir) / "archive.db"
+        self.st = os.stat(self.test_dir)
+
+        # The schema of the first release, with some files in it
+        conn = get_connection(self.db_path)
+        conn.execute("CREATE TABLE files(id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL, size INTEGER NOT NULL, hash TEXT NOT NULL, added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, last_verified TIMESTAMP)")
+        conn.execute("CREATE TABLE hash_index(hash TEXT NOT NULL, size INTEGER NOT NULL, file_id INTEGER NOT NULL)")
+        for i in range(10):
+            cursor = conn.execute("INSERT INTO files (path, size, hash) VALUES (?, ?, ?)", (f"dir{i % 3}/file{i}.txt", 10 + i % 2, f"hash{i % 2}"))
+            conn.execute("INSERT INTO hash_index (hash, size, file_id) VALUES (?, ?, ?)", (f"hash{i % 2}", 10 + i % 2, cursor.lastrowid))
+        conn.commit()
+        self.conn = conn
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.test_dir)
+
+    def rollups(self):
+        return self.conn.execute("SELECT * FROM dir_rollups ORDER BY dir").fetchall()
+
+    def assertUpToDate(self):
+        self.assertEqual(schema_version(self.conn), LATEST_VERSION)
+        self.assertEqual(self.conn.execute("SELECT count(*) FROM migration_progress").fetchone()[0], 0)
+        incremental = self.rollups()
+        rebuild_rollups(self.conn)
+        self.assertEqual(incremental, self.rollups())
+        if fts_available(self.conn):
+            indexed = self.conn.execute("SELECT rowid, path FROM files_fts ORDER BY rowid").fetchall()
+            self.assertEqual(indexed, self.conn.execute("SELECT id, path FROM files ORDER BY id").fetchall())
+
+    def test_upgrade_in_batches(self):
+        batches = []
+        applied = migrate(self.conn, batch_size=3, progress=lambda m, done, total: batches.append((m.name, done, total)))
+        self.assertEqual([m.version for m in applied], list(range(1, LATEST_VERSION + 1)))
+        self.assertEqual([b for b in batches if b[0] == "dir_rollups"], [("dir_rollups", n, 10) for n in (3, 6, 9, 10)])
+        self.assertIn("mtime_ns", {row[1] for row in self.conn.execute("PRAGMA table_info(files)")})
+        self.assertUpToDate()
+        self.assertEqual(self.rollups()[0][:4], ("", 10, 105, 84))
+
+        # Nothing left to do
+        self.assertEqual(migrate(self.conn), [])
+
+    def test_interrupted_upgrade_resumes(self):
+        def interrupt(migration, done, total):
+            if migration.name == "dir_rollups" and done == 6:
+                raise KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            migrate(self.conn, batch_size=3, progress=interrupt)
+        self.assertEqual(schema_version(self.conn), 3)
+        self.assertEqual(self.conn.execute("SELECT last_id FROM migration_progress WHERE name = 'dir_rollups'").fetchone(), (3,))
+
+        # Other writers keep using the index between batches
+        cursor = self.conn.cursor()
+        insert_file(cursor, "dir0/new.txt", 10, "hash0", self.st)
+        delete_file(cursor, 1)
+        delete_file(cursor, 8)
+        self.conn.commit()
+
+        migrate(self.conn, batch_size=3)
+        self.assertUpToDate()
+
+    def test_databases_with_the_tables_need_no_backfill(self):
+        self.conn.close()
+        init_db(self.db_path).close()
+        self.conn = get_connection(self.db_path)
+        self.conn.execute("PRAGMA user_version = 0")
+        batches = []
+        migrate(self.conn, progress=lambda *args: batches.append(args))
+        self.assertEqual(batches, [])
+        self.assertUpToDate()
+
+if __name__ == '__main__':
+    unittest.main()
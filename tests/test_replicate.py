@@ -0,0 +1,111 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.api import Archive
+from archiver.commands import cmd_init, cmd_add, cmd_replicate
+from archiver.database import get_db_path, get_connection
+from archiver.manifest import open_entries, diff_entries
+from archiver.treehash import CHUNK_SIZE
+
+class TestReplicate(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.mirror_path = Path(self.test_dir) / "mirror"
+        self.mirror_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        (self.source_path / "sub").mkdir(parents=True)
+        (self.source_path / "a.txt").write_text("alpha")
+        (self.source_path / "sub" / "b.txt").write_text("beta")
+        (self.source_path / "sub" / "link").symlink_to("b.txt")
+
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+            cmd_add(self.root_path, self.source_path, "docs", True, False, False)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def replicate(self, expect_failure=False, **kwargs):
+        with patch('sys.stdout', new=StringIO()) as out:
+            if expect_failure:
+                with self.assertRaises(SystemExit):
+                    cmd_replicate(self.root_path, self.mirror_path, **kwargs)
+            else:
+                cmd_replicate(self.root_path, self.mirror_path, **kwargs)
+        return out.getvalue()
+
+    def add(self, name, content, dest="docs"):
+        path = Path(self.test_dir) / name
+        path.write_text(content)
+        with Archive(self.root_path) as archive:
+            list(archive.add_many([path], dest, duplicates="accept"))
+
+    def assertMirrored(self):
+        with open_entries(self.root_path) as a, open_entries(self.mirror_path) as b:
+            self.assertEqual(list(diff_entries(a, b)), [])
+
+    def test_replicate_and_sync(self):
+        output = self.replicate()
+        self.assertIn("Mirror initialized", output)
+        self.assertIn("3 files copied", output)
+        self.assertMirrored()
+        self.assertEqual((self.mirror_path / "docs" / "sub" / "b.txt").read_text(), "beta")
+        self.assertTrue((self.mirror_path / "docs" / "sub" / "link").is_symlink())
+
+        # Only the delta is copied; known content comes from the mirror itself
+        self.add("copy.txt", "alpha", "more")
+        self.add("new.txt", "gamma")
+        output = self.replicate()
+        self.assertIn("Copied: more/copy.txt (from docs/a.txt on the mirror)", output)
+        self.assertIn("Copied: docs/new.txt\n", output)
+        self.assertIn("1 files copied", output)
+        self.assertMirrored()
+
+        self.assertIn("0 files copied", self.replicate())
+
+    def test_interrupted_copy_is_adopted(self):
+        (self.mirror_path / "docs").mkdir()
+        (self.mirror_path / "docs" / "a.txt").write_text("alpha")
+        output = self.replicate()
+        self.assertIn("Indexed: docs/a.txt (already on the mirror)", output)
+        self.assertMirrored()
+
+    def test_problems_are_not_overwritten(self):
+        self.replicate()
+        self.add("c.txt", "source version")
+        with Archive(self.mirror_path) as mirror:
+            (Path(self.test_dir) / "c.txt").write_text("mirror version")
+            list(mirror.add_many([Path(self.test_dir) / "c.txt"], "docs"))
+        self.add("d.txt", "delta")
+        (self.root_path / "docs" / "d.txt").write_text("changed")
+
+        output = self.replicate(expect_failure=True)
+        self.assertIn("CONFLICT: docs/c.txt", output)
+        self.assertIn("CORRUPTED (Hash mismatch): docs/d.txt", output)
+        self.assertEqual((self.mirror_path / "docs" / "c.txt").read_text(), "mirror version")
+        self.assertFalse((self.mirror_path / "docs" / "d.txt").exists())
+        self.assertEqual(list((self.mirror_path / "docs").glob(".*")), [])
+
+    def test_tree_hashes_carry_over(self):
+        big = Path(self.test_dir) / "big.img"
+        big.write_bytes(b"x" * (CHUNK_SIZE + 1))
+        with patch('archiver.api.TREE_HASH_MIN_SIZE', CHUNK_SIZE), Archive(self.root_path) as archive:
+            list(archive.add_many([big], "images", tree_hash=True))
+        self.replicate(workers=2)
+
+        conn = get_connection(get_db_path(self.mirror_path))
+        rows = conn.execute("SELECT count(*) FROM file_chunks c JOIN files f ON f.id = c.file_id WHERE f.path = 'images/big.img'").fetchone()
+        conn.close()
+        self.assertEqual(rows, (2,))
+
+    def test_overlapping_mirror_is_rejected(self):
+        with patch('sys.stdout', new=StringIO()), self.assertRaises(SystemExit):
+            cmd_replicate(self.root_path, self.root_path / "docs")
+
+if __name__ == '__main__':
+    unittest.main()
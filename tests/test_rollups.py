@@ -0,0 +1,112 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_add, cmd_scan, cmd_verify, cmd_fix, cmd_status
+from archiver.database import get_db_path, get_connection
+from archiver.rollup import ancestors, rebuild_rollups
+from tests.helpers import run_cmd
+
+class TestRollups(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        (self.source_path / "2023").mkdir(parents=True)
+        (self.source_path / "2023" / "a.jpg").write_text("photo a")
+        (self.source_path / "2023" / "b.jpg").write_text("photo b")
+        (self.source_path / "c.jpg").write_text("photo c")
+        self.db_path = get_db_path(self.root_path)
+
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+            cmd_add(self.root_path, self.source_path, "photos", True, False, False)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def rollups(self):
+        conn = get_connection(self.db_path)
+        rows = conn.execute("SELECT * FROM dir_rollups ORDER BY dir").fetchall()
+        conn.close()
+        return rows
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        conn = get_connection(self.db_path)
+        rebuild_rollups(conn)
+        conn.close()
+        self.assertEqual(incremental, self.rollups())
+        return incremental
+
+    def test_ancestors(self):
+        self.assertEqual(ancestors("a.txt"), [""])
+        self.assertEqual(ancestors("photos/2023/a.jpg"), ["", "photos", "photos/2023"])
+
+    def test_incremental_matches_rebuild(self):
+        rows = self.assertMatchesRebuild()
+        self.assertEqual([row[:5] for row in rows], [("", 3, 21, 0, 3), ("photos", 3, 21, 0, 3), ("photos/2023", 2, 14, 0, 2)])
+
+        # A second copy elsewhere counts as duplicate bytes there only
+        (self.source_path / "2023" / "a.jpg").rename(self.source_path / "copy.jpg")
+        shutil.rmtree(self.source_path / "2023")
+        (self.source_path / "c.jpg").unlink()
+        with patch('sys.stdout', new=StringIO()):
+            cmd_add(self.root_path, self.source_path / "copy.jpg", "backup", True, True, False)
+        rows = {row[0]: row for row in self.assertMatchesRebuild()}
+        self.assertEqual(rows["backup"][3], 7)
+        self.assertEqual(rows["photos"][3], 0)
+
+        # Changing the original makes the copy the only one left
+        (self.root_path / "photos" / "2023" / "a.jpg").write_text("edited photo a")
+        run_cmd(cmd_fix, self.root_path, [self.root_path / "photos" / "2023" / "a.jpg"])
+        rows = {row[0]: row for row in self.assertMatchesRebuild()}
+        self.assertEqual(rows["backup"][3], 0)
+        self.assertEqual(rows[""][2], 35)
+
+        (self.root_path / "photos" / "c.jpg").unlink()
+        (self.root_path / "photos" / "new").mkdir()
+        (self.root_path / "photos" / "new" / "d.jpg").write_text("photo a")
+        run_cmd(cmd_scan, self.root_path, update=True, prune=True)
+        rows = {row[0]: row for row in self.assertMatchesRebuild()}
+        self.assertEqual(rows["photos/new"][3], 7)
+        self.assertEqual(rows["photos"][1], 3)
+
+        # Removing every file in a directory removes its row
+        shutil.rmtree(self.root_path / "photos" / "new")
+        run_cmd(cmd_scan, self.root_path, update=True, prune=True)
+        self.assertNotIn("photos/new", {row[0] for row in self.assertMatchesRebuild()})
+
+    def test_verify_and_status(self):
+        run_cmd(cmd_verify, self.root_path)
+        rows = self.assertMatchesRebuild()
+        self.assertTrue(all(row[4] == 0 and row[5] is not None for row in rows))
+
+        output = run_cmd(cmd_status, self.root_path, by_dir=True, depth=2)
+        self.assertIn("photos/2023/", output)
+        lines = [line.split() for line in output.splitlines() if line.endswith("photos/")]
+        self.assertEqual(lines[0][:4], ["3", "21", "0", "0"])
+        self.assertNotIn("photos/2023/", run_cmd(cmd_status, self.root_path, by_dir=True))
+
+        # Verifying again moves oldest_verified forward
+        conn = get_connection(self.db_path)
+        conn.execute("UPDATE files SET last_verified = '2000-01-01 00:00:00' WHERE path LIKE 'photos/2023/%'")
+        rebuild_rollups(conn)
+        conn.close()
+        (self.root_path / "photos" / "c.jpg").write_text("damaged")
+        run_cmd(cmd_verify, self.root_path)
+        rows = {row[0]: row for row in self.assertMatchesRebuild()}
+        self.assertNotEqual(rows["photos/2023"][5], "2000-01-01 00:00:00")
+
+        # --rebuild recomputes the totals from the files table
+        conn = get_connection(self.db_path)
+        conn.execute("DELETE FROM dir_rollups")
+        conn.commit()
+        conn.close()
+        self.assertIn("photos/", run_cmd(cmd_status, self.root_path, by_dir=True, rebuild=True))
+
+if __name__ == '__main__':
+    unittest.main()
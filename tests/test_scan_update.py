@@ -0,0 +1,116 @@
+import unittest
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_scan
+from archiver.database import get_db_path, get_connection
+
+class TestScanUpdate(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir)
+        (self.root_path / "docs").mkdir()
+        self.file1 = self.root_path / "docs" / "file1.txt"
+        self.file1.write_text("Content 1")
+        self.file2 = self.root_path / "docs" / "file2.txt"
+        self.file2.write_text("Content 2")
+
+        self.suppress_output = patch('sys.stdout', new=StringIO())
+        self.suppress_output.start()
+        cmd_init(self.root_path)
+        cmd_scan(self.root_path)
+
+    def tearDown(self):
+        self.suppress_output.stop()
+        shutil.rmtree(self.test_dir)
+
+    def run_update(self, prune=False):
+        captured_output = StringIO()
+        with patch('sys.stdout', captured_output):
+            cmd_scan(self.root_path, update=True, prune=prune)
+        return captured_output.getvalue()
+
+    def rows(self):
+        conn = get_connection(get_db_path(self.root_path))
+        rows = conn.execute("SELECT path, hash FROM files ORDER BY path").fetchall()
+        index = conn.execute("SELECT f.path, h.hash FROM hash_index h JOIN files f ON f.id = h.file_id ORDER BY f.path").fetchall()
+        conn.close()
+        self.assertEqual(rows, index)
+        return dict(rows)
+
+    def test_signature_recorded(self):
+        conn = get_connection(get_db_path(self.root_path))
+        mtime_ns, inode, ctime_ns = conn.execute("SELECT mtime_ns, inode, ctime_ns FROM files WHERE path = 'docs/file1.txt'").fetchone()
+        conn.close()
+        st = self.file1.lstat()
+        self.assertEqual((mtime_ns, inode, ctime_ns), (st.st_mtime_ns, st.st_ino, st.st_ctime_ns))
+
+    def test_unchanged_files_are_not_hashed(self):
+        with patch('archiver.api.calculate_file_hash') as mock_hash:
+            output = self.run_update()
+        mock_hash.assert_not_called()
+        self.assertIn("0 new, 0 changed, 0 re-signed, 2 unchanged, 0 gone", output)
+
+    def test_detects_new_changed_and_gone(self):
+        before = self.rows()
+        self.file1.write_text("Content X")
+        st = self.file1.stat()
+        os.utime(self.file1, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.file2.unlink()
+        (self.root_path / "docs" / "file3.txt").write_text("Content 3")
+
+        output = self.run_update()
+        self.assertIn("CHANGED: docs/file1.txt", output)
+        self.assertIn("NEW: docs/file3.txt", output)
+        self.assertIn("GONE: docs/file2.txt", output)
+
+        after = self.rows()
+        self.assertNotEqual(before["docs/file1.txt"], after["docs/file1.txt"])
+        self.assertIn("docs/file2.txt", after)
+        self.assertIn("docs/file3.txt", after)
+
+        # A second update finds nothing to do
+        self.assertIn("0 new, 0 changed, 0 re-signed, 2 unchanged, 1 gone", self.run_update())
+
+    def test_leftover_partial_copies_are_not_indexed(self):
+        (self.root_path / "docs" / ".file3.txt.4242.partial").write_text("Interrupted copy")
+        output = self.run_update()
+        self.assertNotIn("partial", output)
+        self.assertIn("0 new", output)
+
+    def test_prune_removes_gone_entries(self):
+        self.file2.unlink()
+        output = self.run_update(prune=True)
+        self.assertIn("REMOVED: docs/file2.txt", output)
+        self.assertNotIn("docs/file2.txt", self.rows())
+
+    def test_legacy_database_gets_columns(self):
+        shutil.rmtree(get_db_path(self.root_path).parent)
+        db_path = get_db_path(self.root_path)
+        db_path.parent.mkdir()
+        conn = get_connection(db_path)
+        conn.execute("CREATE TABLE files(id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT NOT NULL, size INTEGER NOT NULL, hash TEXT NOT NULL, added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, last_verified TIMESTAMP)")
+        conn.execute("CREATE TABLE hash_index(hash TEXT NOT NULL, size INTEGER NOT NULL, file_id INTEGER NOT NULL)")
+        conn.execute("CREATE INDEX idx_hash_size ON hash_index(hash, size)")
+        conn.execute("CREATE INDEX idx_files_path ON files(path)")
+        conn.commit()
+        conn.close()
+
+        # Opening the old database adds the signature columns
+        cmd_scan(self.root_path)
+        self.assertIn("2 unchanged", self.run_update())
+
+    def test_rows_without_signature_are_rehashed_once(self):
+        conn = get_connection(get_db_path(self.root_path))
+        conn.execute("UPDATE files SET mtime_ns = NULL, inode = NULL, ctime_ns = NULL")
+        conn.commit()
+        conn.close()
+
+        self.assertIn("0 changed, 2 re-signed, 0 unchanged", self.run_update())
+        self.assertIn("2 unchanged", self.run_update())
+
+if __name__ == "__main__":
+    unittest.main()
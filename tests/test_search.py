@@ -0,0 +1,102 @@
+import unittest
+import shutil
+import sqlite3
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_scan, cmd_find, cmd_ls
+from archiver.database import get_db_path, get_connection
+from archiver.migrations import fts_available
+from archiver.main import main
+from archiver.search import find_paths, list_dir
+from tests.helpers import run_cmd
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        for rel_path in ("photos/2023/IMG_001.JPG", "photos/2023/img_002.jpg", "photos/2023-raw/img_002.cr2",
+                         "photos/cover.jpg", "photos.txt", "docs/notes.txt"):
+            path = self.root_path / rel_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(rel_path)
+        self.db_path = get_db_path(self.root_path)
+
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+            cmd_scan(self.root_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def find(self, pattern):
+        conn = get_connection(self.db_path, "read")
+        paths = [path for path, _ in find_paths(conn, pattern)]
+        conn.close()
+        return paths
+
+    def test_find(self):
+        self.assertEqual(self.find("img_00"), ["photos/2023-raw/img_002.cr2", "photos/2023/IMG_001.JPG", "photos/2023/img_002.jpg"])
+        self.assertEqual(self.find("*.jpg"), ["photos/2023/img_002.jpg", "photos/cover.jpg"])
+        # Too short for the trigram index
+        self.assertEqual(self.find("Co"), ["photos/cover.jpg"])
+
+        output = run_cmd(cmd_find, self.root_path, "notes")
+        self.assertEqual(output, "docs/notes.txt\n")
+
+    @unittest.skipUnless(fts_available(sqlite3.connect(":memory:")), "SQLite without FTS5")
+    def test_index_follows_changes(self):
+        (self.root_path / "docs" / "notes.txt").unlink()
+        (self.root_path / "docs" / "minutes.txt").write_text("minutes")
+        with patch('sys.stdout', new=StringIO()):
+            cmd_scan(self.root_path, update=True, prune=True)
+        self.assertEqual(self.find("notes"), [])
+        self.assertEqual(self.find("minutes"), ["docs/minutes.txt"])
+
+        # Databases from older versions get the index on first use
+        conn = get_connection(self.db_path)
+        conn.executescript("DROP TRIGGER files_fts_insert; DROP TRIGGER files_fts_delete; DROP TRIGGER files_fts_update; DROP TABLE files_fts; PRAGMA user_version = 4;")
+        conn.close()
+        output = run_cmd(cmd_find, self.root_path, "minutes")
+        self.assertIn("Upgrading index: Add path search index... 100%", output)
+        self.assertTrue(output.endswith("\ndocs/minutes.txt\n"))
+        conn = get_connection(self.db_path, "read")
+        self.assertEqual(conn.execute("SELECT count(*) FROM files_fts WHERE files_fts MATCH 'minutes'").fetchone()[0], 1)
+        conn.close()
+
+    def test_sqlite_without_trigram_tokenizer(self):
+        # Before SQLite 3.34 there is no path index and find scans the files table
+        shutil.rmtree(self.root_path / ".archive-index")
+        with patch('sqlite3.sqlite_version_info', (3, 33, 0)), patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+            cmd_scan(self.root_path)
+        conn = get_connection(self.db_path, "read")
+        self.assertIsNone(conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'files_fts'").fetchone())
+        conn.close()
+        self.assertEqual(self.find("img_00"), ["photos/2023-raw/img_002.cr2", "photos/2023/IMG_001.JPG", "photos/2023/img_002.jpg"])
+
+    def test_ls(self):
+        conn = get_connection(self.db_path, "read")
+        self.assertEqual(list(list_dir(conn, "")), [("docs", True, None), ("photos.txt", False, 10), ("photos", True, None)])
+        self.assertEqual([name for name, _, _ in list_dir(conn, "photos/")], ["2023-raw", "2023", "cover.jpg"])
+        self.assertEqual(list(list_dir(conn, "photo")), [])
+        conn.close()
+
+        self.assertEqual(run_cmd(cmd_ls, self.root_path, "photos").split(), ["2023/", "2023-raw/", "16", "cover.jpg"])
+        output = run_cmd(cmd_ls, self.root_path, "photos/2023")
+        self.assertIn("IMG_001.JPG", output)
+        self.assertNotIn("cr2", output)
+        with self.assertRaises(SystemExit):
+            run_cmd(cmd_ls, self.root_path, "nope")
+
+    def test_ls_command_line(self):
+        # The directory argument must not replace the global -C directory
+        with patch('sys.argv', ["archive", "-C", str(self.root_path), "ls", "photos"]):
+            output = run_cmd(main)
+        self.assertEqual(output.split(), ["2023/", "2023-raw/", "16", "cover.jpg"])
+        with patch('sys.argv', ["archive", "-C", str(self.root_path), "ls"]):
+            self.assertIn("photos.txt", run_cmd(main))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_add, cmd_status
+from archiver.database import get_db_path
+from archiver.server import forward, get_socket_path, is_running
+
+ARCHIVE_SCRIPT = Path(__file__).parent.parent / "archive"
+
+class TestServe(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.runtime_dir = Path(self.test_dir) / "run"
+        self.runtime_dir.mkdir()
+        self.env = patch.dict(os.environ, {"XDG_RUNTIME_DIR": str(self.runtime_dir)})
+        self.env.start()
+
+        self.file1 = Path(self.test_dir) / "file1.txt"
+        self.file1.write_text("Content 1")
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+            cmd_add(self.root_path, self.file1, "docs", True, False, False)
+
+        self.socket_path = get_socket_path(get_db_path(self.root_path))
+        self.server = subprocess.Popen(
+            [sys.executable, str(ARCHIVE_SCRIPT), "-C", str(self.root_path), "serve"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while not is_running(self.socket_path):
+            if time.monotonic() > deadline or self.server.poll() is not None:
+                self.fail("Server did not start")
+            time.sleep(0.05)
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.wait()
+        self.env.stop()
+        shutil.rmtree(self.test_dir)
+
+    def forward(self, request):
+        request = {"root": str(self.root_path), **request}
+        captured_output = StringIO()
+        with patch('sys.stdout', captured_output):
+            code = forward(self.socket_path, request)
+        return code, captured_output.getvalue()
+
+    def test_status_matches_local(self):
+        code, output = self.forward({"command": "status"})
+        self.assertEqual(code, 0)
+        local_output = StringIO()
+        with patch('sys.stdout', local_output):
+            cmd_status(self.root_path)
+        self.assertEqual(output, local_output.getvalue())
+
+    def test_status_sees_new_commits(self):
+        self.forward({"command": "status"})
+        file2 = Path(self.test_dir) / "file2.txt"
+        file2.write_text("Content 2")
+        with patch('sys.stdout', new=StringIO()):
+            cmd_add(self.root_path, file2, "docs", True, False, False)
+        _, output = self.forward({"command": "status"})
+        self.assertIn("Total Files: 2", output)
+
+    def test_check(self):
+        code, output = self.forward({"command": "check", "sources": [str(self.file1)]})
+        self.assertEqual(code, 0)
+        self.assertIn(f"PRESENT: {self.file1} -> docs/file1.txt", output)
+
+    def test_errors_return_exit_code(self):
+        code, output = self.forward({"command": "check", "sources": [str(Path(self.test_dir) / "nope")]})
+        self.assertEqual(code, 1)
+        self.assertIn("does not exist", output)
+
+        code, output = self.forward({"command": "status", "root": "/elsewhere"})
+        self.assertEqual(code, 1)
+
+    def test_no_server(self):
+        self.server.terminate()
+        self.server.wait()
+        self.assertFalse(self.socket_path.exists())
+        self.assertIsNone(forward(self.socket_path, {"command": "status"}))
+
+    def test_sockets_of_other_users_are_ignored(self):
+        with patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertFalse(is_running(self.socket_path))
+            self.assertIsNone(forward(self.socket_path, {"command": "status"}))
+
+        # Not a socket at all
+        fake = self.runtime_dir / "fake.sock"
+        fake.write_text("")
+        self.assertIsNone(forward(fake, {"command": "status"}))
+
+if __name__ == "__main__":
+    unittest.main()
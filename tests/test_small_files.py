@@ -0,0 +1,95 @@
+import unittest
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_add, cmd_verify
+from archiver.database import get_db_path, get_connection
+from archiver.utils import calculate_file_hash, read_small_file, EMPTY_HASH
+
+class TestSmallFiles(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        self.source_path.mkdir()
+
+        self.suppress_output = patch('sys.stdout', new=StringIO())
+        self.suppress_output.start()
+        cmd_init(self.root_path)
+
+    def tearDown(self):
+        self.suppress_output.stop()
+        shutil.rmtree(self.test_dir)
+
+    def indexed(self, path):
+        conn = get_connection(get_db_path(self.root_path))
+        row = conn.execute("SELECT size, hash FROM files WHERE path = ?", (path,)).fetchone()
+        conn.close()
+        return row
+
+    def test_empty_hash_constant(self):
+        self.assertEqual(EMPTY_HASH, hashlib.sha256(b"").hexdigest())
+
+    def test_empty_file_is_not_opened(self):
+        empty = self.source_path / "empty"
+        empty.touch()
+        with patch('builtins.open', side_effect=AssertionError("opened")):
+            self.assertEqual(calculate_file_hash(empty), EMPTY_HASH)
+
+    def test_add_empty_file(self):
+        empty = self.source_path / "empty"
+        empty.touch()
+        os.utime(empty, (1_000_000, 1_000_000))
+        cmd_add(self.root_path, empty, "docs", True, False, False)
+
+        dest = self.root_path / "docs" / "empty"
+        self.assertTrue(dest.is_file())
+        self.assertEqual(dest.stat().st_size, 0)
+        self.assertEqual(dest.stat().st_mtime, 1_000_000)
+        self.assertEqual(self.indexed("docs/empty"), (0, EMPTY_HASH))
+
+    def test_add_small_file_reads_source_once(self):
+        small = self.source_path / "small.txt"
+        small.write_bytes(b"small content")
+        os.utime(small, (1_000_000, 1_000_000))
+
+        real_open = open
+        opened = []
+        def tracking_open(path, *args, **kwargs):
+            opened.append(Path(path))
+            return real_open(path, *args, **kwargs)
+
+        with patch('builtins.open', side_effect=tracking_open):
+            cmd_add(self.root_path, small, "docs", True, False, False)
+
+        self.assertEqual(opened.count(small), 1)
+        dest = self.root_path / "docs" / "small.txt"
+        self.assertEqual(dest.read_bytes(), b"small content")
+        self.assertEqual(dest.stat().st_mtime, 1_000_000)
+        self.assertEqual(self.indexed("docs/small.txt"), (13, hashlib.sha256(b"small content").hexdigest()))
+
+    def test_large_file_is_streamed(self):
+        large = self.source_path / "large.bin"
+        large.write_bytes(b"x" * 64)
+        with patch('archiver.utils.SMALL_FILE_THRESHOLD', 16):
+            self.assertIsNone(read_small_file(large, large.lstat()))
+            cmd_add(self.root_path, large, "docs", True, False, False)
+        self.assertEqual((self.root_path / "docs" / "large.bin").read_bytes(), b"x" * 64)
+        self.assertEqual(self.indexed("docs/large.bin"), (64, hashlib.sha256(b"x" * 64).hexdigest()))
+
+    def test_verify_after_fast_path(self):
+        (self.source_path / "empty").touch()
+        (self.source_path / "small.txt").write_text("small")
+        cmd_add(self.root_path, self.source_path, "docs", True, False, False)
+        captured_output = StringIO()
+        with patch('sys.stdout', captured_output):
+            cmd_verify(self.root_path)
+        self.assertIn("All files OK", captured_output.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
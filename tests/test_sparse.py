@@ -0,0 +1,96 @@
+import unittest
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+from archiver.api import Archive
+from archiver.database import init_db, get_db_path
+from archiver.treehash import hash_file_with_chunks, hash_chunks
+from archiver.utils import calculate_file_hash, copy_file, copy_and_hash, file_segments, is_sparse
+
+MB = 1024 * 1024
+
+class TestSparse(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.image = Path(self.test_dir) / "disk.img"
+        # 40 MB with two small data regions and a trailing hole
+        with open(self.image, "wb") as f:
+            f.truncate(40 * MB)
+            f.seek(5 * MB)
+            f.write(b"boot" * 1024)
+            f.seek(20 * MB)
+            f.write(b"data" * 4096)
+        if not is_sparse(self.image.stat()):
+            self.skipTest("File system without sparse files")
+        self.expected = hashlib.sha256(self.image.read_bytes()).hexdigest()
+
+        self.bytes_read = 0
+        real_pread = os.pread
+        def counting_pread(fd, n, offset):
+            block = real_pread(fd, n, offset)
+            self.bytes_read += len(block)
+            return block
+        self.pread = patch('os.pread', side_effect=counting_pread)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_segments(self):
+        fd = os.open(self.image, os.O_RDONLY)
+        try:
+            segments = list(file_segments(fd, 0, 40 * MB))
+            with patch('os.lseek', side_effect=OSError(errno.EINVAL, "unsupported")):
+                self.assertEqual(list(file_segments(fd, 0, 40 * MB)), [(0, 40 * MB, True)])
+        finally:
+            os.close(fd)
+        self.assertEqual(sum(length for _, length, _ in segments), 40 * MB)
+        self.assertFalse(segments[0][2])
+        self.assertFalse(segments[-1][2])
+        self.assertLess(sum(length for _, length, is_data in segments if is_data), 2 * MB)
+
+    def test_hash_reads_only_data(self):
+        with self.pread:
+            self.assertEqual(calculate_file_hash(self.image), self.expected)
+            full_hash, digests = hash_file_with_chunks(self.image)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                self.assertEqual(hash_chunks(self.image, 40 * MB, executor), digests)
+        self.assertEqual(full_hash, self.expected)
+        self.assertEqual(len(digests), 3)
+        self.assertLess(self.bytes_read, 6 * MB)
+
+    def test_copies_stay_sparse(self):
+        copy = Path(self.test_dir) / "copy.img"
+        with self.pread:
+            self.assertEqual(copy_and_hash(self.image, copy), self.expected)
+        self.assertLess(self.bytes_read, 2 * MB)
+        self.assertTrue(is_sparse(copy.stat()))
+        self.assertEqual(copy.stat().st_size, 40 * MB)
+        self.assertEqual(calculate_file_hash(copy), self.expected)
+
+        copy.unlink()
+        copy_file(self.image, copy)
+        self.assertTrue(is_sparse(copy.stat()))
+        self.assertEqual(calculate_file_hash(copy), self.expected)
+
+    def test_add_and_verify(self):
+        root_path = Path(self.test_dir) / "archive"
+        root_path.mkdir()
+        init_db(get_db_path(root_path)).close()
+        with Archive(root_path) as archive:
+            results = list(archive.add_many([self.image], "images"))
+            self.assertEqual((results[0].status, results[0].hash), ("added", self.expected))
+            archived = root_path / "images" / "disk.img"
+            self.assertTrue(is_sparse(archived.stat()))
+            # The digest attribute may take a block of its own
+            self.assertLessEqual(archived.stat().st_blocks, self.image.stat().st_blocks + 8)
+            with self.pread:
+                self.assertTrue(all(r.ok for r in archive.verify_iter()))
+            self.assertLess(self.bytes_read, 2 * MB)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,8 @@ import tempfile
 import shutil
 import sqlite3
 from pathlib import Path
-from archiver.database import get_connection, init_db
+from unittest.mock import patch
+from archiver.database import get_connection, init_db, parse_pragmas, PRAGMA_OVERRIDES
 
 class TestSqliteSettings(unittest.TestCase):
     def setUp(self):
@@ -31,5 +32,45 @@ class TestSqliteSettings(unittest.TestCase):
         
         conn.close()
 
+    def test_read_profile_is_read_only(self):
+        init_db(self.db_path).close()
+
+        conn = get_connection(self.db_path, "read")
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA mmap_size;")
+        self.assertGreater(cursor.fetchone()[0], 0)
+        cursor.execute("PRAGMA temp_store;")
+        self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+        with self.assertRaises(sqlite3.OperationalError):
+            cursor.execute("INSERT INTO files (path, size, hash) VALUES ('a', 1, 'x')")
+
+        # Temporary tables still work for bulk lookups
+        cursor.execute("CREATE TEMP TABLE t (x)")
+        conn.close()
+
+    def test_bulk_profile(self):
+        init_db(self.db_path).close()
+        conn = get_connection(self.db_path, "bulk")
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA wal_autocheckpoint;")
+        self.assertEqual(cursor.fetchone()[0], 10000)
+        cursor.execute("PRAGMA busy_timeout;")
+        self.assertEqual(cursor.fetchone()[0], 5000)
+        conn.close()
+
+    def test_overrides(self):
+        init_db(self.db_path).close()
+        with patch.dict(PRAGMA_OVERRIDES, parse_pragmas("mmap_size=0, cache_size=-1000")):
+            conn = get_connection(self.db_path, "read")
+            self.assertEqual(conn.execute("PRAGMA mmap_size;").fetchone()[0], 0)
+            self.assertEqual(conn.execute("PRAGMA cache_size;").fetchone()[0], -1000)
+            conn.close()
+
+    def test_parse_pragmas_rejects_garbage(self):
+        for bad in ("mmap_size", "mmap_size=1;DROP TABLE files", "1x=2"):
+            with self.assertRaises(ValueError):
+                parse_pragmas(bad)
+
 if __name__ == "__main__":
     unittest.main()
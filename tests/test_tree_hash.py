@@ -0,0 +1,101 @@
+import unittest
+import hashlib
+import json
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_add, cmd_scan, cmd_verify, cmd_tree_hash, cmd_fix
+from archiver.database import get_db_path, get_connection
+from archiver.treehash import CHUNK_SIZE, hash_file_with_chunks, hash_chunks, load_tree
+from tests.helpers import run_cmd
+
+class TestTreeHash(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        self.source_path.mkdir()
+        self.db_path = get_db_path(self.root_path)
+
+        # 2.5 chunks of distinct content
+        self.big = self.source_path / "disk.img"
+        with open(self.big, "wb") as f:
+            for i in range(5):
+                f.write(bytes([i]) * (CHUNK_SIZE // 2))
+
+        self.suppress_output = patch('sys.stdout', new=StringIO())
+        self.suppress_output.start()
+        cmd_init(self.root_path)
+
+    def tearDown(self):
+        self.suppress_output.stop()
+        shutil.rmtree(self.test_dir)
+
+    def tree_of(self, rel_path):
+        conn = get_connection(self.db_path)
+        file_id = conn.execute("SELECT id FROM files WHERE path = ?", (rel_path,)).fetchone()[0]
+        tree = load_tree(conn, file_id)
+        conn.close()
+        return tree
+
+    def corrupt(self, path, offset):
+        with open(path, "r+b") as f:
+            f.seek(offset)
+            f.write(b"\xff")
+
+    def test_sequential_and_parallel_digests_agree(self):
+        full_hash, digests = hash_file_with_chunks(self.big)
+        self.assertEqual(full_hash, hashlib.sha256(self.big.read_bytes()).hexdigest())
+        self.assertEqual(len(digests), 3)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            self.assertEqual(hash_chunks(self.big, self.big.stat().st_size, executor), digests)
+
+    def test_add_records_tree_and_verify_localizes_damage(self):
+        with patch('archiver.api.TREE_HASH_MIN_SIZE', 0):
+            cmd_add(self.root_path, self.big, "images", True, False, False, tree_hash=True)
+        chunk_size, digests = self.tree_of("images/disk.img")
+        self.assertEqual((chunk_size, len(digests)), (CHUNK_SIZE, 3))
+
+        archived = self.root_path / "images" / "disk.img"
+        self.corrupt(archived, CHUNK_SIZE + 5)
+        report = Path(self.test_dir) / "report.ndjson"
+        output = run_cmd(cmd_verify, self.root_path, report_path=report)
+        self.assertIn("CORRUPTED (Hash mismatch): images/disk.img", output)
+        self.assertIn(f"Damaged: bytes {CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}", output)
+        result = json.loads(report.read_text().splitlines()[1])
+        self.assertEqual(result["chunks"], [[CHUNK_SIZE, CHUNK_SIZE]])
+
+        # Adopting the new content drops the stale tree
+        run_cmd(cmd_fix, self.root_path, [Path("images/disk.img")])
+        self.assertIsNone(self.tree_of("images/disk.img"))
+        self.assertIn("All files OK", run_cmd(cmd_verify, self.root_path))
+
+    def test_parent_replaced_by_file(self):
+        with patch('archiver.api.TREE_HASH_MIN_SIZE', 0):
+            cmd_add(self.root_path, self.big, "images", True, False, False, tree_hash=True)
+        shutil.rmtree(self.root_path / "images")
+        (self.root_path / "images").write_text("not a directory")
+        self.assertIn("MISSING: images/disk.img", run_cmd(cmd_verify, self.root_path))
+
+    def test_backfill(self):
+        (self.root_path / "images").mkdir()
+        shutil.copy(self.big, self.root_path / "images" / "disk.img")
+        shutil.copy(self.big, self.root_path / "images" / "copy.img")
+        cmd_scan(self.root_path)
+        self.corrupt(self.root_path / "images" / "copy.img", 0)
+
+        output = run_cmd(cmd_tree_hash, self.root_path, min_size=0)
+        self.assertIn("Tree hashed: images/disk.img", output)
+        self.assertIn("CORRUPTED (Hash mismatch): images/copy.img (skipped)", output)
+        self.assertIsNotNone(self.tree_of("images/disk.img"))
+        self.assertIsNone(self.tree_of("images/copy.img"))
+
+        output = run_cmd(cmd_tree_hash, self.root_path, min_size=0)
+        self.assertNotIn("Tree hashed", output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.api import Archive
+from archiver.commands import cmd_init, cmd_add, cmd_status
+from archiver.database import get_db_path, get_connection
+from archiver.rollup import rebuild_rollups
+from archiver.utils import read_back_hash, calculate_file_hash
+
+class TestVerifyCopy(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        (self.source_path / "2023").mkdir(parents=True)
+        (self.source_path / "2023" / "a.jpg").write_text("photo a")
+        (self.source_path / "b.jpg").write_bytes(os.urandom(3 * 1024 * 1024))
+        (self.source_path / "link.jpg").symlink_to("b.jpg")
+        self.db_path = get_db_path(self.root_path)
+
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def last_verified(self):
+        conn = get_connection(self.db_path)
+        rows = dict(conn.execute("SELECT path, last_verified FROM files"))
+        conn.close()
+        return rows
+
+    def test_read_back_drops_cached_pages(self):
+        advice = []
+        real_fadvise = os.posix_fadvise
+        def record(fd, offset, length, flag):
+            advice.append(flag)
+            real_fadvise(fd, offset, length, flag)
+        path = self.source_path / "b.jpg"
+        with patch('os.fsync') as fsync, patch('os.posix_fadvise', side_effect=record):
+            self.assertEqual(read_back_hash(path), calculate_file_hash(path))
+        fsync.assert_called_once()
+        self.assertEqual(advice[0], os.POSIX_FADV_DONTNEED)
+
+    def test_copies_are_read_back_and_verified(self):
+        # Copying may only run one file ahead of the read-back
+        with Archive(self.root_path) as archive, patch('archiver.api.READ_BACK_BACKLOG', 1):
+            results = {r.path: r for r in archive.add_many([self.source_path], "photos", verify_copy=True)}
+        self.assertEqual({path: r.status for path, r in results.items()}, dict.fromkeys(["photos/2023/a.jpg", "photos/b.jpg", "photos/link.jpg"], "added"))
+        self.assertTrue(results["photos/b.jpg"].verified)
+        self.assertFalse(results["photos/link.jpg"].verified)
+
+        verified = self.last_verified()
+        self.assertIsNotNone(verified["photos/b.jpg"])
+        self.assertIsNone(verified["photos/link.jpg"])
+
+        # The rollups were updated in place
+        conn = get_connection(self.db_path)
+        incremental = conn.execute("SELECT * FROM dir_rollups ORDER BY dir").fetchall()
+        rebuild_rollups(conn)
+        self.assertEqual(incremental, conn.execute("SELECT * FROM dir_rollups ORDER BY dir").fetchall())
+        conn.close()
+        with patch('sys.stdout', new=StringIO()) as out:
+            cmd_status(self.root_path)
+        self.assertIn("Unverified Files: 1", out.getvalue())
+
+    def test_mismatch_is_reported(self):
+        def bad_read_back(path):
+            if path.name == "a.jpg":
+                raise OSError("I/O error")
+            return "0" * 64
+        with patch('archiver.api.read_back_hash', side_effect=bad_read_back), patch('sys.stdout', new=StringIO()) as out:
+            with self.assertRaises(SystemExit):
+                cmd_add(self.root_path, self.source_path, "photos", True, False, False, verify_copy=True)
+        output = out.getvalue()
+        self.assertIn("Error: The archived copy photos/b.jpg does not match the source when read back", output)
+        self.assertIn("Error: The archived copy photos/2023/a.jpg could not be read back: I/O error", output)
+        self.assertIn("Added: photos/link.jpg\n", output)
+        self.assertIn("2 archived copies failed the read-back check", output)
+        # The files stay archived, unverified
+        self.assertEqual(self.last_verified(), dict.fromkeys(["photos/2023/a.jpg", "photos/b.jpg", "photos/link.jpg"]))
+
+if __name__ == '__main__':
+    unittest.main()
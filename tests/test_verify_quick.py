@@ -0,0 +1,68 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.api import Archive
+from archiver.commands import cmd_init, cmd_scan, cmd_verify_quick, cmd_status
+from archiver.report import parse_sample
+from archiver.treehash import CHUNK_SIZE
+from tests.helpers import run_cmd
+
+class TestVerifyQuick(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        (self.root_path / "docs").mkdir(parents=True)
+        for i in range(20):
+            (self.root_path / "docs" / f"file{i}.txt").write_text(f"Content {i}")
+        self.big = self.root_path / "disk.img"
+        with open(self.big, "wb") as f:
+            for i in range(5):
+                f.write(bytes([i]) * (CHUNK_SIZE // 2))
+
+        with patch('sys.stdout', new=StringIO()), patch('archiver.api.TREE_HASH_MIN_SIZE', CHUNK_SIZE):
+            cmd_init(self.root_path)
+            cmd_scan(self.root_path, tree_hash=True)
+
+        with open(self.big, "r+b") as f:
+            f.seek(CHUNK_SIZE + 1)
+            f.write(b"\xff")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_parse_sample(self):
+        self.assertEqual(parse_sample("1%"), 0.01)
+        self.assertEqual(parse_sample("0.5"), 0.5)
+        for value in ("0", "101%", "abc"):
+            with self.assertRaises(ValueError):
+                parse_sample(value)
+
+    def test_full_sample_finds_damaged_chunk(self):
+        output = run_cmd(cmd_verify_quick, self.root_path, 1.0)
+        self.assertIn("CORRUPTED (Hash mismatch): disk.img", output)
+        self.assertIn(f"Damaged: bytes {CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}", output)
+        self.assertIn("Sampled 21 files", output)
+        self.assertIn("1 damaged files found in the sample", output)
+
+    def test_sample_reads_only_picked_chunks(self):
+        with Archive(self.root_path, read_only=True) as archive:
+            for seed in range(20):
+                results = [r for r in archive.sample_iter(0.3, seed=seed) if r.path == "disk.img"]
+                if results and len(results[0].bad_chunks) == 0 and results[0].checked_bytes < self.big.stat().st_size:
+                    break
+            else:
+                self.fail("No sample picked only some chunks of disk.img")
+            self.assertTrue(results[0].ok)
+            self.assertEqual(results[0].checked_bytes % (CHUNK_SIZE // 2), 0)
+
+        # Samples are repeatable and leave last_verified alone
+        first = run_cmd(cmd_verify_quick, self.root_path, 0.3, seed=seed)
+        second = run_cmd(cmd_verify_quick, self.root_path, 0.3, seed=seed)
+        self.assertEqual(first, second)
+        self.assertIn("Unverified Files: 21", run_cmd(cmd_status, self.root_path))
+
+if __name__ == '__main__':
+    unittest.main()
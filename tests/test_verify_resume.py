@@ -0,0 +1,94 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver import api
+from archiver.commands import cmd_init, cmd_scan, cmd_verify, cmd_verify_log, cmd_status
+from archiver.database import get_db_path, get_connection
+from archiver.report import read_report
+from tests.helpers import run_cmd
+
+class TestVerifyResume(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        (self.root_path / "docs").mkdir(parents=True)
+        for i in range(10):
+            (self.root_path / "docs" / f"file{i}.txt").write_text(f"Content {i}")
+
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+            cmd_scan(self.root_path)
+
+        # One corrupted file before the interruption, one after
+        (self.root_path / "docs" / "file1.txt").write_text("Content X")
+        (self.root_path / "docs" / "file8.txt").unlink()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def interrupted_verify(self, after):
+        checked = []
+        real_check_file = api.check_file
+        def check_file(path, size, file_hash):
+            if len(checked) == after:
+                raise KeyboardInterrupt
+            checked.append(path.name)
+            return real_check_file(path, size, file_hash)
+        with patch('archiver.api.check_file', side_effect=check_file):
+            with self.assertRaises(KeyboardInterrupt):
+                run_cmd(cmd_verify, self.root_path)
+        return checked
+
+    def test_resume_continues_after_checkpoint(self):
+        first_pass = self.interrupted_verify(4)
+        self.assertEqual(len(first_pass), 4)
+
+        checked = []
+        real_check_file = api.check_file
+        def check_file(path, size, file_hash):
+            checked.append(path.name)
+            return real_check_file(path, size, file_hash)
+        report = Path(self.test_dir) / "report.ndjson"
+        with patch('archiver.api.check_file', side_effect=check_file):
+            output = run_cmd(cmd_verify, self.root_path, report_path=report, resume=True)
+
+        self.assertEqual(len(checked), 6)
+        self.assertEqual(sorted(first_pass + checked), [f"file{i}.txt" for i in range(10)])
+        self.assertIn("Resuming verify run #1 after 4/10 files", output)
+        self.assertIn("Verification complete: 2 issues found.", output)
+
+        header, results, summary = read_report(report)
+        self.assertEqual(sorted(r["path"] for r in results), ["docs/file1.txt", "docs/file8.txt"])
+        self.assertEqual((summary["checked"], summary["complete"]), (10, True))
+
+        output = run_cmd(cmd_status, self.root_path)
+        self.assertIn("Unverified Files: 2", output)
+
+    def test_verify_log(self):
+        self.interrupted_verify(3)
+        run_cmd(cmd_verify, self.root_path)
+
+        output = run_cmd(cmd_verify_log, self.root_path)
+        self.assertIn("#1 ", output)
+        self.assertIn("abandoned: 3/10 files", output)
+        self.assertIn("complete: 10/10 files, 2 issues", output)
+
+        output = run_cmd(cmd_verify_log, self.root_path, 2)
+        self.assertIn("CORRUPTED (Hash mismatch): docs/file1.txt", output)
+        self.assertIn("MISSING: docs/file8.txt", output)
+
+    def test_resume_without_unfinished_run(self):
+        run_cmd(cmd_verify, self.root_path)
+        output = run_cmd(cmd_verify, self.root_path, resume=True)
+        self.assertIn("No unfinished verify run to resume", output)
+
+        conn = get_connection(get_db_path(self.root_path))
+        runs = conn.execute("SELECT status FROM verify_runs ORDER BY id").fetchall()
+        conn.close()
+        self.assertEqual(runs, [("complete",), ("complete",)])
+
+if __name__ == '__main__':
+    unittest.main()
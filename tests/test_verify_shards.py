@@ -0,0 +1,93 @@
+import unittest
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_scan, cmd_verify, cmd_verify_merge
+from archiver.report import parse_shard, read_report
+
+class TestVerifyShards(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir) / "archive"
+        (self.root_path / "docs").mkdir(parents=True)
+        for i in range(10):
+            (self.root_path / "docs" / f"file{i}.txt").write_text(f"Content {i}")
+        self.reports_dir = Path(self.test_dir) / "reports"
+        self.reports_dir.mkdir()
+
+        self.suppress_output = patch('sys.stdout', new=StringIO())
+        self.suppress_output.start()
+        cmd_init(self.root_path)
+        cmd_scan(self.root_path)
+
+        # One corrupted and one missing file
+        (self.root_path / "docs" / "file3.txt").write_text("Content X")
+        (self.root_path / "docs" / "file6.txt").unlink()
+
+    def tearDown(self):
+        self.suppress_output.stop()
+        shutil.rmtree(self.test_dir)
+
+    def run_shards(self, n):
+        reports = []
+        for k in range(1, n + 1):
+            report = self.reports_dir / f"shard{k}of{n}.ndjson"
+            cmd_verify(self.root_path, shard=(k, n), report_path=report)
+            reports.append(report)
+        return reports
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for bad in ("0/4", "5/4", "1/0", "x", "1/2/3"):
+            with self.assertRaises(ValueError):
+                parse_shard(bad)
+
+    def test_shards_partition_all_files(self):
+        reports = self.run_shards(3)
+        totals = [read_report(r)[0]["total"] for r in reports]
+        self.assertEqual(sum(totals), 10)
+        self.assertTrue(all(t > 0 for t in totals))
+        checked = [read_report(r)[2]["checked"] for r in reports]
+        self.assertEqual(checked, totals)
+
+    def test_report_records_issues(self):
+        report = self.reports_dir / "all.ndjson"
+        cmd_verify(self.root_path, report_path=report)
+        header, results, summary = read_report(report)
+        self.assertEqual(header["shard"], [1, 1])
+        self.assertEqual({(r["path"], r["status"]) for r in results},
+                         {("docs/file3.txt", "hash_mismatch"), ("docs/file6.txt", "missing")})
+        self.assertEqual(summary, {"type": "summary", "checked": 10, "issues": 2, "complete": True})
+
+    def test_merge(self):
+        reports = self.run_shards(3)
+        merged = self.reports_dir / "merged.ndjson"
+        captured_output = StringIO()
+        with patch('sys.stdout', captured_output):
+            cmd_verify_merge(reports, merged)
+        output = captured_output.getvalue()
+        self.assertIn("CORRUPTED (Hash mismatch): docs/file3.txt", output)
+        self.assertIn("MISSING: docs/file6.txt", output)
+        self.assertIn("Merged 3/3 shards: 10/10 files checked.", output)
+        self.assertIn("Verification complete: 2 issues found.", output)
+        self.assertEqual(len(read_report(merged)[1]), 2)
+
+    def test_merge_detects_missing_shard(self):
+        reports = self.run_shards(3)
+        captured_output = StringIO()
+        with patch('sys.stdout', captured_output):
+            cmd_verify_merge(reports[:2])
+        output = captured_output.getvalue()
+        self.assertIn("No report for shard 3/3", output)
+        self.assertIn("Verification incomplete", output)
+
+    def test_merge_rejects_mixed_shard_counts(self):
+        reports = self.run_shards(2)[:1] + self.run_shards(3)[1:2]
+        with self.assertRaises(SystemExit):
+            cmd_verify_merge(reports)
+
+if __name__ == "__main__":
+    unittest.main()
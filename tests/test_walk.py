@@ -0,0 +1,66 @@
+import unittest
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from archiver.walk import walk_files, file_entry, is_excluded
+
+class TestWalk(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir)
+        (self.root_path / ".archive-index").mkdir()
+        (self.root_path / ".archive-index" / "archive.db").write_text("db")
+        (self.root_path / ".hidden_dir").mkdir()
+        (self.root_path / ".hidden_dir" / "file").write_text("x")
+        (self.root_path / ".hidden_file").write_text("x")
+        (self.root_path / ".DS_Store").write_text("x")
+        (self.root_path / "photos" / "2023").mkdir(parents=True)
+        (self.root_path / "photos" / "2023" / "img.jpg").write_text("jpeg")
+        (self.root_path / "photos" / ".DS_Store").write_text("x")
+        (self.root_path / "photos" / ".kept").write_text("x")
+        (self.root_path / "photos" / ".img.jpg.42.partial").write_text("x")
+        (self.root_path / "photos" / "link.jpg").symlink_to("2023/img.jpg")
+        (self.root_path / "photos" / "dirlink").symlink_to("2023")
+        (self.root_path / "top.txt").write_text("top")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def rel_paths(self, **kwargs):
+        return sorted(str(e.path.relative_to(self.root_path)) for e in walk_files(self.root_path, **kwargs))
+
+    def test_archive_root_filters(self):
+        self.assertEqual(self.rel_paths(archive_root=True),
+                         ["photos/.kept", "photos/2023/img.jpg", "photos/link.jpg", "top.txt"])
+
+    def test_source_filters(self):
+        # Outside the archive only .DS_Store files are skipped
+        self.assertEqual(self.rel_paths(),
+                         [".archive-index/archive.db", ".hidden_dir/file", ".hidden_file",
+                          "photos/.img.jpg.42.partial", "photos/.kept", "photos/2023/img.jpg", "photos/link.jpg", "top.txt"])
+
+    def test_entries_carry_lstat(self):
+        entries = {e.path.name: e for e in walk_files(self.root_path, archive_root=True)}
+        self.assertEqual(entries["img.jpg"].size, 4)
+        self.assertEqual(entries["img.jpg"].st.st_ino, os.lstat(self.root_path / "photos" / "2023" / "img.jpg").st_ino)
+        # Symlinks count as size 0
+        self.assertEqual(entries["link.jpg"].size, 0)
+        self.assertEqual(file_entry(self.root_path / "photos" / "link.jpg").size, 0)
+
+    def test_errors_are_reported(self):
+        errors = []
+        list(walk_files(self.root_path / "nope", on_error=lambda path, e: errors.append(path)))
+        self.assertEqual(errors, [self.root_path / "nope"])
+
+    def test_is_excluded(self):
+        self.assertTrue(is_excluded(".DS_Store"))
+        self.assertFalse(is_excluded(".hidden"))
+        self.assertTrue(is_excluded(".hidden", at_archive_root=True))
+        self.assertTrue(is_excluded(".img.jpg.4242.partial", in_archive=True))
+        self.assertFalse(is_excluded("img.jpg.partial", in_archive=True))
+        # Sources may hold files of that name; only the archive's own are temporaries
+        self.assertFalse(is_excluded(".img.jpg.4242.partial"))
+
+if __name__ == "__main__":
+    unittest.main()
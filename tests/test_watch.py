@@ -0,0 +1,81 @@
+import unittest
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init
+from archiver.database import get_db_path, get_connection
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        from archiver.watch import ArchiveWatcher
+        self.test_dir = tempfile.mkdtemp()
+        self.root_path = Path(self.test_dir)
+        (self.root_path / "docs").mkdir()
+        self.suppress_output = patch('sys.stdout', new=StringIO())
+        self.suppress_output.start()
+        cmd_init(self.root_path)
+        self.conn = get_connection(get_db_path(self.root_path))
+        self.watcher = ArchiveWatcher(self.root_path, self.conn, workers=2, debounce=0.05)
+        self.watcher.start()
+
+    def tearDown(self):
+        self.watcher.close()
+        self.conn.close()
+        self.suppress_output.stop()
+        shutil.rmtree(self.test_dir)
+
+    def indexed_paths(self):
+        return {row[0] for row in self.conn.execute("SELECT path FROM files")}
+
+    def wait_for(self, expected):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            self.watcher.poll(timeout=0.05)
+            self.watcher.flush()
+            if expected <= self.indexed_paths():
+                return
+        self.fail(f"Timed out waiting for {expected}, have {self.indexed_paths()}")
+
+    def test_new_file_is_indexed(self):
+        (self.root_path / "docs" / "new.txt").write_text("new content")
+        self.wait_for({"docs/new.txt"})
+        row = self.conn.execute("SELECT h.size FROM hash_index h JOIN files f ON f.id = h.file_id WHERE f.path = 'docs/new.txt'").fetchone()
+        self.assertEqual(row[0], 11)
+
+    def test_new_directory_and_symlink(self):
+        subdir = self.root_path / "docs" / "2024"
+        subdir.mkdir()
+        (subdir / "a.txt").write_text("a")
+        (subdir / "link").symlink_to("a.txt")
+        self.wait_for({"docs/2024/a.txt", "docs/2024/link"})
+
+    def test_exclusion_rules(self):
+        (self.root_path / ".hidden").write_text("root dotfile")
+        (self.root_path / "docs" / ".DS_Store").write_text("junk")
+        (self.root_path / "docs" / ".a.txt.4242.partial").write_text("copy in progress")
+        (self.root_path / "docs" / ".kept").write_text("dotfile below root")
+        self.wait_for({"docs/.kept"})
+        self.watcher.flush(force=True)
+        self.assertEqual(self.indexed_paths(), {"docs/.kept"})
+
+    def test_already_indexed_file_is_not_duplicated(self):
+        target = self.root_path / "docs" / "file.txt"
+        target.write_text("content")
+        self.wait_for({"docs/file.txt"})
+        target.touch()
+        with open(target, "a"):
+            pass
+        for _ in range(5):
+            self.watcher.poll(timeout=0.05)
+            self.watcher.flush()
+        self.watcher.flush(force=True)
+        count = self.conn.execute("SELECT count(*) FROM files WHERE path = 'docs/file.txt'").fetchone()[0]
+        self.assertEqual(count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from io import StringIO
+from archiver.commands import cmd_init, cmd_add, cmd_scan, cmd_store_xattrs
+from archiver.database import get_db_path, get_connection
+from archiver.utils import calculate_file_hash
+from archiver.xattrs import XATTR_NAME, read_digest, write_digest
+from tests.helpers import run_cmd
+
+def xattrs_supported(path: Path) -> bool:
+    probe = path / "probe"
+    probe.write_text("probe")
+    try:
+        return write_digest(probe, "0" * 64, probe.stat())
+    finally:
+        probe.unlink()
+
+class TestXattrs(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        if not xattrs_supported(Path(self.test_dir)):
+            shutil.rmtree(self.test_dir)
+            self.skipTest("no user xattrs on this file system")
+        self.root_path = Path(self.test_dir) / "archive"
+        self.root_path.mkdir()
+        self.source_path = Path(self.test_dir) / "source"
+        self.source_path.mkdir()
+        (self.source_path / "a.txt").write_text("Content A")
+        (self.source_path / "b.txt").write_text("Content B")
+        self.db_path = get_db_path(self.root_path)
+
+        with patch('sys.stdout', new=StringIO()):
+            cmd_init(self.root_path)
+            cmd_add(self.root_path, self.source_path, "docs", True, False, False)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def rows(self):
+        conn = get_connection(self.db_path)
+        rows = conn.execute("SELECT path, hash, ctime_ns FROM files ORDER BY path").fetchall()
+        conn.close()
+        return rows
+
+    def assertSignatureCurrent(self):
+        for path, _, ctime_ns in self.rows():
+            self.assertEqual(ctime_ns, (self.root_path / path).lstat().st_ctime_ns, path)
+
+    def test_add_stores_digest(self):
+        for path, file_hash, _ in self.rows():
+            file_path = self.root_path / path
+            self.assertEqual(read_digest(file_path, file_path.stat()), file_hash)
+        # The attribute was written before the index took the signature
+        self.assertSignatureCurrent()
+        self.assertIn("0 changed, 0 re-signed", run_cmd(cmd_scan, self.root_path, update=True))
+
+    def test_digest_is_tied_to_size_and_mtime(self):
+        file_path = self.root_path / "docs" / "a.txt"
+        st = file_path.stat()
+        self.assertIsNotNone(read_digest(file_path, st))
+        os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        self.assertIsNone(read_digest(file_path, file_path.stat()))
+        os.setxattr(file_path, XATTR_NAME, b"garbage")
+        self.assertIsNone(read_digest(file_path, st))
+
+    def test_rebuild_from_xattrs(self):
+        expected = [row[:2] for row in self.rows()]
+        edited = self.root_path / "docs" / "b.txt"
+        edited.write_text("Edited B")
+        expected[1] = ("docs/b.txt", calculate_file_hash(edited))
+        self.db_path.unlink()
+
+        hashed = []
+        def record(file_path, st=None):
+            hashed.append(Path(file_path).name)
+            return calculate_file_hash(file_path, st)
+        with patch('archiver.api.calculate_file_hash', side_effect=record):
+            output = run_cmd(cmd_scan, self.root_path, trust_xattrs=True)
+        self.assertIn("from their extended attributes", output)
+        # Only the edited file (stale attribute) was read
+        self.assertEqual(hashed, ["b.txt"])
+        self.assertEqual([row[:2] for row in self.rows()], expected)
+
+    def test_store_xattrs_backfills_existing_index(self):
+        for name in ("a.txt", "b.txt"):
+            os.removexattr(self.root_path / "docs" / name, XATTR_NAME)
+        (self.root_path / "docs" / "b.txt").write_text("Edited B")
+        run_cmd(cmd_scan, self.root_path, update=True)
+        (self.root_path / "docs" / "c.txt").write_text("Not indexed yet")
+        conn = get_connection(self.db_path)
+        conn.execute("INSERT INTO files (path, size, hash, mtime_ns, inode) VALUES ('docs/c.txt', 1, 'x', 0, 0)")
+        conn.commit()
+        conn.close()
+
+        output = run_cmd(cmd_store_xattrs, self.root_path)
+        self.assertIn("Stored digests of 2 files", output)
+        self.assertIn("Changed since indexed: docs/c.txt", output)
+        for path, file_hash, _ in self.rows()[:2]:
+            file_path = self.root_path / path
+            self.assertEqual(read_digest(file_path, file_path.stat()), file_hash)
+        self.assertIn("Stored digests of 0 files (2 already current)", run_cmd(cmd_store_xattrs, self.root_path))
+
+        # The new ctimes were recorded, so nothing looks changed
+        conn = get_connection(self.db_path)
+        conn.execute("DELETE FROM files WHERE path = 'docs/c.txt'")
+        conn.commit()
+        conn.close()
+        (self.root_path / "docs" / "c.txt").unlink()
+        self.assertSignatureCurrent()
+
+    def test_content_changed_with_preserved_mtime(self):
+        file_path = self.root_path / "docs" / "a.txt"
+        st = file_path.stat()
+        old_hash = read_digest(file_path, st)
+        file_path.write_text("Content Z")
+        os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        # The attribute still looks valid, but the ctime gives the change away
+        self.assertEqual(read_digest(file_path, file_path.stat()), old_hash)
+
+        output = run_cmd(cmd_store_xattrs, self.root_path)
+        self.assertIn("Changed since indexed: docs/a.txt", output)
+        self.assertEqual(read_digest(file_path, file_path.stat()), old_hash)
+
+        # Re-hashing the file brings the attribute up to date
+        self.assertIn("1 changed", run_cmd(cmd_scan, self.root_path, update=True))
+        self.assertEqual(read_digest(file_path, file_path.stat()), calculate_file_hash(file_path))
+        self.assertSignatureCurrent()
+        self.assertIn("0 changed, 0 re-signed", run_cmd(cmd_scan, self.root_path, update=True))
+
+    def test_watch_rewrites_stale_digest(self):
+        from archiver.watch import _hash_entry
+        file_path = self.root_path / "docs" / "b.txt"
+        st = file_path.stat()
+        file_path.write_text("Content Y")
+        os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        _, file_hash, new_st = _hash_entry(file_path)
+        self.assertEqual(read_digest(file_path, new_st), file_hash)
+        self.assertEqual(new_st.st_ctime_ns, file_path.lstat().st_ctime_ns)
+
+if __name__ == '__main__':
+    unittest.main()